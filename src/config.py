@@ -14,8 +14,17 @@ class MCPServerConfig(BaseModel):
     
     # 文件访问配置
     file_storage_path: str = "/app/storage"
-    allowed_extensions: List[str] = ["txt", "pdf", "doc", "docx", "csv", "json", "xml"]
+    allowed_extensions: List[str] = ["txt", "pdf", "doc", "docx", "csv", "json", "xml", "jsonl", "npy", "parquet"]
     max_file_size_mb: int = 50
+    file_chunk_size_kb: int = 1024  # 上传文件时每次读取和写入的块大小
+    file_list_batch_size: int = 1000  # 流式列出文件时每次从文件目录读取的数量
+    file_upload_session_max_mb: int = 10240  # 分片上传的文件大小上限
+    file_upload_session_ttl_hours: int = 24  # 未完成的分片上传会话的保留时间
+    file_compression: str = "none"  # 文本类文件的压缩存储方式: none、zstd或gzip
+    file_compression_extensions: List[str] = ["txt", "csv", "json", "jsonl", "xml"]  # 压缩存储的文件扩展名
+    file_preview_chunk_rows: int = 10000  # 结构化预览每次解析的行数
+    file_preview_index_interval: int = 1000  # 结构化预览的行偏移索引每隔多少行记录一次
+    file_preview_cache_size: int = 128  # 内存中缓存的预览索引数量
     
     # 数据库配置
     mongodb_uri: str = "mongodb://localhost:27017"
@@ -28,6 +37,19 @@ class MCPServerConfig(BaseModel):
     # 向量数据库配置
     vector_db_path: str = "/app/vector_db"
     vector_dimension: int = 1536  # 默认向量维度
+    vector_wal_fsync: bool = True  # 每次写入预写日志后是否fsync
+    vector_checkpoint_wal_mb: int = 64  # 预写日志达到该大小时执行检查点
+    vector_checkpoint_interval_seconds: int = 60  # 检查点最长间隔
+    vector_worker_threads: int = os.cpu_count() or 4  # 执行向量搜索的线程数，写入使用同样大小的单独线程池
+    vector_filter_cache_size: int = 128  # 缓存的元数据过滤位图数量
+    vector_search_cache_size: int = 1024  # 缓存的搜索结果数量，0表示不缓存
+    vector_search_cache_ttl_seconds: int = 300  # 搜索结果缓存的有效期，0表示不过期
+    vector_cursor_ttl_seconds: int = 300  # 分页搜索游标的有效期
+    vector_max_cursors: int = 1000  # 同时保留的分页搜索游标数量
+    vector_tombstone_purge_ratio: float = 0.1  # 已删除的向量占索引的比例达到该值时，检查点从索引中清除
+    vector_lazy_load: bool = True  # 集合在首次访问时才加载
+    vector_mmap: bool = True  # 以只读内存映射方式打开没有待重放日志的索引
+    vector_memory_budget_mb: int = 0  # 已加载集合的内存预算，超出时卸载最久未使用的集合，0表示不限制
     
     # 安全配置
     api_key_required: bool = True
@@ -53,6 +75,24 @@ class MCPServerConfig(BaseModel):
             config.allowed_extensions = os.getenv("MCP_ALLOWED_EXTENSIONS").split(",")
         if os.getenv("MCP_MAX_FILE_SIZE_MB"):
             config.max_file_size_mb = int(os.getenv("MCP_MAX_FILE_SIZE_MB"))
+        if os.getenv("MCP_FILE_CHUNK_SIZE_KB"):
+            config.file_chunk_size_kb = int(os.getenv("MCP_FILE_CHUNK_SIZE_KB"))
+        if os.getenv("MCP_FILE_LIST_BATCH_SIZE"):
+            config.file_list_batch_size = int(os.getenv("MCP_FILE_LIST_BATCH_SIZE"))
+        if os.getenv("MCP_FILE_UPLOAD_SESSION_MAX_MB"):
+            config.file_upload_session_max_mb = int(os.getenv("MCP_FILE_UPLOAD_SESSION_MAX_MB"))
+        if os.getenv("MCP_FILE_UPLOAD_SESSION_TTL_HOURS"):
+            config.file_upload_session_ttl_hours = int(os.getenv("MCP_FILE_UPLOAD_SESSION_TTL_HOURS"))
+        if os.getenv("MCP_FILE_COMPRESSION"):
+            config.file_compression = os.getenv("MCP_FILE_COMPRESSION").lower()
+        if os.getenv("MCP_FILE_COMPRESSION_EXTENSIONS"):
+            config.file_compression_extensions = os.getenv("MCP_FILE_COMPRESSION_EXTENSIONS").split(",")
+        if os.getenv("MCP_FILE_PREVIEW_CHUNK_ROWS"):
+            config.file_preview_chunk_rows = int(os.getenv("MCP_FILE_PREVIEW_CHUNK_ROWS"))
+        if os.getenv("MCP_FILE_PREVIEW_INDEX_INTERVAL"):
+            config.file_preview_index_interval = int(os.getenv("MCP_FILE_PREVIEW_INDEX_INTERVAL"))
+        if os.getenv("MCP_FILE_PREVIEW_CACHE_SIZE"):
+            config.file_preview_cache_size = int(os.getenv("MCP_FILE_PREVIEW_CACHE_SIZE"))
         
         # 数据库配置
         if os.getenv("MCP_MONGODB_URI"):
@@ -69,6 +109,32 @@ class MCPServerConfig(BaseModel):
             config.vector_db_path = os.getenv("MCP_VECTOR_DB_PATH")
         if os.getenv("MCP_VECTOR_DIMENSION"):
             config.vector_dimension = int(os.getenv("MCP_VECTOR_DIMENSION"))
+        if os.getenv("MCP_VECTOR_WAL_FSYNC"):
+            config.vector_wal_fsync = os.getenv("MCP_VECTOR_WAL_FSYNC").lower() == "true"
+        if os.getenv("MCP_VECTOR_CHECKPOINT_WAL_MB"):
+            config.vector_checkpoint_wal_mb = int(os.getenv("MCP_VECTOR_CHECKPOINT_WAL_MB"))
+        if os.getenv("MCP_VECTOR_CHECKPOINT_INTERVAL_SECONDS"):
+            config.vector_checkpoint_interval_seconds = int(os.getenv("MCP_VECTOR_CHECKPOINT_INTERVAL_SECONDS"))
+        if os.getenv("MCP_VECTOR_WORKER_THREADS"):
+            config.vector_worker_threads = int(os.getenv("MCP_VECTOR_WORKER_THREADS"))
+        if os.getenv("MCP_VECTOR_FILTER_CACHE_SIZE"):
+            config.vector_filter_cache_size = int(os.getenv("MCP_VECTOR_FILTER_CACHE_SIZE"))
+        if os.getenv("MCP_VECTOR_SEARCH_CACHE_SIZE"):
+            config.vector_search_cache_size = int(os.getenv("MCP_VECTOR_SEARCH_CACHE_SIZE"))
+        if os.getenv("MCP_VECTOR_SEARCH_CACHE_TTL_SECONDS"):
+            config.vector_search_cache_ttl_seconds = int(os.getenv("MCP_VECTOR_SEARCH_CACHE_TTL_SECONDS"))
+        if os.getenv("MCP_VECTOR_CURSOR_TTL_SECONDS"):
+            config.vector_cursor_ttl_seconds = int(os.getenv("MCP_VECTOR_CURSOR_TTL_SECONDS"))
+        if os.getenv("MCP_VECTOR_MAX_CURSORS"):
+            config.vector_max_cursors = int(os.getenv("MCP_VECTOR_MAX_CURSORS"))
+        if os.getenv("MCP_VECTOR_TOMBSTONE_PURGE_RATIO"):
+            config.vector_tombstone_purge_ratio = float(os.getenv("MCP_VECTOR_TOMBSTONE_PURGE_RATIO"))
+        if os.getenv("MCP_VECTOR_LAZY_LOAD"):
+            config.vector_lazy_load = os.getenv("MCP_VECTOR_LAZY_LOAD").lower() == "true"
+        if os.getenv("MCP_VECTOR_MMAP"):
+            config.vector_mmap = os.getenv("MCP_VECTOR_MMAP").lower() == "true"
+        if os.getenv("MCP_VECTOR_MEMORY_BUDGET_MB"):
+            config.vector_memory_budget_mb = int(os.getenv("MCP_VECTOR_MEMORY_BUDGET_MB"))
         
         # 安全配置
         if os.getenv("MCP_API_KEY_REQUIRED"):
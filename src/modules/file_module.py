@@ -1,16 +1,35 @@
 """
 MCP服务器文件访问模块
 """
+import io
 import os
 import shutil
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Form
-from fastapi.responses import FileResponse, JSONResponse
-from typing import List, Optional
+import sqlite3
+import hashlib
+import json
+import base64
+import gzip
+import zlib
+import tarfile
+import zipfile
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from urllib.parse import quote
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
+from python_multipart.multipart import MultipartParser, parse_options_header
 import uuid
 from datetime import datetime
 
 from ..config import MCPServerConfig
+from ..utils.filters import parse_filter
 
 class FileInfo(BaseModel):
     """文件信息模型"""
@@ -20,6 +39,404 @@ class FileInfo(BaseModel):
     content_type: str
     created_at: str
     path: str
+    sha256: Optional[str] = None
+    encoding: Optional[str] = None  # 存储时的压缩编码（zstd或gzip），None表示未压缩
+
+class FileListFilter(BaseModel):
+    """文件列表过滤条件"""
+    ext: List[str] = []  # 扩展名，不含点号，不区分大小写
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    created_after: Optional[str] = None  # ISO格式时间，包含该时间
+    created_before: Optional[str] = None  # ISO格式时间，不包含该时间
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match使用弱比较，忽略W/前缀"""
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return since is not None and int(mtime) <= since.timestamp()
+
+def _compressor(encoding: str):
+    """返回逐块压缩函数和结束时的刷新函数；gzip格式可以直接作为Content-Encoding: gzip返回"""
+    if encoding == "zstd":
+        import zstandard
+        compressor = zstandard.ZstdCompressor().compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+def open_content(info: FileInfo):
+    """以二进制只读方式打开文件内容，压缩存储的文件在读取时解压"""
+    if info.encoding == "gzip":
+        return gzip.open(info.path, "rb")
+    if info.encoding == "zstd":
+        import zstandard
+        # 解压流本身不支持按行读取，外面包一层缓冲
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(info.path, "rb"), closefd=True))
+    return open(info.path, "rb")
+
+def _accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """客户端的Accept-Encoding是否接受指定编码（q=0表示不接受）"""
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.partition(";")
+        if name.strip().lower() != encoding:
+            continue
+        params = params.strip().replace(" ", "")
+        try:
+            return not params.startswith("q=") or float(params[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+def _parse_range(range_header: str, size: int) -> Optional[tuple]:
+    """解析单个字节范围，返回包含两端的(start, end)；多个范围或格式不支持时返回None，按完整响应处理"""
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start, sep, end = ranges.strip().partition("-")
+    try:
+        if not sep:
+            return None
+        if start:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+        elif end:
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail=f"请求范围无效: {range_header}", headers={"content-range": f"bytes */{size}"})
+    return start, end
+
+def _content_disposition(filename: str) -> str:
+    """与FileResponse一致的附件文件名，非ASCII文件名使用filename*"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+def _hash_file(path: str, chunk_size: int) -> str:
+    """分块计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _encode_cursor(info: FileInfo, sort: str, descending: bool) -> str:
+    """把排序方式和一页最后一条记录的(排序字段值, id)编码为游标"""
+    order = "desc" if descending else "asc"
+    return base64.urlsafe_b64encode(json.dumps([sort, order, getattr(info, sort), info.id]).encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str, sort: str, descending: bool) -> tuple:
+    """解析游标，游标的排序方式与本次请求不一致时返回400"""
+    try:
+        cursor_sort, cursor_order, value, file_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail=f"无效的游标: {cursor}")
+    if (cursor_sort, cursor_order) != (sort, "desc" if descending else "asc"):
+        raise HTTPException(status_code=400, detail=f"游标的排序方式与请求不一致: {cursor_sort} {cursor_order}")
+    return value, file_id
+
+def _parse_time_bound(name: str, value: Optional[str]) -> Optional[str]:
+    """把ISO格式的时间参数转换为与created_at相同的本地时间格式，以便按字符串比较"""
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无效的时间格式: {name}={value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat()
+
+class FileLinkRequest(BaseModel):
+    """按内容哈希创建文件的请求模型"""
+    sha256: str
+    filename: str
+    content_type: Optional[str] = None
+
+class FileArchiveEntry(BaseModel):
+    """归档下载中的一个文件"""
+    id: str
+    name: Optional[str] = None  # 归档内的文件名，默认使用原文件名
+    compress: Optional[bool] = None  # 覆盖请求级别的压缩设置，仅zip格式支持逐个文件设置
+
+class FileArchiveRequest(BaseModel):
+    """归档下载请求模型"""
+    files: List[FileArchiveEntry]
+    format: str = "zip"  # zip或tar
+    compress: bool = False  # zip为各文件默认是否deflate压缩，tar为是否整体gzip压缩
+
+class _ArchiveSink:
+    """只追加写入的缓冲区，zipfile写入的数据由生成器及时取走"""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+class FilePreviewRequest(BaseModel):
+    """结构化预览请求模型"""
+    offset: int = 0  # 从第几行数据开始读取（不含表头，从0开始）
+    limit: int = 20
+    columns: Optional[List[str]] = None  # 返回的列，默认全部列
+    filter: Optional[Dict[str, Any]] = None  # 过滤条件，如{"city": "北京", "age": {"gte": 18}}
+
+class FilePreviewColumn(BaseModel):
+    """预览的列信息"""
+    name: str
+    dtype: str
+
+class FilePreview(BaseModel):
+    """结构化预览结果模型"""
+    columns: List[FilePreviewColumn]  # 文件的全部列，类型由前若干行推断
+    rows: List[Dict[str, Any]]
+    offset: int
+    next_offset: Optional[int] = None  # 继续读取时使用的offset，已读到文件末尾时为空
+    total_rows: Optional[int] = None  # 文件的数据行数
+
+_PREVIEW_FORMATS = ("csv", "json", "jsonl")
+
+def _filter_mask(frame: pd.DataFrame, conditions: List[Tuple[str, str, Any]]) -> pd.Series:
+    """计算一批行的过滤掩码"""
+    mask = pd.Series(True, index=frame.index)
+    for key, op, value in conditions:
+        column = frame[key]
+        if op == "eq":
+            mask &= column == value
+        elif op == "in":
+            mask &= column.isin(value)
+        else:
+            # 范围比较按数值进行，无法转换为数字的值不匹配
+            numeric = pd.to_numeric(column, errors="coerce")
+            mask &= {"gt": numeric.gt, "gte": numeric.ge, "lt": numeric.lt, "lte": numeric.le}[op](value)
+    return mask
+
+# 按Content-Length提前拒绝时，为multipart边界和字段头部预留的余量
+_MULTIPART_OVERHEAD = 64 * 1024
+
+# 上传接口直接解析请求流，在OpenAPI文档中手动声明请求体
+_UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+}
+
+class UploadSessionCreate(BaseModel):
+    """分片上传会话创建请求模型"""
+    filename: str
+    size: int  # 文件总大小（字节）
+    part_size: int = 8 * 1024 * 1024  # 除最后一片外每片的大小（字节）
+    content_type: Optional[str] = None
+
+class UploadSession(BaseModel):
+    """分片上传会话模型"""
+    id: str
+    filename: str
+    content_type: str
+    size: int
+    part_size: int
+    part_count: int
+    received_parts: List[int] = []  # 已写入并落盘的分片序号，从0开始
+    created_at: str
+
+class _FileCatalog:
+    """文件目录：存储目录下的SQLite文件，按文件ID索引已上传文件的信息"""
+    FILENAME = ".catalog.db"
+    BLOBS_DIR = ".blobs"  # 按内容哈希分片存储的数据块目录
+    _FIELDS = ("id", "filename", "size", "content_type", "created_at", "path", "sha256", "encoding")
+    _COLUMNS = ", ".join(_FIELDS)
+    _INSERT = f"INSERT OR REPLACE INTO files ({_COLUMNS}) VALUES ({', '.join('?' * len(_FIELDS))})"
+    SORT_FIELDS = ("created_at", "size", "filename")
+
+    def __init__(self, storage_path: str):
+        self.storage_path = storage_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(storage_path, self.FILENAME), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "id TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL, content_type TEXT NOT NULL, "
+                "created_at TEXT NOT NULL, path TEXT NOT NULL, sha256 TEXT, encoding TEXT)"
+            )
+            # 旧版本的目录没有encoding列
+            if "encoding" not in {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}:
+                self._conn.execute("ALTER TABLE files ADD COLUMN encoding TEXT")
+            # 列表的每种排序方式对应一个索引，分页时按(排序字段, id)定位
+            for field in self.SORT_FIELDS:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS files_{field} ON files ({field}, id)")
+            # 多个文件ID可以指向同一个数据块，按哈希查找已有内容，按路径统计引用数
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_path ON files (path)")
+
+    def _row_to_info(self, row) -> FileInfo:
+        return FileInfo(**dict(zip(self._FIELDS, row)))
+
+    def add(self, info: FileInfo):
+        """写入一条文件记录"""
+        with self._lock, self._conn:
+            self._conn.execute(self._INSERT, tuple(getattr(info, field) for field in self._FIELDS))
+
+    def get(self, file_id: str) -> Optional[FileInfo]:
+        """按文件ID查找记录，未找到时返回None"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._COLUMNS} FROM files WHERE id = ?", (file_id,)).fetchone()
+        return self._row_to_info(row) if row else None
+
+    def page(self, filters: FileListFilter, sort: str = "created_at", descending: bool = False, after: Optional[tuple] = None, limit: Optional[int] = None) -> List[FileInfo]:
+        """按过滤条件和排序返回一页文件，after为上一页最后一条记录的(排序字段值, id)"""
+        conditions, params = [], []
+        if filters.ext:
+            conditions.append("(" + " OR ".join("lower(filename) LIKE ?" for _ in filters.ext) + ")")
+            params.extend(f"%.{ext}" for ext in filters.ext)
+        for column, op, value in (
+            ("size", ">=", filters.min_size), ("size", "<=", filters.max_size),
+            ("created_at", ">=", filters.created_after), ("created_at", "<", filters.created_before)
+        ):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        if after is not None:
+            conditions.append(f"({sort}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+
+        sql = f"SELECT {self._COLUMNS} FROM files"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        direction = "DESC" if descending else "ASC"
+        sql += f" ORDER BY {sort} {direction}, id {direction}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_info(row) for row in rows]
+
+    def find_by_hash(self, sha256: str) -> Optional[FileInfo]:
+        """查找任意一个内容哈希相同的文件，未找到时返回None"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._COLUMNS} FROM files WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+        return self._row_to_info(row) if row else None
+
+    def path_refcount(self, path: str) -> int:
+        """指向同一存储路径的文件数量"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files WHERE path = ?", (path,)).fetchone()[0]
+
+    def set_hash(self, file_id: str, sha256: str):
+        """补充文件的内容哈希"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE files SET sha256 = ? WHERE id = ?", (sha256, file_id))
+
+    def delete(self, file_id: str):
+        """删除一条文件记录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def reconcile(self):
+        """使目录与存储目录一致：删除文件已不存在的记录，为目录中缺少的文件补建记录"""
+        names = {name for name in os.listdir(self.storage_path) if not name.startswith(".")}
+        with self._lock:
+            rows = self._conn.execute("SELECT id, path FROM files").fetchall()
+        known = set()
+        missing = []
+        for file_id, path in rows:
+            name = os.path.basename(path)
+            if os.path.dirname(path) == self.storage_path and name in names:
+                known.add(name)
+            elif not os.path.exists(path):
+                missing.append(file_id)
+
+        added = []
+        for name in names - known:
+            path = os.path.join(self.storage_path, name)
+            if not os.path.isfile(path):
+                continue
+            # 存储文件名为"{文件ID}_{原文件名}"，不符合该格式的文件以完整文件名作为ID
+            file_id, _, filename = name.partition("_")
+            if not filename:
+                file_id = filename = name
+            file_stat = os.stat(path)
+            added.append(FileInfo(
+                id=file_id,
+                filename=filename,
+                size=file_stat.st_size,
+                content_type=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                created_at=datetime.fromtimestamp(file_stat.st_ctime).isoformat(),
+                path=path
+            ))
+
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM files WHERE id = ?", ((file_id,) for file_id in missing))
+            self._conn.executemany(self._INSERT, (tuple(getattr(info, field) for field in self._FIELDS) for info in added))
+        # 清理没有文件引用的数据块（例如移入数据块后、写入目录前服务中断）
+        referenced = {path for _, path in rows}
+        orphaned = 0
+        for root, _, filenames in os.walk(os.path.join(self.storage_path, self.BLOBS_DIR)):
+            for name in filenames:
+                path = os.path.join(root, name)
+                if path not in referenced:
+                    os.remove(path)
+                    orphaned += 1
+        if missing or added or orphaned:
+            print(f"文件目录已同步: 新增{len(added)}条, 删除{len(missing)}条, 清理数据块{orphaned}个")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# 每个存储目录只打开一个文件目录连接，文件模块和按文件ID查找文件的其他模块共用
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def _open_catalog(storage_path: str) -> _FileCatalog:
+    """返回存储目录对应的文件目录，首次使用时打开"""
+    key = os.path.abspath(storage_path)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _FileCatalog(storage_path)
+            _catalogs[key] = catalog
+        return catalog
+
+def _close_catalog(storage_path: str):
+    """关闭存储目录对应的文件目录"""
+    with _catalogs_lock:
+        catalog = _catalogs.pop(os.path.abspath(storage_path), None)
+    if catalog is not None:
+        catalog.close()
+
+def find_file(storage_path: str, file_id: str) -> Optional[FileInfo]:
+    """按文件ID在文件目录中查找文件信息，未找到时返回None"""
+    return _open_catalog(storage_path).get(file_id)
 
 class FileModule:
     """文件访问模块"""
@@ -27,95 +444,793 @@ class FileModule:
         self.config = config
         self.router = APIRouter(prefix="/files", tags=["文件访问"])
         self._register_routes()
+        self.router.add_event_handler("shutdown", self.close)
+
+        # 压缩存储使用zstd时需要zstandard；无法导入时启动失败，而不是改用其他编码写入新文件
+        if config.file_compression == "zstd":
+            try:
+                import zstandard
+            except ImportError as e:
+                raise RuntimeError(f"文件压缩存储配置为zstd，但无法导入zstandard: {str(e)}")
+        elif config.file_compression not in ("none", "gzip"):
+            raise ValueError(f"不支持的文件压缩方式: {config.file_compression}")
+
+        # 数据块的写入和删除需要与引用数检查互斥
+        self._blob_lock = threading.Lock()
+
+        # 打开文件目录，并与存储目录中的实际文件同步
+        os.makedirs(config.file_storage_path, exist_ok=True)
+        self.catalog = _open_catalog(config.file_storage_path)
+        self.catalog.reconcile()
+
+        # 服务中断时遗留的上传临时文件
+        for name in os.listdir(self._temp_path()):
+            os.remove(os.path.join(self._temp_path(), name))
+
+        # 结构化预览的列信息和行偏移索引按内容哈希保存，最近使用的保留在内存中
+        self._preview_cache = OrderedDict()
+        self._preview_lock = threading.Lock()
+
+        # 分片上传会话保存在存储目录下，服务重启后可以继续上传
+        self._sessions_lock = threading.Lock()
+        self._expire_upload_sessions()
+
+    def close(self):
+        """关闭文件目录"""
+        _close_catalog(self.config.file_storage_path)
+
+    def _temp_path(self) -> str:
+        """上传中的临时文件目录，与存储目录在同一文件系统上以便原子重命名"""
+        path = os.path.join(self.config.file_storage_path, ".tmp")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _sessions_path(self) -> str:
+        """分片上传会话目录：每个会话一个按文件大小预分配的数据文件和一个状态文件"""
+        path = os.path.join(self.config.file_storage_path, ".uploads")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _session_files(self, session_id: str):
+        """会话的(数据文件, 状态文件)路径"""
+        base = os.path.join(self._sessions_path(), session_id)
+        return f"{base}.part", f"{base}.json"
+
+    def _load_session(self, session_id: str) -> UploadSession:
+        """读取会话状态，会话不存在时返回404"""
+        if not all(c in "0123456789abcdef" for c in session_id):
+            raise HTTPException(status_code=404, detail=f"上传会话未找到: {session_id}")
+        try:
+            with open(self._session_files(session_id)[1], "r", encoding="utf-8") as f:
+                return UploadSession.model_validate_json(f.read())
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"上传会话未找到: {session_id}")
+
+    def _save_session(self, session: UploadSession):
+        """原子替换会话状态文件"""
+        path = self._session_files(session.id)[1]
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(session.model_dump_json())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def _remove_session(self, session_id: str):
+        for path in self._session_files(session_id):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _expire_upload_sessions(self):
+        """删除创建时间超过有效期的会话，以及没有状态文件的过期数据文件"""
+        deadline = datetime.now().timestamp() - self.config.file_upload_session_ttl_hours * 3600
+        path = self._sessions_path()
+        for name in os.listdir(path):
+            session_id, ext = os.path.splitext(name)
+            if ext == ".json":
+                session = self._load_session(session_id)
+                if datetime.fromisoformat(session.created_at).timestamp() < deadline:
+                    self._remove_session(session_id)
+            elif not os.path.exists(os.path.join(path, f"{session_id}.json")) and os.path.getmtime(os.path.join(path, name)) < deadline:
+                os.remove(os.path.join(path, name))
+
+    def _create_session(self, request: UploadSessionCreate) -> UploadSession:
+        """创建分片上传会话，并按文件大小预分配数据文件"""
+        max_size = self.config.file_upload_session_max_mb * 1024 * 1024
+        if request.size <= 0 or request.size > max_size:
+            raise HTTPException(status_code=400, detail=f"文件大小必须大于0且不超过{self.config.file_upload_session_max_mb}MB")
+        if request.part_size <= 0:
+            raise HTTPException(status_code=400, detail=f"无效的分片大小: {request.part_size}")
+        self._expire_upload_sessions()
+
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            filename=request.filename,
+            content_type=request.content_type or mimetypes.guess_type(request.filename)[0] or "application/octet-stream",
+            size=request.size,
+            part_size=request.part_size,
+            part_count=(request.size + request.part_size - 1) // request.part_size,
+            created_at=datetime.now().isoformat()
+        )
+        data_path = self._session_files(session.id)[0]
+        with open(data_path, "wb") as f:
+            f.truncate(request.size)
+        self._save_session(session)
+        return session
+
+    async def _write_part(self, session_id: str, part_number: int, request: Request) -> UploadSession:
+        """把请求体流式写入数据文件中该分片的偏移处，落盘后记录为已接收"""
+        session = await run_in_threadpool(self._load_session, session_id)
+        if part_number < 0 or part_number >= session.part_count:
+            raise HTTPException(status_code=400, detail=f"无效的分片序号: {part_number}，共{session.part_count}片")
+        offset = part_number * session.part_size
+        expected = min(session.part_size, session.size - offset)
+
+        try:
+            fd = await run_in_threadpool(os.open, self._session_files(session_id)[0], os.O_WRONLY)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"上传会话未找到: {session_id}")
+        try:
+            written = 0
+            async for chunk in request.stream():
+                if written + len(chunk) > expected:
+                    raise HTTPException(status_code=400, detail=f"分片大小超过{expected}字节")
+                await run_in_threadpool(os.pwrite, fd, chunk, offset + written)
+                written += len(chunk)
+            if written != expected:
+                raise HTTPException(status_code=400, detail=f"分片大小不匹配，期望: {expected}, 实际: {written}")
+            await run_in_threadpool(os.fsync, fd)
+        finally:
+            os.close(fd)
+        return await run_in_threadpool(self._mark_part, session_id, part_number)
+
+    def _mark_part(self, session_id: str, part_number: int) -> UploadSession:
+        """记录已接收的分片，并发写入的分片依次更新状态文件"""
+        with self._sessions_lock:
+            session = self._load_session(session_id)
+            if part_number not in session.received_parts:
+                session.received_parts = sorted(session.received_parts + [part_number])
+                self._save_session(session)
+        return session
+
+    def _complete_session(self, session_id: str) -> FileInfo:
+        """所有分片到齐后计算内容哈希，并把数据文件直接移入数据块路径"""
+        with self._sessions_lock:
+            session = self._load_session(session_id)
+            missing = sorted(set(range(session.part_count)) - set(session.received_parts))
+            if missing:
+                raise HTTPException(status_code=400, detail=f"分片未上传完成，缺少: {missing[:20]}")
+            data_path, state_path = self._session_files(session_id)
+            # 先删除状态文件，防止并发的完成请求重复登记
+            os.remove(state_path)
+
+        info = FileInfo(
+            id=str(uuid.uuid4()),
+            filename=session.filename,
+            size=session.size,
+            content_type=session.content_type,
+            created_at=datetime.now().isoformat(),
+            path=data_path,
+            sha256=_hash_file(data_path, self.config.file_chunk_size_kb * 1024)
+        )
+        return self._store_file(data_path, info)
+
+    def _archive_entries(self, request: FileArchiveRequest) -> list:
+        """查找归档中的全部文件，返回(文件信息, 归档内文件名, 是否压缩)；同名文件加序号区分"""
+        entries = []
+        names = set()
+        for entry in request.files:
+            info = self.catalog.get(entry.id)
+            if info is None:
+                raise HTTPException(status_code=404, detail=f"文件未找到: {entry.id}")
+            # 去掉绝对路径和上级目录，避免解压时写到目标目录之外
+            parts = (entry.name or info.filename).replace("\\", "/").split("/")
+            name = "/".join(part for part in parts if part not in ("", ".", "..")) or info.id
+            base, ext = os.path.splitext(name)
+            counter = 1
+            while name in names:
+                name = f"{base} ({counter}){ext}"
+                counter += 1
+            names.add(name)
+            entries.append((info, name, request.compress if entry.compress is None else entry.compress))
+        return entries
+
+    def _read_chunks(self, info: FileInfo):
+        """分块读取文件内容，压缩存储的文件边读边解压"""
+        chunk_size = self.config.file_chunk_size_kb * 1024
+        with open_content(info) as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                yield chunk
+
+    def _read_range(self, info: FileInfo, start: int, end: int):
+        """读取解压后内容中[start, end]的字节"""
+        position = 0
+        for chunk in self._read_chunks(info):
+            chunk_end = position + len(chunk)
+            if chunk_end > start:
+                yield chunk[max(start - position, 0):end + 1 - position]
+            if chunk_end > end:
+                return
+            position = chunk_end
+
+    def _stream_zip(self, entries: list):
+        """边读取文件边生成zip；输出不可回退，每个文件的大小和CRC写在其数据之后的描述符中"""
+        sink = _ArchiveSink()
+        with zipfile.ZipFile(sink, "w") as archive:
+            for info, name, compress in entries:
+                created = datetime.fromisoformat(info.created_at)
+                zinfo = zipfile.ZipInfo(name, date_time=max(created, datetime(1980, 1, 1)).timetuple()[:6])
+                zinfo.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+                with archive.open(zinfo, "w", force_zip64=info.size >= zipfile.ZIP64_LIMIT) as dest:
+                    for chunk in self._read_chunks(info):
+                        dest.write(chunk)
+                        yield from sink.drain()
+                yield from sink.drain()
+        yield from sink.drain()
+
+    def _stream_tar(self, entries: list, compress: bool):
+        """逐个输出tar头部、文件数据和块对齐填充，compress为True时整体gzip压缩"""
+        gzip_stream = zlib.compressobj(wbits=31) if compress else None
+        def output(data: bytes) -> bytes:
+            return gzip_stream.compress(data) if gzip_stream else data
+
+        for info, name, _ in entries:
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.size = info.size
+            tarinfo.mtime = int(datetime.fromisoformat(info.created_at).timestamp())
+            tarinfo.mode = 0o644
+            yield output(tarinfo.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+            for chunk in self._read_chunks(info):
+                yield output(chunk)
+            remainder = info.size % tarfile.BLOCKSIZE
+            if remainder:
+                yield output(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+        # 归档以两个全零块结束
+        yield output(tarfile.NUL * tarfile.BLOCKSIZE * 2)
+        if gzip_stream:
+            yield gzip_stream.flush()
+
+    def _preview_index_path(self, key: str) -> str:
+        """预览索引按"哈希.扩展名"保存，内容相同的文件共用索引"""
+        return os.path.join(self.config.file_storage_path, ".previews", f"{key}.json")
+
+    def _preview_index(self, info: FileInfo) -> Dict[str, Any]:
+        """返回文件的预览索引：格式、列信息、数据行数和每隔若干行的行首偏移；首次使用时扫描一遍文件建立"""
+        ext = info.filename.split(".")[-1].lower() if "." in info.filename else ""
+        if ext not in _PREVIEW_FORMATS:
+            raise HTTPException(status_code=400, detail=f"不支持预览的文件类型: {ext}")
+        key = f"{self._content_hash(info)}.{ext}"
+        with self._preview_lock:
+            if key in self._preview_cache:
+                self._preview_cache.move_to_end(key)
+                return self._preview_cache[key]
+
+        path = self._preview_index_path(key)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        else:
+            index = self._build_preview_index(info, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.{uuid.uuid4().hex}.tmp", "w", encoding="utf-8") as f:
+                json.dump(index, f)
+                temp_path = f.name
+            os.replace(temp_path, path)
+
+        with self._preview_lock:
+            self._preview_cache[key] = index
+            while len(self._preview_cache) > max(self.config.file_preview_cache_size, 1):
+                self._preview_cache.popitem(last=False)
+        return index
+
+    def _build_preview_index(self, info: FileInfo, ext: str) -> Dict[str, Any]:
+        """推断列信息，并对按行存储的CSV和JSONL记录每隔interval行的行首字节偏移（解压后的偏移）"""
+        sample_rows = self.config.file_preview_chunk_rows
+        try:
+            with open_content(info) as f:
+                if ext == "csv":
+                    sample = pd.read_csv(f, nrows=sample_rows)
+                elif ext == "jsonl":
+                    sample = next(iter(pd.read_json(f, lines=True, chunksize=sample_rows)), pd.DataFrame())
+                else:
+                    sample = pd.read_json(f)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"无法解析文件: {str(e)}")
+        index = {
+            "format": ext,
+            "columns": [{"name": str(name), "dtype": str(dtype)} for name, dtype in sample.dtypes.items()],
+            "interval": self.config.file_preview_index_interval,
+            "offsets": [],
+            "rows": len(sample) if ext == "json" else None
+        }
+        if ext == "json":
+            return index
+
+        # 按块统计换行符的位置，不逐行解析
+        interval = index["interval"]
+        chunk_size = self.config.file_chunk_size_kb * 1024
+        with open_content(info) as f:
+            position = len(f.readline()) if ext == "csv" else 0
+            rows = 0
+            index["offsets"].append(position)
+            last = b"\n"
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10)
+                # 第rows + i + 1行从第i个换行符之后开始
+                row_numbers = rows + 1 + np.arange(len(newlines))
+                marks = newlines[row_numbers % interval == 0]
+                index["offsets"].extend(int(position + mark + 1) for mark in marks)
+                rows += len(newlines)
+                position += len(chunk)
+                last = chunk[-1:]
+            if last != b"\n":
+                rows += 1
+        # 以换行结尾时最后记录的偏移可能指向文件末尾
+        index["offsets"] = index["offsets"][:(rows + interval - 1) // interval] or [index["offsets"][0]]
+        index["rows"] = rows
+        return index
+
+    def _preview(self, info: FileInfo, request: FilePreviewRequest) -> FilePreview:
+        """从offset所在的索引位置开始按块读取，返回投影和过滤后的一页结果"""
+        index = self._preview_index(info)
+        names = [column["name"] for column in index["columns"]]
+        conditions = parse_filter(request.filter) if request.filter else []
+        for name in (request.columns or []) + [key for key, _, _ in conditions]:
+            if name not in names:
+                raise HTTPException(status_code=400, detail=f"列不存在: {name}")
+        columns = request.columns or names
+        usecols = [name for name in names if name in columns or any(key == name for key, _, _ in conditions)]
+
+        rows = []
+        next_offset = None
+        for row_number, frame in self._preview_frames(info, index, request.offset, usecols):
+            frame.index = pd.RangeIndex(row_number, row_number + len(frame))
+            if conditions:
+                frame = frame[_filter_mask(frame, conditions)]
+            frame = frame[columns].iloc[:request.limit - len(rows)]
+            rows.extend(json.loads(frame.to_json(orient="records", date_format="iso", force_ascii=False)))
+            if len(rows) >= request.limit:
+                next_offset = int(frame.index[-1]) + 1
+                break
+        if next_offset is not None and next_offset >= index["rows"]:
+            next_offset = None
+
+        return FilePreview(
+            columns=[FilePreviewColumn(**column) for column in index["columns"]],
+            rows=rows,
+            offset=request.offset,
+            next_offset=next_offset,
+            total_rows=index["rows"]
+        )
+
+    def _preview_frames(self, info: FileInfo, index: Dict[str, Any], offset: int, usecols: List[str]):
+        """从第offset行开始按块产出(起始行号, 数据块)"""
+        chunk_rows = self.config.file_preview_chunk_rows
+        if offset >= index["rows"]:
+            return
+        if index["format"] == "json":
+            # JSON数组无法按行定位，只能整体读取
+            with open_content(info) as f:
+                frame = pd.read_json(f)
+            for start in range(offset, len(frame), chunk_rows):
+                yield start, frame.iloc[start:start + chunk_rows][usecols]
+            return
+
+        # 定位到offset之前最近的索引行，再跳过剩余的行
+        slot = offset // index["interval"]
+        first_row = slot * index["interval"]
+        with open_content(info) as f:
+            if f.seekable():
+                f.seek(index["offsets"][slot])
+            else:
+                # zstd解压流只能顺序读取，读取并丢弃之前的数据
+                remaining = index["offsets"][slot]
+                chunk_size = self.config.file_chunk_size_kb * 1024
+                while remaining > 0:
+                    skipped = len(f.read(min(chunk_size, remaining)))
+                    if not skipped:
+                        break
+                    remaining -= skipped
+            if index["format"] == "csv":
+                names = [column["name"] for column in index["columns"]]
+                reader = pd.read_csv(f, header=None, names=names, usecols=usecols, skiprows=offset - first_row, chunksize=chunk_rows)
+            else:
+                reader = pd.read_json(f, lines=True, chunksize=chunk_rows)
+            skip = 0 if index["format"] == "csv" else offset - first_row
+            row_number = offset
+            with reader:
+                for frame in reader:
+                    if skip:
+                        dropped = min(skip, len(frame))
+                        frame, skip = frame.iloc[dropped:], skip - dropped
+                        if frame.empty:
+                            continue
+                    if index["format"] == "jsonl":
+                        frame = frame.reindex(columns=usecols)
+                    yield row_number, frame
+                    row_number += len(frame)
+
+    def _stream_files(self, filters: FileListFilter, sort: str, descending: bool, after: Optional[tuple], limit: Optional[int]):
+        """按批读取文件目录并逐行输出JSON，limit为None时输出全部匹配的文件；
+        指定limit且本页已满时，最后一行为{"next_cursor": ...}，给出下一页的游标"""
+        batch_size = self.config.file_list_batch_size
+        remaining = limit
+        last = None
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            files = self.catalog.page(filters, sort, descending, after, size)
+            for info in files:
+                yield info.model_dump_json() + "\n"
+            if len(files) < size:
+                return
+            last = files[-1]
+            after = (getattr(last, sort), last.id)
+            if remaining is not None:
+                remaining -= len(files)
+        yield json.dumps({"next_cursor": _encode_cursor(last, sort, descending)}) + "\n"
+
+    def _content_hash(self, info: FileInfo) -> str:
+        """返回文件的SHA-256，启动同步时补建的记录在首次使用时计算并写回目录"""
+        if info.sha256:
+            return info.sha256
+        info.sha256 = _hash_file(info.path, self.config.file_chunk_size_kb * 1024)
+        self.catalog.set_hash(info.id, info.sha256)
+        return info.sha256
+
+    def _blob_path(self, sha256: str) -> str:
+        """数据块按哈希前两级分片存放，如.blobs/ab/cd/abcd..."""
+        return os.path.join(self.config.file_storage_path, _FileCatalog.BLOBS_DIR, sha256[:2], sha256[2:4], sha256)
+
+    def _store_file(self, temp_path: str, info: FileInfo) -> FileInfo:
+        """登记上传的文件：相同内容已存储时复用已有数据块并丢弃临时文件，否则把临时文件原子移入数据块路径"""
+        with self._blob_lock:
+            existing = self.catalog.find_by_hash(info.sha256)
+            if existing is not None and os.path.exists(existing.path):
+                os.remove(temp_path)
+                info.path = existing.path
+                info.encoding = existing.encoding
+            else:
+                info.path = self._blob_path(info.sha256)
+                os.makedirs(os.path.dirname(info.path), exist_ok=True)
+                os.replace(temp_path, info.path)
+            self.catalog.add(info)
+        return info
+
+    def _link_file(self, request: FileLinkRequest) -> FileInfo:
+        """为已存储的内容创建新的文件ID，不传输数据"""
+        with self._blob_lock:
+            existing = self.catalog.find_by_hash(request.sha256.lower())
+            if existing is None or not os.path.exists(existing.path):
+                raise HTTPException(status_code=404, detail=f"内容未找到: {request.sha256}")
+            info = FileInfo(
+                id=str(uuid.uuid4()),
+                filename=request.filename,
+                size=existing.size,
+                content_type=request.content_type or mimetypes.guess_type(request.filename)[0] or existing.content_type,
+                created_at=datetime.now().isoformat(),
+                path=existing.path,
+                sha256=existing.sha256,
+                encoding=existing.encoding
+            )
+            self.catalog.add(info)
+        return info
+
+    def _delete_file(self, info: FileInfo):
+        """删除文件记录，数据块不再被任何文件引用时一并删除"""
+        with self._blob_lock:
+            self.catalog.delete(info.id)
+            if self.catalog.path_refcount(info.path) == 0 and os.path.exists(info.path):
+                os.remove(info.path)
+            if info.sha256 and self.catalog.find_by_hash(info.sha256) is None:
+                for ext in _PREVIEW_FORMATS:
+                    index_path = self._preview_index_path(f"{info.sha256}.{ext}")
+                    if os.path.exists(index_path):
+                        os.remove(index_path)
+
+    def _check_extension(self, filename: str):
+        """检查文件扩展名"""
+        ext = filename.split(".")[-1].lower() if "." in filename else ""
+        if ext not in self.config.allowed_extensions:
+            raise HTTPException(status_code=400, detail=f"不支持的文件类型: {ext}")
+
+    def _storage_encoding(self, filename: str) -> Optional[str]:
+        """按配置和扩展名决定文件是否压缩存储"""
+        ext = filename.split(".")[-1].lower() if "." in filename else ""
+        if self.config.file_compression == "none" or ext not in self.config.file_compression_extensions:
+            return None
+        return self.config.file_compression
+
+    async def _save_upload(self, request: Request) -> Tuple[FileInfo, str]:
+        """边接收边解析multipart请求体，把file字段分块写入临时文件并计算SHA-256，
+        需要压缩存储的文件边写边压缩；超过大小限制时立即中止，不等请求体接收完。
+        返回(尚未入库的文件信息, 临时文件路径)"""
+        max_size = self.config.max_file_size_mb * 1024 * 1024
+        chunk_size = self.config.file_chunk_size_kb * 1024
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_size + _MULTIPART_OVERHEAD:
+            raise HTTPException(status_code=400, detail=f"文件大小超过限制: {self.config.max_file_size_mb}MB")
+
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise HTTPException(status_code=400, detail="请求体必须是包含file字段的multipart/form-data")
+
+        # 解析器的回调是同步的，先收集本次输入产生的事件，再在协程中依次处理
+        events = []
+        headers = {}
+        header = {}
+        callbacks = {
+            "on_part_begin": lambda: headers.clear(),
+            "on_header_field": lambda data, start, end: header.__setitem__("field", header.get("field", b"") + data[start:end]),
+            "on_header_value": lambda data, start, end: header.__setitem__("value", header.get("value", b"") + data[start:end]),
+            "on_header_end": lambda: headers.__setitem__(header.pop("field", b"").lower(), header.pop("value", b"")),
+            "on_headers_finished": lambda: events.append(("headers", dict(headers))),
+            "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+            "on_part_end": lambda: events.append(("end", None)),
+        }
+        parser = MultipartParser(boundary, callbacks)
+
+        info = None
+        temp_path = None
+        f = None
+        compress = flush = None
+        in_file = False
+        file_size = 0
+        digest = hashlib.sha256()
+        buffer = bytearray()
+        try:
+            async for body in request.stream():
+                parser.write(body)
+                for kind, value in events:
+                    if kind == "headers" and info is None:
+                        # 只保存第一个带文件名的file字段，其余字段忽略
+                        _, disposition = parse_options_header(value.get(b"content-disposition", b""))
+                        filename = disposition.get(b"filename")
+                        if disposition.get(b"name") != b"file" or filename is None:
+                            continue
+                        filename = os.path.basename(filename.decode("utf-8", "replace"))
+                        self._check_extension(filename)
+                        encoding = self._storage_encoding(filename)
+                        compress, flush = _compressor(encoding) if encoding else (None, None)
+                        temp_path = os.path.join(await run_in_threadpool(self._temp_path), f"{uuid.uuid4()}.part")
+                        f = await run_in_threadpool(open, temp_path, "wb")
+                        info = FileInfo(
+                            id=str(uuid.uuid4()),
+                            filename=filename,
+                            size=0,
+                            content_type=value.get(b"content-type", b"").decode("latin-1") or "application/octet-stream",
+                            created_at=datetime.now().isoformat(),
+                            path=temp_path,
+                            encoding=encoding
+                        )
+                        in_file = True
+                    elif kind == "data" and in_file:
+                        file_size += len(value)
+                        if file_size > max_size:
+                            raise HTTPException(status_code=400, detail=f"文件大小超过限制: {self.config.max_file_size_mb}MB")
+                        digest.update(value)
+                        buffer += value
+                    elif kind == "end" and in_file:
+                        in_file = False
+                    if len(buffer) >= chunk_size or (buffer and not in_file):
+                        data = bytes(buffer)
+                        buffer.clear()
+                        await run_in_threadpool(f.write, await run_in_threadpool(compress, data) if compress else data)
+                events.clear()
+            parser.finalize()
+            if info is None:
+                raise HTTPException(status_code=400, detail="请求体必须是包含file字段的multipart/form-data")
+            if in_file:
+                raise HTTPException(status_code=400, detail="请求体不完整")
+            if flush:
+                await run_in_threadpool(f.write, flush())
+            await run_in_threadpool(f.close)
+            info.size = file_size
+            info.sha256 = digest.hexdigest()
+            return info, temp_path
+        except BaseException:
+            if f is not None:
+                f.close()
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
 
     def _register_routes(self):
         """注册路由"""
-        @self.router.post("/upload", response_model=FileInfo)
-        async def upload_file(file: UploadFile = File(...)):
+        @self.router.post("/upload", response_model=FileInfo, openapi_extra=_UPLOAD_REQUEST_BODY)
+        async def upload_file(request: Request):
             """上传文件"""
-            # 检查文件扩展名
-            ext = file.filename.split(".")[-1].lower() if "." in file.filename else ""
-            if ext not in self.config.allowed_extensions:
-                raise HTTPException(status_code=400, detail=f"不支持的文件类型: {ext}")
-
-            # 检查文件大小
-            file_size = 0
-            content = await file.read()
-            file_size = len(content)
-            await file.seek(0)  # 重置文件指针
-
-            if file_size > self.config.max_file_size_mb * 1024 * 1024:
-                raise HTTPException(status_code=400, detail=f"文件大小超过限制: {self.config.max_file_size_mb}MB")
-
-            # 生成唯一文件ID和存储路径
-            file_id = str(uuid.uuid4())
-            safe_filename = f"{file_id}_{file.filename}"
-            file_path = os.path.join(self.config.file_storage_path, safe_filename)
-
-            # 保存文件
-            with open(file_path, "wb") as f:
-                f.write(content)
-
-            # 返回文件信息
-            return FileInfo(
-                id=file_id,
-                filename=file.filename,
-                size=file_size,
-                content_type=file.content_type or "application/octet-stream",
-                created_at=datetime.now().isoformat(),
-                path=file_path
+            # 直接解析请求流：检查扩展名、分块保存到临时文件并计算内容哈希，
+            # 请求体不会先整体缓存到磁盘
+            info, temp_path = await self._save_upload(request)
+
+            # 按内容哈希存储并记入文件目录
+            return await run_in_threadpool(self._store_file, temp_path, info)
+
+        @self.router.post("/link", response_model=FileInfo)
+        async def link_file(request: FileLinkRequest):
+            """按内容哈希创建文件，内容已存储时无需重新上传"""
+            self._check_extension(request.filename)
+            return await run_in_threadpool(self._link_file, request)
+
+        @self.router.post("/uploads", response_model=UploadSession)
+        async def create_upload_session(request: UploadSessionCreate):
+            """创建分片上传会话"""
+            self._check_extension(request.filename)
+            return await run_in_threadpool(self._create_session, request)
+
+        @self.router.get("/uploads/{session_id}", response_model=UploadSession)
+        async def get_upload_session(session_id: str):
+            """查询分片上传会话，断线后据此只补传缺少的分片"""
+            return await run_in_threadpool(self._load_session, session_id)
+
+        @self.router.put("/uploads/{session_id}/parts/{part_number}", response_model=UploadSession)
+        async def upload_part(session_id: str, part_number: int, request: Request):
+            """上传一个分片，请求体为分片的原始字节；不同分片可以并发上传，重复上传会覆盖"""
+            return await self._write_part(session_id, part_number, request)
+
+        @self.router.post("/uploads/{session_id}/complete", response_model=FileInfo)
+        async def complete_upload_session(session_id: str):
+            """完成分片上传，生成文件"""
+            return await run_in_threadpool(self._complete_session, session_id)
+
+        @self.router.delete("/uploads/{session_id}")
+        async def abort_upload_session(session_id: str):
+            """取消分片上传会话并删除已上传的分片"""
+            await run_in_threadpool(self._load_session, session_id)
+            await run_in_threadpool(self._remove_session, session_id)
+            return {"message": f"上传会话已取消: {session_id}"}
+
+        @self.router.post("/archive")
+        async def download_archive(request: FileArchiveRequest):
+            """把多个文件打包为zip或tar流式下载，不在内存或磁盘中预先生成归档"""
+            if request.format not in ("zip", "tar"):
+                raise HTTPException(status_code=400, detail=f"不支持的归档格式: {request.format}")
+            if not request.files:
+                raise HTTPException(status_code=400, detail="文件列表不能为空")
+            entries = await run_in_threadpool(self._archive_entries, request)
+
+            if request.format == "zip":
+                content, media_type, filename = self._stream_zip(entries), "application/zip", "files.zip"
+            elif request.compress:
+                content, media_type, filename = self._stream_tar(entries, True), "application/gzip", "files.tar.gz"
+            else:
+                content, media_type, filename = self._stream_tar(entries, False), "application/x-tar", "files.tar"
+            return StreamingResponse(
+                content,
+                media_type=media_type,
+                headers={"content-disposition": f'attachment; filename="{filename}"'}
             )
 
+        @self.router.post("/{file_id}/preview", response_model=FilePreview)
+        async def preview_file(file_id: str, request: FilePreviewRequest):
+            """按块读取CSV、JSON或JSONL文件，返回指定列和过滤后的一页数据"""
+            if request.offset < 0 or request.limit <= 0:
+                raise HTTPException(status_code=400, detail="offset不能小于0，limit必须大于0")
+            info = await run_in_threadpool(self.catalog.get, file_id)
+            if info is None:
+                raise HTTPException(status_code=404, detail=f"文件未找到: {file_id}")
+            return await run_in_threadpool(self._preview, info, request)
+
         @self.router.get("/list", response_model=List[FileInfo])
-        async def list_files():
-            """列出所有文件"""
-            files = []
-            for filename in os.listdir(self.config.file_storage_path):
-                file_path = os.path.join(self.config.file_storage_path, filename)
-                if os.path.isfile(file_path):
-                    # 解析文件ID
-                    file_id = filename.split("_")[0] if "_" in filename else "unknown"
-                    original_filename = "_".join(filename.split("_")[1:]) if "_" in filename else filename
-
-                    # 获取文件信息
-                    file_stat = os.stat(file_path)
-                    files.append(FileInfo(
-                        id=file_id,
-                        filename=original_filename,
-                        size=file_stat.st_size,
-                        content_type="application/octet-stream",  # 简化处理
-                        created_at=datetime.fromtimestamp(file_stat.st_ctime).isoformat(),
-                        path=file_path
-                    ))
+        async def list_files(
+            response: Response,
+            limit: Optional[int] = Query(None, description="每页数量，未指定时返回全部文件"),
+            cursor: Optional[str] = Query(None, description="上一页响应头X-Next-Cursor中的游标"),
+            ext: Optional[str] = Query(None, description="按扩展名过滤，多个用逗号分隔，如csv,json"),
+            min_size: Optional[int] = Query(None, description="最小文件大小（字节）"),
+            max_size: Optional[int] = Query(None, description="最大文件大小（字节）"),
+            created_after: Optional[str] = Query(None, description="创建时间下限（ISO格式，包含）"),
+            created_before: Optional[str] = Query(None, description="创建时间上限（ISO格式，不包含）"),
+            sort: str = Query("created_at", description="排序字段: created_at、size或filename"),
+            order: str = Query("asc", description="排序方向: asc或desc"),
+            format: str = Query("json", description="响应格式: json返回数组，ndjson逐行流式返回")
+        ):
+            """列出文件，支持过滤、排序和游标分页"""
+            if sort not in _FileCatalog.SORT_FIELDS:
+                raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort}")
+            if order not in ("asc", "desc"):
+                raise HTTPException(status_code=400, detail=f"不支持的排序方向: {order}")
+            if format not in ("json", "ndjson"):
+                raise HTTPException(status_code=400, detail=f"不支持的响应格式: {format}")
+            if limit is not None and limit <= 0:
+                raise HTTPException(status_code=400, detail="limit必须大于0")
+
+            filters = FileListFilter(
+                ext=[item.strip().lower().lstrip(".") for item in ext.split(",") if item.strip()] if ext else [],
+                min_size=min_size,
+                max_size=max_size,
+                created_after=_parse_time_bound("created_after", created_after),
+                created_before=_parse_time_bound("created_before", created_before)
+            )
+            descending = order == "desc"
+            after = _decode_cursor(cursor, sort, descending) if cursor else None
+
+            if format == "ndjson":
+                return StreamingResponse(
+                    self._stream_files(filters, sort, descending, after, limit),
+                    media_type="application/x-ndjson"
+                )
+
+            files = await run_in_threadpool(self.catalog.page, filters, sort, descending, after, limit)
+            if limit is not None and len(files) == limit:
+                response.headers["X-Next-Cursor"] = _encode_cursor(files[-1], sort, descending)
             return files
 
         @self.router.get("/download/{file_id}")
-        async def download_file(file_id: str):
-            """下载文件"""
+        async def download_file(file_id: str, request: Request):
+            """下载文件，支持Range分段请求和基于ETag、修改时间的条件请求"""
             # 查找文件
-            for filename in os.listdir(self.config.file_storage_path):
-                if filename.startswith(f"{file_id}_"):
-                    file_path = os.path.join(self.config.file_storage_path, filename)
-                    original_filename = "_".join(filename.split("_")[1:])
-                    return FileResponse(
-                        path=file_path,
-                        filename=original_filename,
-                        media_type="application/octet-stream"
-                    )
-
-            raise HTTPException(status_code=404, detail=f"文件未找到: {file_id}")
+            info = await run_in_threadpool(self.catalog.get, file_id)
+            if info is None:
+                raise HTTPException(status_code=404, detail=f"文件未找到: {file_id}")
+            try:
+                stat_result = await run_in_threadpool(os.stat, info.path)
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail=f"文件未找到: {file_id}")
+
+            # 压缩存储的文件在客户端接受该编码且不是分段请求时原样返回，否则边读边解压
+            passthrough = info.encoding is not None and "range" not in request.headers and _accepts_encoding(
+                request.headers.get("accept-encoding"), info.encoding
+            )
+
+            # 强ETag取内容哈希，文件内容不变时ETag不变；压缩编码的表示使用不同的ETag
+            content_hash = await run_in_threadpool(self._content_hash, info)
+            etag = f'"{content_hash}-{info.encoding}"' if passthrough else f'"{content_hash}"'
+            last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+            headers = {"etag": etag, "last-modified": last_modified}
+            if info.encoding is not None:
+                headers["vary"] = "Accept-Encoding"
+
+            # 同时提供两个条件时以If-None-Match为准
+            if_none_match = request.headers.get("if-none-match")
+            if_modified_since = request.headers.get("if-modified-since")
+            if (if_none_match is not None and _etag_matches(if_none_match, etag)) or (
+                if_none_match is None and if_modified_since is not None and _not_modified_since(if_modified_since, stat_result.st_mtime)
+            ):
+                return Response(status_code=304, headers=headers)
+
+            if info.encoding is None or passthrough:
+                # FileResponse根据Range和If-Range请求头返回206分段响应
+                if passthrough:
+                    headers["content-encoding"] = info.encoding
+                return FileResponse(
+                    path=info.path,
+                    filename=info.filename,
+                    media_type=info.content_type,
+                    headers=headers,
+                    stat_result=stat_result
+                )
+
+            # 解压后的内容不能直接定位，分段请求从头解压并跳过范围之前的数据
+            headers["accept-ranges"] = "bytes"
+            headers["content-disposition"] = _content_disposition(info.filename)
+            byte_range = None
+            if_range = request.headers.get("if-range")
+            if "range" in request.headers and (if_range is None or if_range in (etag, last_modified)):
+                byte_range = _parse_range(request.headers["range"], info.size)
+            if byte_range is None:
+                headers["content-length"] = str(info.size)
+                return StreamingResponse(self._read_chunks(info), media_type=info.content_type, headers=headers)
+            start, end = byte_range
+            headers["content-length"] = str(end - start + 1)
+            headers["content-range"] = f"bytes {start}-{end}/{info.size}"
+            return StreamingResponse(
+                self._read_range(info, start, end),
+                status_code=206,
+                media_type=info.content_type,
+                headers=headers
+            )
 
         @self.router.delete("/{file_id}")
         async def delete_file(file_id: str):
             """删除文件"""
             # 查找文件
-            for filename in os.listdir(self.config.file_storage_path):
-                if filename.startswith(f"{file_id}_"):
-                    file_path = os.path.join(self.config.file_storage_path, filename)
-                    os.remove(file_path)
-                    return {"message": f"文件已删除: {file_id}"}
+            info = await run_in_threadpool(self.catalog.get, file_id)
+            if info is None:
+                raise HTTPException(status_code=404, detail=f"文件未找到: {file_id}")
 
-            raise HTTPException(status_code=404, detail=f"文件未找到: {file_id}")
+            await run_in_threadpool(self._delete_file, info)
+            return {"message": f"文件已删除: {file_id}"}
 
 def create_file_module(config: MCPServerConfig) -> FileModule:
     """创建文件访问模块"""
@@ -1,31 +1,404 @@
 """
 MCP服务器向量数据库访问模块
 """
+import io
 import os
+import binascii
 import numpy as np
 import faiss
 import json
 import uuid
-from fastapi import APIRouter, HTTPException, Depends, Query, Body
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+import hashlib
+import sqlite3
+import time
+import base64
+import asyncio
+import threading
+import functools
+import itertools
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, HTTPException, Depends, Query, Body, Request
+from typing import List, Dict, Any, Optional, Tuple
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 from ..config import MCPServerConfig
+from ..utils.filters import parse_filter
+from .file_module import FileInfo, find_file, open_content
+
+def _fsync_path(path: str):
+    """将文件内容刷新到磁盘"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _decode_float32(data: bytes) -> np.ndarray:
+    """将小端float32字节零拷贝地解释为一维数组"""
+    if len(data) % 4 != 0:
+        raise HTTPException(status_code=400, detail="二进制向量长度必须是4字节的整数倍")
+    return np.frombuffer(data, dtype="<f4")
+
+def _decode_base64_float32(value: str) -> np.ndarray:
+    """解码base64编码的小端float32向量"""
+    try:
+        data = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="无效的base64向量数据")
+    return _decode_float32(data)
+
+def _decode_npy(data: bytes) -> np.ndarray:
+    """解析.npy数据，小端float32的C序数组直接引用原始缓冲区"""
+    stream = io.BytesIO(data)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+        count = int(np.prod(shape))
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=stream.tell())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"无效的npy数据: {str(e)}")
+    
+    array = array.reshape(shape, order="F" if fortran_order else "C")
+    if array.dtype != np.dtype("<f4") or fortran_order:
+        array = np.ascontiguousarray(array, dtype=np.float32)
+    return array
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行L2归一化，零向量保持不变"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.ascontiguousarray(vectors / np.where(norms == 0, 1, norms), dtype=np.float32)
+
+def _index_input(spec, vectors: np.ndarray) -> np.ndarray:
+    """转换为索引的输入格式，二进制索引按分量符号打包为位"""
+    if spec.index_type == "binary":
+        return np.packbits(vectors > 0, axis=1)
+    return vectors
+
+def _read_index(path: str, binary: bool = False, io_flags: int = 0):
+    """读取FAISS索引，二进制索引使用单独的读取函数"""
+    if binary:
+        return faiss.read_index_binary(path, io_flags)
+    return faiss.read_index(path, io_flags)
+
+def _write_index(index, path: str):
+    """写入FAISS索引，二进制索引使用单独的写入函数"""
+    if isinstance(index, faiss.IndexBinary):
+        faiss.write_index_binary(index, path)
+    else:
+        faiss.write_index(index, path)
+
+class _ReadWriteLock:
+    """读写锁：允许多个读者并发，写者独占，等待中的写者优先；
+    持有快照锁期间写者同样需要等待，但新的读者不会排在等待中的写者之后"""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._snapshots = 0
+        self._writer = False
+        self._waiting_writers = 0
+    
+    @contextmanager
+    def read_lock(self):
+        """获取读锁"""
+        with self._cond:
+            while self._writer or (self._waiting_writers and not self._snapshots):
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def snapshot_lock(self):
+        """获取快照锁：与读锁一样阻止写入，用于检查点和重建复制索引"""
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+            self._snapshots += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._snapshots -= 1
+                self._cond.notify_all()
+    
+    @contextmanager
+    def write_lock(self):
+        """获取写锁"""
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+class _MetadataStore:
+    """向量集合的元数据存储：SQLite文件，按内部int64 ID索引，同时保存记录ID映射"""
+    _CHUNK_SIZE = 500  # 单条SQL中IN参数的数量上限
+    
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "iid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, metadata TEXT NOT NULL)"
+            )
+            # 元数据二级索引：每个顶层标量字段（列表字段的每个元素）一行
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fields ("
+                "iid INTEGER NOT NULL, key TEXT NOT NULL, text_value TEXT, num_value REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS fields_text ON fields (key, text_value)")
+            conn.execute("CREATE INDEX IF NOT EXISTS fields_num ON fields (key, num_value)")
+            conn.execute("CREATE INDEX IF NOT EXISTS fields_iid ON fields (iid)")
+        
+        # 旧版本的存储没有二级索引，打开时补建
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self._rebuild_fields()
+    
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接，WAL模式下读写互不阻塞"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _chunks(self, values: List[Any]):
+        """按IN参数上限切分"""
+        for start in range(0, len(values), self._CHUNK_SIZE):
+            yield values[start:start + self._CHUNK_SIZE]
+    
+    @staticmethod
+    def _field_rows(internal_id: int, metadata: Dict[str, Any]):
+        """生成元数据二级索引的行"""
+        for key, value in metadata.items():
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                if isinstance(item, str):
+                    yield (internal_id, key, item, None)
+                elif isinstance(item, (int, float)):
+                    # bool按0/1数值索引
+                    yield (internal_id, key, None, float(item))
+    
+    def _rebuild_fields(self):
+        """根据全部记录重建元数据二级索引"""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM fields")
+            for iid, metadata in conn.execute("SELECT iid, metadata FROM records").fetchall():
+                conn.executemany("INSERT INTO fields VALUES (?, ?, ?, ?)", self._field_rows(iid, json.loads(metadata)))
+            conn.execute("PRAGMA user_version = 1")
+    
+    def insert(self, internal_ids: List[int], record_ids: List[str], metadatas: List[Dict[str, Any]]):
+        """在一个事务中写入一批记录及其二级索引"""
+        conn = self._connection()
+        with conn:
+            for chunk in self._chunks(internal_ids):
+                placeholders = ",".join("?" * len(chunk))
+                conn.execute(f"DELETE FROM fields WHERE iid IN ({placeholders})", chunk)
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (iid, id, metadata) VALUES (?, ?, ?)",
+                zip(internal_ids, record_ids, (json.dumps(metadata, ensure_ascii=False) for metadata in metadatas))
+            )
+            conn.executemany(
+                "INSERT INTO fields VALUES (?, ?, ?, ?)",
+                (row for iid, metadata in zip(internal_ids, metadatas) for row in self._field_rows(iid, metadata))
+            )
+    
+    def delete(self, internal_id: int):
+        """删除记录及其二级索引"""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM records WHERE iid = ?", (internal_id,))
+            conn.execute("DELETE FROM fields WHERE iid = ?", (internal_id,))
+    
+    def filter_ids(self, conditions: List[Tuple[str, str, Any]]) -> np.ndarray:
+        """按过滤条件在二级索引上求出匹配的内部ID，多个条件取交集"""
+        operators = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+        queries = []
+        params = []
+        for key, op, value in conditions:
+            if op in operators:
+                queries.append(f"SELECT iid FROM fields WHERE key = ? AND num_value {operators[op]} ?")
+                params.extend([key, float(value)])
+                continue
+            
+            # eq和in按值的类型分别匹配文本列和数值列
+            values = value if op == "in" else [value]
+            texts = [item for item in values if isinstance(item, str)]
+            numbers = [float(item) for item in values if not isinstance(item, str)]
+            clauses = []
+            if texts:
+                clauses.append(f"text_value IN ({','.join('?' * len(texts))})")
+            if numbers:
+                clauses.append(f"num_value IN ({','.join('?' * len(numbers))})")
+            if not clauses:
+                return np.empty(0, dtype=np.int64)
+            queries.append(f"SELECT iid FROM fields WHERE key = ? AND ({' OR '.join(clauses)})")
+            params.extend([key, *texts, *numbers])
+        
+        sql = " INTERSECT ".join(queries)
+        rows = self._connection().execute(sql, params).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    
+    def get_internal_id(self, record_id: str) -> Optional[int]:
+        """按记录ID查询内部ID"""
+        row = self._connection().execute("SELECT iid FROM records WHERE id = ?", (record_id,)).fetchone()
+        return row[0] if row else None
+    
+    def existing_ids(self, record_ids: List[str]) -> set:
+        """返回已存在的记录ID"""
+        conn = self._connection()
+        existing = set()
+        for chunk in self._chunks(record_ids):
+            placeholders = ",".join("?" * len(chunk))
+            existing.update(row[0] for row in conn.execute(f"SELECT id FROM records WHERE id IN ({placeholders})", chunk))
+        return existing
+    
+    def fetch(self, internal_ids: List[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        """按内部ID批量读取记录ID和元数据，只用于搜索命中的少量记录"""
+        conn = self._connection()
+        records = {}
+        for chunk in self._chunks(internal_ids):
+            placeholders = ",".join("?" * len(chunk))
+            for iid, record_id, metadata in conn.execute(
+                f"SELECT iid, id, metadata FROM records WHERE iid IN ({placeholders})", chunk
+            ):
+                records[iid] = (record_id, json.loads(metadata))
+        return records
+    
+    def count(self) -> int:
+        """记录数量"""
+        return self._connection().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+    
+    def internal_ids(self) -> np.ndarray:
+        """所有记录的内部ID，按升序排列"""
+        rows = self._connection().execute("SELECT iid FROM records ORDER BY iid").fetchall()
+        return np.array([row[0] for row in rows], dtype=np.int64)
+    
+    def max_internal_id(self) -> int:
+        """最大的内部ID，没有记录时返回-1"""
+        row = self._connection().execute("SELECT MAX(iid) FROM records").fetchone()
+        return row[0] if row[0] is not None else -1
+    
+    def close(self):
+        """关闭所有线程的连接"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
 
 class VectorRecord(BaseModel):
     """向量记录模型"""
     id: Optional[str] = None
     collection: str
-    vector: List[float]
+    vector: Optional[List[float]] = None
+    vector_b64: Optional[str] = None  # base64编码的小端float32向量，与vector二选一
     metadata: Optional[Dict[str, Any]] = None
     created_at: Optional[str] = None
 
+class VectorBatchItem(BaseModel):
+    """批量插入中的单条向量"""
+    id: Optional[str] = None
+    vector: Optional[List[float]] = None
+    vector_b64: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+class VectorBatchInsert(BaseModel):
+    """批量插入请求模型"""
+    collection: str
+    records: List[VectorBatchItem]
+    vectors_b64: Optional[str] = None  # 整批向量按行拼接后的base64小端float32，提供时records中不再携带向量
+
+class VectorBatchInsertResult(BaseModel):
+    """批量插入结果模型"""
+    collection: str
+    ids: List[str]
+    count: int
+    created_at: str
+
+class VectorIndexSpec(BaseModel):
+    """向量索引配置模型"""
+    index_type: str = "flat"  # flat / ivf / hnsw / ivfpq / sq8 / sq4 / pq / binary
+    dimension: Optional[int] = None  # 向量维度，默认使用服务配置的维度
+    metric: str = "l2"  # 距离度量：l2 / ip（内积）/ cosine（服务端归一化后按内积计算）
+    nlist: int = Field(1024, gt=0)  # IVF聚类中心数量
+    nprobe: int = Field(16, gt=0)  # IVF默认搜索的聚类数量
+    hnsw_m: int = Field(32, gt=0)  # HNSW每个节点的邻居数量
+    ef_construction: int = Field(200, gt=0)  # HNSW构建时的候选队列长度
+    ef_search: int = Field(64, gt=0)  # HNSW默认搜索时的候选队列长度
+    pq_m: int = Field(64, gt=0)  # PQ子量化器数量，需整除向量维度
+    pq_nbits: int = Field(8, gt=0)  # PQ每个子量化器的编码位数
+    train_size: Optional[int] = Field(None, gt=0)  # 训练样本数量上限，默认使用全部样本
+    rerank: bool = False  # 在磁盘上保存全精度向量副本，并用其对候选结果精确重排
+    rerank_factor: int = 4  # 重排时从索引中取出top_k的多少倍候选
+
+class VectorCollectionCreate(BaseModel):
+    """创建向量集合请求模型"""
+    name: str
+    index: VectorIndexSpec = VectorIndexSpec()
+
+class VectorCollectionInfo(BaseModel):
+    """向量集合信息模型"""
+    name: str
+    index: VectorIndexSpec
+    count: int
+    is_trained: bool
+
+class VectorTrainRequest(BaseModel):
+    """向量索引训练请求模型"""
+    vectors: List[List[float]]
+
 class VectorQuery(BaseModel):
     """向量查询模型"""
-    vector: List[float]
+    vector: Optional[List[float]] = None
+    vector_b64: Optional[str] = None  # base64编码的小端float32向量，与vector二选一
     top_k: int = 5
     collection: str
+    nprobe: Optional[int] = Field(None, gt=0)  # 覆盖IVF索引的搜索聚类数量
+    ef_search: Optional[int] = Field(None, gt=0)  # 覆盖HNSW索引的搜索候选队列长度
+    filter: Optional[Dict[str, Any]] = None  # 元数据过滤条件，如{"tenant": "a", "year": {"gte": 2020}}
+
+class VectorBatchQuery(BaseModel):
+    """批量向量查询模型"""
+    collection: str
+    vectors: Optional[List[List[float]]] = None
+    vectors_b64: Optional[str] = None  # 所有查询向量按行拼接后的base64小端float32
+    top_k: int = 5
+    top_ks: Optional[List[int]] = None  # 每个查询单独的top_k，长度需与vectors一致
+    nprobe: Optional[int] = Field(None, gt=0)
+    ef_search: Optional[int] = Field(None, gt=0)
+    filter: Optional[Dict[str, Any]] = None
 
 class VectorSearchResult(BaseModel):
     """向量搜索结果模型"""
@@ -33,83 +406,1694 @@ class VectorSearchResult(BaseModel):
     score: float
     metadata: Optional[Dict[str, Any]] = None
 
+class VectorPagedQuery(BaseModel):
+    """分页搜索请求模型：指定radius时返回范围内的全部结果，否则返回前top_k个结果"""
+    collection: str
+    vector: Optional[List[float]] = None
+    vector_b64: Optional[str] = None
+    radius: Optional[float] = None  # l2为平方距离上限，ip和cosine为相似度下限，binary为汉明距离上限
+    top_k: int = 1000
+    page_size: int = 100
+    nprobe: Optional[int] = Field(None, gt=0)
+    ef_search: Optional[int] = Field(None, gt=0)
+    filter: Optional[Dict[str, Any]] = None
+
+class VectorSearchPage(BaseModel):
+    """分页搜索结果模型"""
+    results: List[VectorSearchResult]
+    total: int  # 本次搜索命中的结果总数
+    next_cursor: Optional[str] = None  # 获取下一页的游标，没有更多结果时为空
+
+class VectorRecallRequest(BaseModel):
+    """召回率评估请求模型"""
+    vectors: Optional[List[List[float]]] = None  # 查询向量，未提供时从集合中随机抽取
+    sample_size: int = Field(100, gt=0)
+    top_k: int = Field(10, gt=0)
+    nprobe: Optional[int] = Field(None, gt=0)
+    ef_search: Optional[int] = Field(None, gt=0)
+
+class VectorRecallReport(BaseModel):
+    """召回率评估结果模型"""
+    collection: str
+    index: VectorIndexSpec
+    queries: int
+    top_k: int
+    recall: float  # 不重排时相对精确搜索的recall@top_k
+    recall_reranked: Optional[float] = None  # 启用重排后的recall@top_k
+    baseline: str = "flat"
+
+class VectorSearchCacheStats(BaseModel):
+    """搜索结果缓存统计模型"""
+    size: int
+    capacity: int
+    ttl_seconds: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+class VectorRebuildRequest(BaseModel):
+    """索引重建请求模型"""
+    index: Optional[VectorIndexSpec] = None  # 新的索引配置，默认沿用当前配置；维度、距离度量和重排设置不能修改
+
+class VectorRebuildStatus(BaseModel):
+    """索引重建状态模型"""
+    collection: str
+    status: str = "running"  # running / completed / failed
+    index: VectorIndexSpec
+    total: int = 0
+    processed: int = 0
+    error: Optional[str] = None
+    started_at: str
+    finished_at: Optional[str] = None
+
+class VectorImportCreate(BaseModel):
+    """向量批量导入请求模型"""
+    collection: str
+    file_id: str  # 已通过/files/upload上传的.npy或.parquet文件ID
+    metadata_file_id: Optional[str] = None  # .npy文件对应的元数据JSONL文件ID，每行一个JSON对象
+    id_field: str = "id"  # 元数据中作为记录ID的字段，缺失时按任务ID和行号生成
+    embedding_column: str = "embedding"  # Parquet文件中的向量列
+    chunk_size: int = 10000  # 每批写入的向量数量
+
+class VectorImportJob(BaseModel):
+    """向量批量导入任务模型"""
+    id: str
+    request: VectorImportCreate
+    status: str = "pending"  # pending / running / completed / failed / cancelled
+    total: int = 0
+    processed: int = 0
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
+
+class VectorBinarySearchResult(BaseModel):
+    """二进制格式的批量搜索结果模型"""
+    shape: List[int]  # [查询数量, top_k]
+    ids: List[List[Optional[str]]]  # 无结果的位置为null
+    scores_b64: str  # base64编码的小端float32得分矩阵，无结果的位置为NaN
+    metadata: Optional[List[List[Optional[Dict[str, Any]]]]] = None
+
 class VectorModule:
     """向量数据库访问模块"""
     def __init__(self, config: MCPServerConfig):
         self.config = config
         self.router = APIRouter(prefix="/vector", tags=["向量数据库"])
         self._register_routes()
+        self.router.add_event_handler("shutdown", self.close)
         
         # 创建向量数据库目录
         os.makedirs(config.vector_db_path, exist_ok=True)
         
         # 初始化向量索引和元数据存储
         self.indexes = {}
-        self.metadata = {}
-        self.id_maps = {}
+        self.metadata_stores = {}  # 元数据与记录ID映射，按内部int64 ID存储在SQLite中
+        self.next_ids = {}
+        self.collection_specs = {}
+        self.tombstones = {}  # 已标记删除、尚未从索引中清除的内部ID
+        self._tombstone_selectors = {}  # 排除已删除ID的选择器，删除或清除后重新构造
+        self.generations = {}  # 集合每次写入后递增，用于使缓存失效
+        
+        # 延迟加载：所有已知集合的名称，已加载集合按最近访问顺序排列
+        self.collection_names = set()
+        self.mmapped = set()  # 以只读内存映射方式打开的集合
+        self._loaded_order = OrderedDict()
+        self._loaded_order_lock = threading.Lock()
+        
+        # 元数据过滤条件对应的位图选择器缓存
+        self._filter_cache = OrderedDict()
+        self._filter_cache_lock = threading.Lock()
+        
+        # 搜索结果缓存，键中包含集合版本，集合被修改后旧结果不会再命中
+        self._search_cache = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+        self._search_cache_hits = 0
+        self._search_cache_misses = 0
+        
+        # 分页搜索的游标，只保存得分和内部ID，翻页时再读取元数据
+        self._cursors = OrderedDict()
+        self._cursors_lock = threading.Lock()
+        
+        # 预写日志状态：最新日志序号、打开的日志文件和上次检查点时间
+        self.lsns = {}
+        self.wal_files = {}
+        self.raw_files = {}  # 全精度向量副本的文件描述符
+        self.checkpoint_times = {}
+        self.snapshot_ids = {}  # 当前快照清单引用的索引快照编号，0表示旧版固定文件名
         
-        # 加载现有索引
+        # 并发控制：每个集合一把读写锁，检查点互斥执行
+        self.collection_locks = {}
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.RLock()
+        
+        # FAISS计算和磁盘IO在有界线程池中执行，避免阻塞事件循环；
+        # 写入使用单独的线程池，耗时的索引修改占满线程时搜索不必排队等待
+        self._executor = ThreadPoolExecutor(max_workers=config.vector_worker_threads, thread_name_prefix="vector-worker")
+        self._write_executor = ThreadPoolExecutor(max_workers=config.vector_worker_threads, thread_name_prefix="vector-writer")
+        
+        # 在线重建索引：重建期间集合的写入同时追加到队列，新索引追上后原子替换
+        self.rebuilds = {}
+        self._rebuild_tails = {}
+        self._rebuild_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-rebuild")
+        
+        # 加载现有索引并重放预写日志
         self._load_indexes()
+        
+        # 启动后台检查点线程
+        self._stop_event = threading.Event()
+        self._checkpoint_event = threading.Event()
+        self._checkpoint_thread = threading.Thread(target=self._checkpoint_loop, name="vector-checkpoint", daemon=True)
+        self._checkpoint_thread.start()
+        
+        # 批量导入任务在单独的线程中依次执行，每批数据提交后持久化进度；
+        # 服务重启时继续执行中断的任务
+        self.import_jobs = {}
+        self._import_lock = threading.Lock()
+        self._import_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-import")
+        self._load_import_jobs()
+    
+    def _collection_lock(self, collection: str) -> _ReadWriteLock:
+        """获取集合的读写锁"""
+        with self._lock:
+            if collection not in self.collection_locks:
+                self.collection_locks[collection] = _ReadWriteLock()
+            return self.collection_locks[collection]
+    
+    async def _run(self, func, *args, **kwargs):
+        """在向量线程池中执行阻塞调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    async def _run_write(self, func, *args, **kwargs):
+        """在写入线程池中执行修改集合的阻塞调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._write_executor, functools.partial(func, *args, **kwargs))
+    
+    def _index_path(self, collection: str, snapshot_id: Optional[int] = None) -> str:
+        """索引快照文件路径：每次检查点写入带编号的新文件，由快照清单引用；
+        未指定编号时使用集合当前的快照"""
+        if snapshot_id is None:
+            snapshot_id = self.snapshot_ids.get(collection, 0)
+        if snapshot_id == 0:
+            return os.path.join(self.config.vector_db_path, f"{collection}.index")
+        return os.path.join(self.config.vector_db_path, f"{collection}.index.{snapshot_id}")
+    
+    def _metadata_path(self, collection: str) -> str:
+        """快照清单文件路径"""
+        return os.path.join(self.config.vector_db_path, f"{collection}.meta")
+    
+    def _db_path(self, collection: str) -> str:
+        """元数据存储文件路径"""
+        return os.path.join(self.config.vector_db_path, f"{collection}.db")
+    
+    def _wal_path(self, collection: str) -> str:
+        """预写日志文件路径"""
+        return os.path.join(self.config.vector_db_path, f"{collection}.wal")
+    
+    def _rebuild_source_path(self, collection: str) -> str:
+        """重建时复制出的索引文件路径，读回后删除"""
+        return os.path.join(self.config.vector_db_path, f"{collection}.rebuild")
+    
+    def _rotated_wal_path(self, collection: str) -> str:
+        """检查点轮转出的预写日志路径，快照提交后删除"""
+        return os.path.join(self.config.vector_db_path, f"{collection}.wal.old")
+    
+    def _raw_path(self, collection: str) -> str:
+        """全精度向量副本文件路径，按内部ID定长存储float32向量"""
+        return os.path.join(self.config.vector_db_path, f"{collection}.vecs")
     
     def _load_indexes(self):
-        """加载现有向量索引"""
-        # 检查向量数据库目录中的索引文件
+        """发现现有向量集合，未启用延迟加载时立即加载"""
+        # 检查向量数据库目录中的索引快照和预写日志
         for filename in os.listdir(self.config.vector_db_path):
             if filename.endswith(".index"):
-                collection_name = filename[:-6]  # 移除.index后缀
-                index_path = os.path.join(self.config.vector_db_path, filename)
-                metadata_path = os.path.join(self.config.vector_db_path, f"{collection_name}.meta")
-                
-                # 加载索引
+                self.collection_names.add(filename[:-6])  # 移除.index后缀
+            elif filename.endswith(".meta"):
+                self.collection_names.add(filename[:-5])  # 移除.meta后缀
+            elif filename.endswith(".wal"):
+                self.collection_names.add(filename[:-4])  # 移除.wal后缀
+            elif filename.endswith(".wal.old"):
+                self.collection_names.add(filename[:-8])  # 移除.wal.old后缀
+        
+        if self.config.vector_lazy_load:
+            return
+        for collection_name in sorted(self.collection_names):
+            try:
+                self._load_collection(collection_name)
+            except Exception as e:
+                self._unload_state(collection_name)
+                print(f"加载索引失败: {collection_name}, 错误: {str(e)}")
+        self._enforce_memory_budget()
+    
+    def _load_collection(self, collection: str):
+        """加载集合的索引快照和元数据存储，并重放预写日志"""
+        metadata_path = self._metadata_path(collection)
+        wal_path = self._wal_path(collection)
+        store = _MetadataStore(self._db_path(collection), self.config.vector_wal_fsync)
+        self.metadata_stores[collection] = store
+        
+        # 加载快照清单，清单引用的索引文件即为当前快照
+        snapshot = {}
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r") as f:
+                snapshot = json.load(f)
+        self.snapshot_ids[collection] = snapshot.get("snapshot", 0) if snapshot.get("version") == 4 else 0
+        index_path = self._index_path(collection)
+        self._remove_stale_snapshots(collection)
+        if snapshot and not os.path.exists(index_path):
+            # 不能只凭日志重放出部分数据，加载失败时由调用方报告错误
+            raise RuntimeError(f"快照清单引用的索引文件不存在: {index_path}")
+        
+        snapshot_lsn = 0
+        migrated = False
+        if os.path.exists(index_path):
+            # 快照为最新格式且没有待重放的日志时，以只读内存映射方式打开，
+            # 索引数据按需由操作系统换入，首次写入前再读入内存
+            index = None
+            binary = snapshot.get("version") == 4 and snapshot.get("spec", {}).get("index_type") == "binary"
+            pending_wal = (os.path.exists(wal_path) and os.path.getsize(wal_path) > 0) or os.path.exists(self._rotated_wal_path(collection))
+            if self.config.vector_mmap and snapshot.get("version") == 4 and not pending_wal:
+                # IO_FLAG_MMAP_IFC可映射更多索引结构，但不支持IVF倒排表，失败时退回IO_FLAG_MMAP
+                mmap_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+                for io_flags in (mmap_flags | getattr(faiss, "IO_FLAG_MMAP_IFC", 0), mmap_flags):
+                    try:
+                        index = _read_index(index_path, binary, io_flags)
+                        self.mmapped.add(collection)
+                        break
+                    except RuntimeError:
+                        continue
+            if index is None:
+                index = _read_index(index_path, binary)
+            
+            spec = VectorIndexSpec()
+            tombstones = set()
+            if snapshot.get("version") in (3, 4):
+                snapshot_lsn = snapshot["lsn"]
+                next_id = snapshot["next_id"]
+                spec = VectorIndexSpec(**snapshot.get("spec", {}))
+                tombstones = set(snapshot.get("tombstones", []))
+                if snapshot["version"] == 3:
+                    # version 3 的元数据和ID映射保存在清单中，迁移到元数据存储
+                    id_map = {int(i): id for i, id in snapshot["id_map"].items()}
+                    store.insert(list(id_map.keys()), list(id_map.values()), [snapshot["metadata"][id] for id in id_map.values()])
+                    migrated = True
+            else:
+                # 兼容旧版快照：version 2 带日志序号，更早的版本整个文件即为元数据字典，
+                # 两者的向量都按插入位置编号
+                if snapshot.get("version") == 2 and "metadata" in snapshot:
+                    snapshot_lsn = snapshot.get("lsn", 0)
+                    snapshot = snapshot["metadata"]
+                store.insert(list(range(len(snapshot))), list(snapshot.keys()), list(snapshot.values()))
+                next_id = index.ntotal
+                index = self._to_id_mapped_index(index)
+                migrated = True
+            
+            if spec.dimension is None:
+                # 旧版快照没有记录维度，以索引为准
+                spec.dimension = index.d
+            self.indexes[collection] = index
+            self.next_ids[collection] = max(next_id, store.max_internal_id() + 1)
+            self.collection_specs[collection] = spec
+            self.tombstones[collection] = tombstones
+        
+        # 重放快照之后的预写日志
+        self.lsns[collection] = snapshot_lsn
+        self._replay_wal(collection, snapshot_lsn)
+        self.checkpoint_times[collection] = time.time()
+        if collection not in self.indexes:
+            # 没有快照、日志为空或只有不完整的记录时没有可加载的数据，
+            # 移除集合名称，之后按不存在的集合处理，不再反复加载；
+            # 日志改名保留，之后创建同名集合时从空日志开始，新记录不会接在不完整的行后面
+            self._unload_state(collection)
+            self.collection_names.discard(collection)
+            for path in (self._rotated_wal_path(collection), wal_path):
+                if os.path.exists(path):
+                    os.replace(path, f"{path}.discarded")
+            print(f"集合没有可加载的数据，已忽略: {collection}")
+            return
+        
+        # 迁移后立即写入新格式的快照清单；上次检查点未完成时立即合并轮转出的日志
+        if migrated or os.path.exists(self._rotated_wal_path(collection)):
+            self._checkpoint_locked(collection)
+        self._touch(collection)
+    
+    def _touch(self, collection: str):
+        """将集合标记为最近访问"""
+        with self._loaded_order_lock:
+            self._loaded_order[collection] = True
+            self._loaded_order.move_to_end(collection)
+    
+    def _ensure_loaded(self, collection: str) -> bool:
+        """确保集合已加载，集合不存在或磁盘上没有可加载的数据时返回False"""
+        if collection in self.indexes:
+            return True
+        if collection not in self.collection_names:
+            return False
+        
+        with self._collection_lock(collection).write_lock():
+            if collection not in self.indexes and collection in self.collection_names:
                 try:
-                    self.indexes[collection_name] = faiss.read_index(index_path)
+                    self._load_collection(collection)
+                except Exception as e:
+                    self._unload_state(collection)
+                    raise HTTPException(status_code=500, detail=f"加载索引失败: {collection}, 错误: {str(e)}")
+            if collection not in self.indexes:
+                return False
+        
+        # 在持有其他集合的锁之前按内存预算卸载冷集合
+        self._enforce_memory_budget(exclude=collection)
+        return True
+    
+    @contextmanager
+    def _locked_collection(self, collection: str, write: bool = False, create: bool = False, snapshot: bool = False):
+        """加载集合并持有其读锁、写锁或快照锁；create为True时允许集合尚不存在，由调用方创建"""
+        lock = self._collection_lock(collection)
+        while True:
+            if not self._ensure_loaded(collection) and not create:
+                raise HTTPException(status_code=404, detail=f"集合未找到: {collection}")
+            with (lock.write_lock() if write else lock.snapshot_lock() if snapshot else lock.read_lock()):
+                # 获取锁之前集合可能已被卸载，此时重新加载
+                if collection in self.indexes or (create and collection not in self.collection_names):
+                    if write and collection in self.mmapped:
+                        # 内存映射的索引是只读的，写入前读入内存
+                        binary = self.collection_specs[collection].index_type == "binary"
+                        self.indexes[collection] = _read_index(self._index_path(collection), binary)
+                        self.mmapped.discard(collection)
+                    if collection in self.indexes:
+                        self._touch(collection)
+                    yield
+                    return
+    
+    def _estimate_memory(self, collection: str) -> int:
+        """按索引类型估算集合索引占用的内存字节数"""
+        index = self.indexes.get(collection)
+        if index is None:
+            return 0
+        spec = self.collection_specs[collection]
+        if spec.index_type in ("ivfpq", "pq"):
+            per_vector = spec.pq_m * spec.pq_nbits // 8 + 8
+        elif spec.index_type == "sq8":
+            per_vector = index.d + 8
+        elif spec.index_type == "sq4":
+            per_vector = (index.d + 1) // 2 + 8
+        elif spec.index_type == "binary":
+            per_vector = index.d // 8 + 8
+        elif spec.index_type == "hnsw":
+            per_vector = index.d * 4 + spec.hnsw_m * 2 * 4 + 8
+        else:
+            per_vector = index.d * 4 + 8
+        centroids = spec.nlist * index.d * 4 if spec.index_type in ("ivf", "ivfpq") else 0
+        return index.ntotal * per_vector + centroids
+    
+    def _enforce_memory_budget(self, exclude: Optional[str] = None):
+        """已加载集合超出内存预算时，按最久未使用的顺序卸载"""
+        budget = self.config.vector_memory_budget_mb * 1024 * 1024
+        if budget <= 0:
+            return
+        with self._loaded_order_lock:
+            candidates = list(self._loaded_order.keys())
+        sizes = {collection: self._estimate_memory(collection) for collection in candidates}
+        total = sum(sizes.values())
+        for collection in candidates:
+            if total <= budget:
+                break
+            if collection == exclude or collection in self._rebuild_tails:
+                # 正在重建的集合需要保持加载，以便记录重建期间的写入
+                continue
+            if self._unload_collection(collection):
+                total -= sizes[collection]
+    
+    def _unload_collection(self, collection: str) -> bool:
+        """将集合的预写日志合并进快照后从内存中卸载"""
+        # 先获取集合锁再获取检查点锁，等待锁外写入快照的检查点完成
+        with self._collection_lock(collection).write_lock(), self._checkpoint_lock:
+            if collection not in self.indexes:
+                return False
+            wal_path = self._wal_path(collection)
+            if (os.path.exists(wal_path) and os.path.getsize(wal_path) > 0) or os.path.exists(self._rotated_wal_path(collection)):
+                self._checkpoint_locked(collection)
+            self._unload_state(collection)
+            return True
+    
+    def _unload_state(self, collection: str):
+        """释放集合的内存状态，磁盘上的快照和日志保持不变"""
+        self.indexes.pop(collection, None)
+        store = self.metadata_stores.pop(collection, None)
+        if store is not None:
+            store.close()
+        wal_file = self.wal_files.pop(collection, None)
+        if wal_file is not None:
+            wal_file.close()
+        raw_file = self.raw_files.pop(collection, None)
+        if raw_file is not None:
+            os.close(raw_file)
+        for state in (self.next_ids, self.collection_specs, self.tombstones, self._tombstone_selectors, self.lsns, self.checkpoint_times, self.snapshot_ids):
+            state.pop(collection, None)
+        self.mmapped.discard(collection)
+        with self._loaded_order_lock:
+            self._loaded_order.pop(collection, None)
+    
+    def _replay_wal(self, collection: str, snapshot_lsn: int):
+        """依次重放轮转出的旧日志和当前日志中序号大于快照的记录"""
+        for wal_path in (self._rotated_wal_path(collection), self._wal_path(collection)):
+            if not os.path.exists(wal_path):
+                continue
+            
+            with open(wal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 崩溃时可能留下不完整的最后一行，忽略即可
+                        break
+                    if entry["lsn"] <= snapshot_lsn:
+                        continue
                     
-                    # 加载元数据
-                    if os.path.exists(metadata_path):
-                        with open(metadata_path, "r") as f:
-                            self.metadata[collection_name] = json.load(f)
-                            self.id_maps[collection_name] = {i: id for i, id in enumerate(self.metadata[collection_name].keys())}
+                    if entry["op"] == "insert":
+                        vectors = np.frombuffer(base64.b64decode(entry["vectors"]), dtype=np.float32)
+                        vectors = vectors.reshape(len(entry["ids"]), -1)
+                        self._get_or_create_index(collection, vectors.shape[1])
+                        self._apply_insert(collection, vectors, entry["ids"], entry["metadata"], entry.get("iids"))
+                    elif entry["op"] == "delete":
+                        # 元数据存储可能已提交删除，优先使用日志中记录的内部ID
+                        internal_id = entry.get("iid")
+                        if internal_id is None:
+                            internal_id = self.metadata_stores[collection].get_internal_id(entry["id"])
+                        if internal_id is not None:
+                            self._apply_delete(collection, internal_id)
+                    self.lsns[collection] = entry["lsn"]
+    
+    def _append_wal(self, collection: str, entry: Dict[str, Any]):
+        """追加一条预写日志，写入代价只与本次记录大小有关"""
+        self.lsns[collection] = self.lsns.get(collection, 0) + 1
+        entry["lsn"] = self.lsns[collection]
+        
+        wal_file = self.wal_files.get(collection)
+        if wal_file is None:
+            wal_file = open(self._wal_path(collection), "a", encoding="utf-8")
+            self.wal_files[collection] = wal_file
+        
+        wal_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        wal_file.flush()
+        if self.config.vector_wal_fsync:
+            os.fsync(wal_file.fileno())
+        
+        # 日志超过阈值时通知检查点线程
+        if wal_file.tell() >= self.config.vector_checkpoint_wal_mb * 1024 * 1024:
+            self._checkpoint_event.set()
+    
+    def _remove_stale_snapshots(self, collection: str):
+        """删除快照清单未引用的索引文件：被替换的旧快照，以及写入清单前崩溃留下的新快照"""
+        current = self._index_path(collection)
+        prefix = f"{collection}.index."
+        for filename in os.listdir(self.config.vector_db_path):
+            if filename.startswith(prefix) and filename[len(prefix):].isdigit():
+                path = os.path.join(self.config.vector_db_path, filename)
+                if path != current:
+                    os.remove(path)
+        legacy_path = self._index_path(collection, 0)
+        if self.snapshot_ids.get(collection, 0) and os.path.exists(legacy_path):
+            os.remove(legacy_path)
+    
+    def _write_snapshot_index(self, collection: str) -> Tuple[str, Dict[str, Any]]:
+        """把索引写入带新编号的快照文件并生成快照清单，调用方需持有集合锁和检查点锁；
+        写入只进入页缓存，代价接近内存拷贝，落盘可以在锁外进行"""
+        # 索引写入新文件，不覆盖当前清单引用的快照
+        snapshot_id = self.snapshot_ids.get(collection, 0) + 1
+        index_path = self._index_path(collection, snapshot_id)
+        _write_index(self.indexes[collection], index_path)
+        
+        # 快照清单：索引文件编号、索引配置、内部ID分配状态及对应的日志序号；
+        # 元数据和ID映射已实时写入元数据存储
+        manifest = {
+            "version": 4,
+            "snapshot": snapshot_id,
+            "lsn": self.lsns.get(collection, 0),
+            "next_id": self.next_ids[collection],
+            "spec": self.collection_specs[collection].model_dump(),
+            "tombstones": sorted(self.tombstones[collection])
+        }
+        return index_path, manifest
+    
+    def _commit_snapshot(self, collection: str, index_path: str, manifest: Dict[str, Any]):
+        """快照文件落盘后替换快照清单，调用方需持有检查点锁"""
+        _fsync_path(index_path)
+        metadata_path = self._metadata_path(collection)
+        with open(f"{metadata_path}.tmp", "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        # 替换清单是快照唯一的提交点：崩溃时要么是旧索引和旧序号，要么是新索引和新序号；
+        # 同步目录使替换在删除日志前落盘
+        os.replace(f"{metadata_path}.tmp", metadata_path)
+        _fsync_path(self.config.vector_db_path)
+        self.snapshot_ids[collection] = manifest["snapshot"]
+        self._remove_stale_snapshots(collection)
+    
+    def _purge_tombstones(self, collection: str):
+        """已删除的ID超过阈值时，在写锁下一次性从索引中清除；HNSW不支持物理删除，只在重建时清除"""
+        spec = self.collection_specs.get(collection)
+        if not self.tombstones.get(collection) or spec is None or spec.index_type == "hnsw":
+            # 没有可清除的ID时不获取写锁，避免阻塞搜索
+            return
+        with self._collection_lock(collection).write_lock():
+            if collection not in self.indexes or collection in self.mmapped:
+                return
+            tombstones = self.tombstones[collection]
+            index = self.indexes[collection]
+            if not tombstones or self.collection_specs[collection].index_type == "hnsw":
+                return
+            if len(tombstones) < index.ntotal * self.config.vector_tombstone_purge_ratio:
+                return
+            # 一次删除整批ID，压缩编码和重建ID映射的代价由这一批删除分摊
+            index.remove_ids(faiss.IDSelectorBatch(np.array(sorted(tombstones), dtype=np.int64)))
+            self.tombstones[collection] = set()
+            self._tombstone_selectors.pop(collection, None)
+    
+    def _checkpoint(self, collection: str):
+        """将预写日志合并进快照：快照锁内只写入页缓存并轮转日志，落盘在锁外进行；
+        期间搜索照常执行，写入只等待锁内的部分"""
+        self._purge_tombstones(collection)
+        with self._collection_lock(collection).snapshot_lock():
+            if collection not in self.indexes:
+                return
+            self._checkpoint_lock.acquire()
+            try:
+                if os.path.exists(self._rotated_wal_path(collection)):
+                    # 上次检查点没有完成，已轮转的日志尚未合并，在锁内完成整个检查点
+                    self._checkpoint_locked(collection)
+                    self._checkpoint_lock.release()
+                    return
+                index_path, manifest = self._write_snapshot_index(collection)
+                raw_file = self.raw_files.get(collection)
+                
+                # 轮转日志：快照包含的记录留在旧日志中，之后的写入追加到新日志
+                wal_file = self.wal_files.pop(collection, None)
+                if wal_file is not None:
+                    wal_file.close()
+                if os.path.exists(self._wal_path(collection)):
+                    os.replace(self._wal_path(collection), self._rotated_wal_path(collection))
+            except BaseException:
+                self._checkpoint_lock.release()
+                raise
+        
+        # 卸载集合前需要获取检查点锁，落盘期间集合的文件描述符和快照编号保持有效
+        try:
+            self._commit_snapshot(collection, index_path, manifest)
+            # 全精度副本在删除旧日志前落盘，日志中的向量可以重新写入副本
+            if raw_file is not None:
+                os.fsync(raw_file)
+            if os.path.exists(self._rotated_wal_path(collection)):
+                os.remove(self._rotated_wal_path(collection))
+            self.checkpoint_times[collection] = time.time()
+        finally:
+            self._checkpoint_lock.release()
+    
+    def _checkpoint_locked(self, collection: str):
+        """在锁内执行完整的检查点，调用方需持有集合的读锁或写锁"""
+        with self._checkpoint_lock:
+            self._commit_snapshot(collection, *self._write_snapshot_index(collection))
+            
+            # 全精度副本在截断日志前落盘，日志中的向量可以重新写入副本
+            raw_file = self.raw_files.get(collection)
+            if raw_file is not None:
+                os.fsync(raw_file)
+            
+            wal_file = self.wal_files.pop(collection, None)
+            if wal_file is not None:
+                wal_file.close()
+            if os.path.exists(self._wal_path(collection)):
+                os.truncate(self._wal_path(collection), 0)
+            if os.path.exists(self._rotated_wal_path(collection)):
+                os.remove(self._rotated_wal_path(collection))
+            self.checkpoint_times[collection] = time.time()
+    
+    def _checkpoint_loop(self):
+        """后台检查点线程：日志大小或时间超过阈值时执行检查点"""
+        max_wal_bytes = self.config.vector_checkpoint_wal_mb * 1024 * 1024
+        while not self._stop_event.is_set():
+            self._checkpoint_event.wait(timeout=1.0)
+            self._checkpoint_event.clear()
+            
+            now = time.time()
+            for collection in list(self.wal_files.keys()):
+                try:
+                    wal_file = self.wal_files.get(collection)
+                    if wal_file is None:
+                        continue
+                    wal_size = wal_file.tell()
+                    elapsed = now - self.checkpoint_times.get(collection, 0)
+                    if wal_size >= max_wal_bytes or (wal_size > 0 and elapsed >= self.config.vector_checkpoint_interval_seconds):
+                        self._checkpoint(collection)
                 except Exception as e:
-                    print(f"加载索引失败: {collection_name}, 错误: {str(e)}")
+                    print(f"检查点执行失败: {collection}, 错误: {str(e)}")
     
-    def _save_index(self, collection: str):
-        """保存向量索引"""
-        if collection in self.indexes:
-            index_path = os.path.join(self.config.vector_db_path, f"{collection}.index")
-            metadata_path = os.path.join(self.config.vector_db_path, f"{collection}.meta")
+    def close(self):
+        """停止检查点线程并将所有日志合并进快照"""
+        self._stop_event.set()
+        self._checkpoint_event.set()
+        self._checkpoint_thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
+        self._write_executor.shutdown(wait=True)
+        # 导入任务在当前批次提交后停止，重启后从已提交的进度继续
+        self._import_executor.shutdown(wait=True)
+        self._rebuild_executor.shutdown(wait=True)
+        for collection in list(self.indexes.keys()):
+            if collection in self.mmapped:
+                # 内存映射的集合打开后未被修改，快照已是最新
+                continue
+            try:
+                self._checkpoint(collection)
+            except Exception as e:
+                print(f"检查点执行失败: {collection}, 错误: {str(e)}")
+        for store in self.metadata_stores.values():
+            store.close()
+    
+    def _imports_path(self) -> str:
+        """导入任务状态目录"""
+        return os.path.join(self.config.vector_db_path, "imports")
+    
+    def _load_import_jobs(self):
+        """加载导入任务状态，继续执行中断的任务"""
+        os.makedirs(self._imports_path(), exist_ok=True)
+        for filename in os.listdir(self._imports_path()):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self._imports_path(), filename), "r", encoding="utf-8") as f:
+                    job = VectorImportJob(**json.load(f))
+            except Exception as e:
+                print(f"加载导入任务失败: {filename}, 错误: {str(e)}")
+                continue
+            self.import_jobs[job.id] = job
+        
+        for job in sorted(self.import_jobs.values(), key=lambda job: job.created_at):
+            if job.status in ("pending", "running"):
+                self._import_executor.submit(self._run_import, job.id)
+    
+    def _save_import_job(self, job: VectorImportJob):
+        """持久化导入任务状态，调用方需持有导入锁"""
+        job.updated_at = datetime.now().isoformat()
+        path = os.path.join(self._imports_path(), f"{job.id}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(job.model_dump_json())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+    
+    def _import_file(self, file_id: str) -> FileInfo:
+        """查找已上传的文件"""
+        info = find_file(self.config.file_storage_path, file_id)
+        if info is None:
+            raise HTTPException(status_code=404, detail=f"文件未找到: {file_id}")
+        return info
+    
+    def _create_import(self, request: VectorImportCreate) -> VectorImportJob:
+        """检查导入文件并创建导入任务"""
+        info = self._import_file(request.file_id)
+        if not info.filename.lower().endswith((".npy", ".parquet")):
+            raise HTTPException(status_code=400, detail="只支持导入.npy或.parquet文件")
+        if info.encoding is not None:
+            # 向量文件需要按偏移随机读取，压缩存储的文件无法直接映射
+            raise HTTPException(status_code=400, detail="不支持导入压缩存储的向量文件")
+        if request.metadata_file_id is not None:
+            self._import_file(request.metadata_file_id)
+        if request.chunk_size <= 0:
+            raise HTTPException(status_code=400, detail=f"无效的批次大小: {request.chunk_size}")
+        
+        now = datetime.now().isoformat()
+        job = VectorImportJob(id=str(uuid.uuid4()), request=request, created_at=now, updated_at=now)
+        with self._import_lock:
+            self.import_jobs[job.id] = job
+            self._save_import_job(job)
+        self._import_executor.submit(self._run_import, job.id)
+        return job
+    
+    def _npy_chunks(self, job: VectorImportJob, path: str):
+        """以内存映射方式按批读取.npy向量和对应的元数据行"""
+        try:
+            vectors = np.load(path, mmap_mode="r")
+        except ValueError as e:
+            raise ValueError(f"无效的npy文件: {str(e)}")
+        if vectors.ndim != 2:
+            raise ValueError(f"npy文件必须是二维数组，实际维数: {vectors.ndim}")
+        job.total = vectors.shape[0]
+        
+        metadata_info = self._import_file(job.request.metadata_file_id) if job.request.metadata_file_id else None
+        with (io.TextIOWrapper(open_content(metadata_info), encoding="utf-8") if metadata_info else io.StringIO()) as metadata_file:
+            # 跳过已导入的元数据行
+            lines = (line for line in metadata_file if line.strip())
+            for _ in itertools.islice(lines, job.processed):
+                pass
+            for start in range(job.processed, job.total, job.request.chunk_size):
+                chunk = np.ascontiguousarray(vectors[start:start + job.request.chunk_size], dtype=np.float32)
+                if metadata_info:
+                    metadatas = [json.loads(line) for line in itertools.islice(lines, len(chunk))]
+                    if len(metadatas) != len(chunk):
+                        raise ValueError(f"元数据行数少于向量数量: {start + len(metadatas)}, {job.total}")
+                else:
+                    metadatas = [{} for _ in range(len(chunk))]
+                yield chunk, metadatas
+    
+    def _parquet_chunks(self, job: VectorImportJob, path: str):
+        """以内存映射方式按批读取Parquet文件的向量列和其余列"""
+        try:
+            import pyarrow.compute as pc
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            # pyarrow未安装或与当前NumPy版本不兼容时都会导入失败，保留原始错误便于排查
+            raise ValueError(f"导入Parquet文件需要可用的pyarrow: {str(e)}")
+        
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        job.total = parquet_file.metadata.num_rows
+        column_name = job.request.embedding_column
+        if column_name not in parquet_file.schema_arrow.names:
+            raise ValueError(f"Parquet文件中没有向量列: {column_name}")
+        
+        # 跳过已导入的行组，再跳过行组内已导入的行
+        row_groups = []
+        skip = job.processed
+        for i in range(parquet_file.num_row_groups):
+            rows = parquet_file.metadata.row_group(i).num_rows
+            if not row_groups and skip >= rows:
+                skip -= rows
+                continue
+            row_groups.append(i)
+        if not row_groups:
+            return
+        
+        for batch in parquet_file.iter_batches(batch_size=job.request.chunk_size, row_groups=row_groups):
+            if skip:
+                if skip >= batch.num_rows:
+                    skip -= batch.num_rows
+                    continue
+                batch = batch.slice(skip)
+                skip = 0
+            
+            # 向量列展开为连续数组后按行切分
+            column = batch.column(column_name)
+            lengths = pc.list_value_length(column).to_numpy(zero_copy_only=False)
+            if len(lengths) and (lengths.min() != lengths.max() or lengths.min() == 0):
+                raise ValueError(f"向量列的长度不一致: {column_name}")
+            values = column.flatten().to_numpy(zero_copy_only=False)
+            vectors = np.ascontiguousarray(values.reshape(batch.num_rows, -1), dtype=np.float32)
             
-            # 保存索引
-            faiss.write_index(self.indexes[collection], index_path)
+            # 其余列作为元数据，无法序列化为JSON的值转换为字符串
+            names = [name for name in batch.schema.names if name != column_name]
+            columns = [batch.column(name).to_pylist() for name in names]
+            metadatas = json.loads(json.dumps([dict(zip(names, row)) for row in zip(*columns)], default=str))
+            if not names:
+                metadatas = [{} for _ in range(batch.num_rows)]
+            yield vectors, metadatas
+    
+    def _run_import(self, job_id: str):
+        """执行导入任务，每批写入后持久化进度"""
+        job = self.import_jobs[job_id]
+        with self._import_lock:
+            if job.status not in ("pending", "running"):
+                return
+            job.status = "running"
+            job.error = None
+            self._save_import_job(job)
+        
+        request = job.request
+        resumed = job.processed > 0
+        try:
+            info = self._import_file(request.file_id)
+            chunks = self._parquet_chunks(job, info.path) if info.filename.lower().endswith(".parquet") else self._npy_chunks(job, info.path)
+            now = datetime.now().isoformat()
+            for vectors, metadatas in chunks:
+                if self._stop_event.is_set() or job.status != "running":
+                    # 服务关闭或任务被取消，已提交的批次保留
+                    return
+                
+                # 记录ID取自元数据，缺失时按行号生成，重试时ID不变
+                rows = len(metadatas)
+                record_ids = []
+                for row, metadata in enumerate(metadatas, start=job.processed):
+                    record_id = metadata.pop(request.id_field, None)
+                    record_ids.append(str(record_id) if record_id is not None else f"{job.id}-{row}")
+                    metadata["created_at"] = now
+                
+                if resumed:
+                    # 中断时最后一批可能已写入但进度未保存，跳过已存在的记录
+                    resumed = False
+                    existing = self._existing_ids(request.collection, record_ids)
+                    keep = [i for i, record_id in enumerate(record_ids) if record_id not in existing]
+                    vectors, record_ids, metadatas = vectors[keep], [record_ids[i] for i in keep], [metadatas[i] for i in keep]
+                if record_ids:
+                    self._add_vectors(request.collection, vectors, record_ids, metadatas)
+                
+                with self._import_lock:
+                    job.processed += rows
+                    self._save_import_job(job)
             
-            # 保存元数据
-            with open(metadata_path, "w") as f:
-                json.dump(self.metadata[collection], f)
+            with self._import_lock:
+                if job.status == "running":
+                    job.status = "completed"
+                    self._save_import_job(job)
+        except Exception as e:
+            with self._import_lock:
+                job.status = "failed"
+                job.error = e.detail if isinstance(e, HTTPException) else str(e)
+                self._save_import_job(job)
+    
+    def _existing_ids(self, collection: str, record_ids: List[str]) -> set:
+        """查询集合中已存在的记录ID，集合不存在时返回空集合"""
+        if collection not in self.collection_names:
+            return set()
+        with self._locked_collection(collection):
+            return self.metadata_stores[collection].existing_ids(record_ids)
+    
+    def _to_id_mapped_index(self, index: faiss.Index) -> faiss.Index:
+        """将按位置编号的旧索引转换为ID映射索引，内部ID即原位置"""
+        id_mapped = faiss.IndexIDMap2(faiss.IndexFlatL2(index.d))
+        if index.ntotal > 0:
+            vectors = index.reconstruct_n(0, index.ntotal)
+            id_mapped.add_with_ids(vectors, np.arange(index.ntotal, dtype=np.int64))
+        return id_mapped
     
-    def _get_or_create_index(self, collection: str) -> faiss.Index:
+    def _create_index(self, spec: VectorIndexSpec, dimension: int) -> faiss.Index:
+        """按索引配置创建支持int64 ID的FAISS索引"""
+        # 余弦相似度在归一化后的向量上按内积计算
+        metric = faiss.METRIC_L2 if spec.metric == "l2" else faiss.METRIC_INNER_PRODUCT
+        if spec.index_type == "flat":
+            return faiss.IndexIDMap2(faiss.IndexFlat(dimension, metric))
+        if spec.index_type == "ivf":
+            # IVF索引原生支持add_with_ids和remove_ids
+            return faiss.index_factory(dimension, f"IVF{spec.nlist},Flat", metric)
+        if spec.index_type == "ivfpq":
+            return faiss.index_factory(dimension, f"IVF{spec.nlist},PQ{spec.pq_m}x{spec.pq_nbits}", metric)
+        if spec.index_type in ("sq8", "sq4"):
+            # 标量量化每个分量用8位或4位编码
+            return faiss.IndexIDMap2(faiss.index_factory(dimension, spec.index_type.upper(), metric))
+        if spec.index_type == "pq":
+            # IndexPQ不接受搜索参数，无法使用ID选择器；单个聚类的IVF-PQ编码相同且支持选择器和remove_ids
+            return faiss.index_factory(dimension, f"IVF1,PQ{spec.pq_m}x{spec.pq_nbits}", metric)
+        if spec.index_type == "binary":
+            # 每个分量按符号编码为1位，使用汉明距离搜索
+            return faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(dimension))
+        if spec.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, spec.hnsw_m, metric)
+            index.hnsw.efConstruction = spec.ef_construction
+            return faiss.IndexIDMap2(index)
+        raise HTTPException(status_code=400, detail=f"不支持的索引类型: {spec.index_type}")
+    
+    def _validate_spec(self, spec: VectorIndexSpec, dimension: int):
+        """检查索引配置是否有效"""
+        if spec.index_type not in ("flat", "ivf", "hnsw", "ivfpq", "sq8", "sq4", "pq", "binary"):
+            raise HTTPException(status_code=400, detail=f"不支持的索引类型: {spec.index_type}")
+        if spec.metric not in ("l2", "ip", "cosine"):
+            raise HTTPException(status_code=400, detail=f"不支持的距离度量: {spec.metric}")
+        if dimension <= 0:
+            raise HTTPException(status_code=400, detail=f"无效的向量维度: {dimension}")
+        if spec.index_type == "binary" and dimension % 8 != 0:
+            raise HTTPException(status_code=400, detail=f"二进制索引的向量维度必须是8的整数倍: {dimension}")
+        if spec.rerank and spec.rerank_factor < 1:
+            raise HTTPException(status_code=400, detail=f"无效的重排候选倍数: {spec.rerank_factor}")
+        if spec.index_type in ("ivfpq", "pq") and dimension % spec.pq_m != 0:
+            raise HTTPException(status_code=400, detail=f"PQ子量化器数量必须整除向量维度: {spec.pq_m}, {dimension}")
+    
+    def _min_train_size(self, spec: VectorIndexSpec) -> int:
+        """训练索引所需的最少样本数量"""
+        if spec.index_type == "ivf":
+            return spec.nlist
+        if spec.index_type == "ivfpq":
+            return max(spec.nlist, 2 ** spec.pq_nbits)
+        if spec.index_type == "pq":
+            return 2 ** spec.pq_nbits
+        if spec.index_type in ("sq8", "sq4"):
+            return 1
+        return 0
+    
+    def _train_index(self, collection: str, vectors: np.ndarray):
+        """使用样本训练索引，训练后立即写快照以便日志可以在其上重放"""
+        spec = self.collection_specs[collection]
+        index = self.indexes[collection]
+        if len(vectors) < self._min_train_size(spec):
+            raise HTTPException(
+                status_code=400,
+                detail=f"训练样本不足，至少需要: {self._min_train_size(spec)}, 实际: {len(vectors)}"
+            )
+        
+        # 随机抽取训练样本
+        if spec.train_size and len(vectors) > spec.train_size:
+            sample = np.random.default_rng().choice(len(vectors), spec.train_size, replace=False)
+            vectors = vectors[np.sort(sample)]
+        
+        index.train(self._index_vectors(collection, self._prepare_vectors(collection, vectors)))
+        self._checkpoint_locked(collection)
+    
+    def _filter_selector(self, collection: str, filter: Dict[str, Any]):
+        """求出过滤条件对应的位图选择器，按集合版本缓存，返回(选择器, 位图, 匹配数量)"""
+        conditions = parse_filter(filter)
+        key = (collection, self.generations.get(collection, 0), json.dumps(filter, sort_keys=True))
+        with self._filter_cache_lock:
+            if key in self._filter_cache:
+                self._filter_cache.move_to_end(key)
+                return self._filter_cache[key]
+        
+        # 在二级索引上求出匹配的内部ID，转换为按内部ID编号的位图
+        internal_ids = self.metadata_stores[collection].filter_ids(conditions)
+        mask = np.zeros(self.next_ids[collection], dtype=bool)
+        mask[internal_ids] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        entry = (selector, bitmap, len(internal_ids))
+        
+        with self._filter_cache_lock:
+            self._filter_cache[key] = entry
+            while len(self._filter_cache) > self.config.vector_filter_cache_size:
+                self._filter_cache.popitem(last=False)
+        return entry
+    
+    def _search_params(self, collection: str, nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector=None):
+        """构造搜索参数，包括搜索时参数和过滤器；未指定过滤器时排除已删除的ID"""
+        spec = self.collection_specs[collection]
+        if spec.index_type in ("ivf", "ivfpq"):
+            params = faiss.SearchParametersIVF()
+            params.nprobe = nprobe or spec.nprobe
+        elif spec.index_type == "pq":
+            params = faiss.SearchParametersIVF()
+            params.nprobe = 1
+        elif spec.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = ef_search or spec.ef_search
+        else:
+            params = faiss.SearchParameters()
+        
+        # 过滤器来自元数据存储，已不包含标记删除的向量；选择器需要与参数对象一同保持引用
+        if selector is not None:
+            params.sel = selector
+        elif self.tombstones[collection]:
+            selector = self._tombstone_selectors.get(collection)
+            if selector is None:
+                selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(np.array(sorted(self.tombstones[collection]), dtype=np.int64)))
+                self._tombstone_selectors[collection] = selector
+            params.sel = selector
+        return params, selector
+    
+    def _create_collection(self, collection: str, spec: VectorIndexSpec):
+        """按索引配置创建新集合"""
+        spec = spec.model_copy(update={"dimension": spec.dimension or self.config.vector_dimension})
+        self._validate_spec(spec, spec.dimension)
+        self.indexes[collection] = self._create_index(spec, spec.dimension)
+        self.collection_names.add(collection)
+        self._touch(collection)
+        if collection not in self.metadata_stores:
+            self.metadata_stores[collection] = _MetadataStore(self._db_path(collection), self.config.vector_wal_fsync)
+        self.next_ids[collection] = 0
+        self.generations[collection] = self.generations.get(collection, 0) + 1
+        self.collection_specs[collection] = spec
+        self.tombstones[collection] = set()
+        self._tombstone_selectors.pop(collection, None)
+        self.checkpoint_times[collection] = time.time()
+    
+    def _get_collection_info(self, collection: str) -> VectorCollectionInfo:
+        """在读锁下汇总集合信息"""
+        with self._locked_collection(collection):
+            return self._collection_info(collection)
+    
+    def _collection_info(self, collection: str) -> VectorCollectionInfo:
+        """汇总集合信息"""
+        return VectorCollectionInfo(
+            name=collection,
+            index=self.collection_specs[collection],
+            count=self.metadata_stores[collection].count(),
+            is_trained=self.indexes[collection].is_trained
+        )
+    
+    def _get_or_create_index(self, collection: str, dimension: Optional[int] = None) -> faiss.Index:
         """获取或创建向量索引"""
         if collection not in self.indexes:
-            # 创建新索引
-            self.indexes[collection] = faiss.IndexFlatL2(self.config.vector_dimension)
-            self.metadata[collection] = {}
-            self.id_maps[collection] = {}
+            # 未显式创建的集合使用默认的精确索引，维度取自写入的向量
+            self._create_collection(collection, VectorIndexSpec(dimension=dimension))
         
         return self.indexes[collection]
     
+    def _apply_insert(self, collection: str, vectors: np.ndarray, record_ids: List[str], metadatas: List[Dict[str, Any]], internal_ids: Optional[List[int]] = None):
+        """将一批向量应用到内存索引"""
+        index = self.indexes[collection]
+        
+        # 分配内部ID
+        if internal_ids is None:
+            start = self.next_ids[collection]
+            internal_ids = list(range(start, start + len(record_ids)))
+        self.next_ids[collection] = max(self.next_ids[collection], internal_ids[-1] + 1)
+        
+        # 添加向量到索引，启用重排的集合同时写入全精度副本
+        index.add_with_ids(self._index_vectors(collection, vectors), np.array(internal_ids, dtype=np.int64))
+        if self.collection_specs[collection].rerank:
+            self._write_raw(collection, vectors, internal_ids)
+        
+        # 在一个事务中写入元数据和ID映射
+        self.metadata_stores[collection].insert(internal_ids, record_ids, metadatas)
+        self.generations[collection] = self.generations.get(collection, 0) + 1
+        tail = self._rebuild_tails.get(collection)
+        if tail is not None:
+            tail.append(("insert", vectors, internal_ids))
+        
+        return internal_ids
+    
+    def _apply_delete(self, collection: str, internal_id: int):
+        """按内部ID从元数据存储中删除向量，索引中只标记删除"""
+        # remove_ids需要压缩编码、重建ID映射或扫描倒排表，代价与集合大小成正比；
+        # 标记删除后在搜索时过滤，由检查点或重建批量清除
+        self.tombstones[collection].add(internal_id)
+        self._tombstone_selectors.pop(collection, None)
+        self.metadata_stores[collection].delete(internal_id)
+        self.generations[collection] = self.generations.get(collection, 0) + 1
+        tail = self._rebuild_tails.get(collection)
+        if tail is not None:
+            tail.append(("delete", internal_id))
+    
+    def _collection_dimension(self, collection: str) -> int:
+        """获取集合的向量维度，尚不存在的集合使用默认维度"""
+        with self._locked_collection(collection, create=True):
+            spec = self.collection_specs.get(collection)
+            return spec.dimension if spec is not None else self.config.vector_dimension
+    
+    def _prepare_vectors(self, collection: str, vectors: np.ndarray) -> np.ndarray:
+        """检查向量维度与集合一致，余弦度量的集合按行归一化"""
+        spec = self.collection_specs[collection]
+        if vectors.shape[1] != spec.dimension:
+            raise HTTPException(
+                status_code=400,
+                detail=f"向量维度不匹配，期望: {spec.dimension}, 实际: {vectors.shape[1]}"
+            )
+        if spec.metric == "cosine":
+            return _normalize(vectors)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+    
+    def _index_vectors(self, collection: str, vectors: np.ndarray) -> np.ndarray:
+        """转换为集合索引的输入格式"""
+        return _index_input(self.collection_specs[collection], vectors)
+    
+    def _raw_file(self, collection: str) -> int:
+        """打开全精度向量副本文件"""
+        raw_file = self.raw_files.get(collection)
+        if raw_file is None:
+            raw_file = os.open(self._raw_path(collection), os.O_RDWR | os.O_CREAT, 0o644)
+            self.raw_files[collection] = raw_file
+        return raw_file
+    
+    def _write_raw(self, collection: str, vectors: np.ndarray, internal_ids: List[int]):
+        """按内部ID写入全精度向量，重放日志时重复写入结果相同"""
+        raw_file = self._raw_file(collection)
+        row_bytes = vectors.shape[1] * 4
+        if internal_ids[-1] - internal_ids[0] + 1 == len(internal_ids):
+            # 同一批次的内部ID连续，整块写入
+            os.pwrite(raw_file, np.ascontiguousarray(vectors, dtype="<f4").tobytes(), internal_ids[0] * row_bytes)
+            return
+        for vector, internal_id in zip(vectors, internal_ids):
+            os.pwrite(raw_file, np.ascontiguousarray(vector, dtype="<f4").tobytes(), internal_id * row_bytes)
+    
+    def _read_raw(self, collection: str, internal_ids: np.ndarray) -> np.ndarray:
+        """按内部ID读取全精度向量"""
+        raw_file = self._raw_file(collection)
+        dimension = self.collection_specs[collection].dimension
+        row_bytes = dimension * 4
+        vectors = np.empty((len(internal_ids), dimension), dtype=np.float32)
+        for i, internal_id in enumerate(internal_ids):
+            vectors[i] = np.frombuffer(os.pread(raw_file, row_bytes, int(internal_id) * row_bytes), dtype="<f4")
+        return vectors
+    
+    def _read_raw_range(self, collection: str, internal_ids: np.ndarray) -> np.ndarray:
+        """读取一段升序且基本连续的内部ID对应的全精度向量，一次读取整段后去掉已删除的行"""
+        dimension = self.collection_specs[collection].dimension
+        row_bytes = dimension * 4
+        start, stop = int(internal_ids[0]), int(internal_ids[-1]) + 1
+        span = os.pread(self._raw_file(collection), (stop - start) * row_bytes, start * row_bytes)
+        return np.ascontiguousarray(np.frombuffer(span, dtype="<f4").reshape(-1, dimension)[internal_ids - start])
+    
+    def _exact_scores(self, collection: str, queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """按集合的距离度量计算精确得分，queries为(n, d)，vectors为(n, k, d)"""
+        if self.collection_specs[collection].metric == "l2":
+            return ((vectors - queries[:, None, :]) ** 2).sum(axis=2)
+        return np.einsum("nkd,nd->nk", vectors, queries)
+    
+    def _rerank(self, collection: str, queries: np.ndarray, distances: np.ndarray, indices: np.ndarray, top_k: int):
+        """用全精度副本对候选结果精确重排，返回与索引搜索相同格式的(得分, 内部ID)"""
+        candidates = np.unique(indices[indices != -1])
+        if len(candidates) == 0:
+            return distances[:, :top_k], indices[:, :top_k]
+        
+        # 每个候选只读取一次，再按位置组装成(查询数, 候选数, 维度)
+        raw = self._read_raw(collection, candidates)
+        positions = np.searchsorted(candidates, np.where(indices == -1, candidates[0], indices))
+        scores = self._exact_scores(collection, queries, raw[positions])
+        
+        # 无结果的位置排到最后
+        larger_is_better = self.collection_specs[collection].metric != "l2"
+        worst = -np.inf if larger_is_better else np.inf
+        scores = np.where(indices == -1, worst, scores).astype(np.float32)
+        order = np.argsort(-scores if larger_is_better else scores, axis=1, kind="stable")[:, :top_k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+    
+    def _to_matrix(self, vectors, dimension: int) -> np.ndarray:
+        """将向量列表或数组组装为连续的float32矩阵并检查维度"""
+        if isinstance(vectors, np.ndarray):
+            vectors_np = vectors
+        else:
+            try:
+                vectors_np = np.array(vectors, dtype=np.float32)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="向量维度不一致")
+        
+        if vectors_np.ndim != 2 or vectors_np.shape[1] != dimension:
+            actual = vectors_np.shape[-1] if vectors_np.ndim else 0
+            raise HTTPException(
+                status_code=400, 
+                detail=f"向量维度不匹配，期望: {dimension}, 实际: {actual}"
+            )
+        return np.ascontiguousarray(vectors_np, dtype=np.float32)
+    
+    def _payload_vector(self, vector: Optional[List[float]], vector_b64: Optional[str], dimension: int) -> np.ndarray:
+        """从JSON浮点数组或base64二进制中取出单个向量，返回1×d矩阵"""
+        if vector_b64 is not None:
+            return self._to_matrix(_decode_base64_float32(vector_b64).reshape(1, -1), dimension)
+        if vector is None:
+            raise HTTPException(status_code=400, detail="必须提供vector或vector_b64")
+        return self._to_matrix([vector], dimension)
+    
+    def _flat_to_matrix(self, flat: np.ndarray, dimension: int) -> np.ndarray:
+        """将按行拼接的一维向量数据按维度切分为矩阵"""
+        if flat.size % dimension != 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"二进制向量长度不是维度的整数倍，维度: {dimension}, 元素数: {flat.size}"
+            )
+        return self._to_matrix(flat.reshape(-1, dimension), dimension)
+    
+    def _payload_matrix(self, vectors: Optional[List[List[float]]], vectors_b64: Optional[str], dimension: int) -> np.ndarray:
+        """从JSON二维数组或按行拼接的base64二进制中取出向量矩阵"""
+        if vectors_b64 is not None:
+            return self._flat_to_matrix(_decode_base64_float32(vectors_b64), dimension)
+        if vectors is None:
+            raise HTTPException(status_code=400, detail="必须提供vectors或vectors_b64")
+        return self._to_matrix(vectors, dimension)
+    
+    def _batch_matrix(self, batch: VectorBatchInsert, dimension: int) -> np.ndarray:
+        """组装批量插入的向量矩阵"""
+        if batch.vectors_b64 is not None:
+            vectors_np = self._payload_matrix(None, batch.vectors_b64, dimension)
+            if len(vectors_np) != len(batch.records):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"向量数量与记录数量不一致: {len(vectors_np)}, {len(batch.records)}"
+                )
+            return vectors_np
+        if all(item.vector_b64 is not None for item in batch.records):
+            # 全部为二进制向量时解码后一次性拼接为矩阵
+            decoded = [_decode_base64_float32(item.vector_b64) for item in batch.records]
+            if len({vector.size for vector in decoded}) != 1:
+                raise HTTPException(status_code=400, detail="向量维度不一致")
+            return self._to_matrix(np.concatenate(decoded).reshape(len(decoded), -1), dimension)
+        return self._to_matrix(np.vstack([self._payload_vector(item.vector, item.vector_b64, dimension) for item in batch.records]), dimension)
+    
+    def _binary_results(self, results: List[List[VectorSearchResult]], top_k: int, include_metadata: bool) -> VectorBinarySearchResult:
+        """将搜索结果打包为二进制得分矩阵"""
+        scores = np.full((len(results), top_k), np.nan, dtype="<f4")
+        ids = [[None] * top_k for _ in results]
+        metadata = [[None] * top_k for _ in results] if include_metadata else None
+        for i, row in enumerate(results):
+            for j, result in enumerate(row[:top_k]):
+                scores[i, j] = result.score
+                ids[i][j] = result.id
+                if include_metadata:
+                    metadata[i][j] = result.metadata
+        return VectorBinarySearchResult(
+            shape=[len(results), top_k],
+            ids=ids,
+            scores_b64=base64.b64encode(scores.tobytes()).decode("ascii"),
+            metadata=metadata
+        )
+    
+    def _add_vectors(self, collection: str, vectors: np.ndarray, record_ids: List[str], metadatas: List[Dict[str, Any]]):
+        """将一批向量作为一个连续矩阵写入预写日志并加入索引"""
+        with self._locked_collection(collection, write=True, create=True):
+            # 检查记录ID是否重复
+            seen = set()
+            for record_id in record_ids:
+                if record_id in seen:
+                    raise HTTPException(status_code=400, detail=f"向量ID已存在: {record_id}")
+                seen.add(record_id)
+            index = self._get_or_create_index(collection, vectors.shape[1])
+            existing = self.metadata_stores[collection].existing_ids(record_ids)
+            if existing:
+                raise HTTPException(status_code=400, detail=f"向量ID已存在: {next(iter(existing))}")
+            
+            # 先写预写日志，再更新索引和元数据存储；日志中保存归一化后的向量
+            vectors = self._prepare_vectors(collection, vectors)
+            if not index.is_trained:
+                # 尚未训练的索引使用本批向量自动训练
+                self._train_index(collection, vectors)
+            start = self.next_ids[collection]
+            internal_ids = list(range(start, start + len(record_ids)))
+            self._append_wal(collection, {
+                "op": "insert",
+                "ids": record_ids,
+                "iids": internal_ids,
+                "vectors": base64.b64encode(vectors.tobytes()).decode("ascii"),
+                "metadata": metadatas
+            })
+            self._apply_insert(collection, vectors, record_ids, metadatas, internal_ids)
+        self._enforce_memory_budget(exclude=collection)
+    
+    def _delete_vector(self, collection: str, vector_id: str):
+        """将删除写入预写日志并从索引中删除向量"""
+        with self._locked_collection(collection, write=True):
+            internal_id = self.metadata_stores[collection].get_internal_id(vector_id)
+            if internal_id is None:
+                raise HTTPException(status_code=404, detail=f"向量记录未找到: {vector_id}")
+            self._append_wal(collection, {"op": "delete", "id": vector_id, "iid": internal_id})
+            self._apply_delete(collection, internal_id)
+    
+    def _search_cache_key(self, collection: str, vectors: np.ndarray, *params) -> bytes:
+        """由集合、集合版本、查询向量字节和搜索参数计算缓存键"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps([collection, self.generations.get(collection, 0), vectors.shape, params], sort_keys=True).encode("utf-8"))
+        digest.update(vectors.tobytes())
+        return digest.digest()
+    
+    def _search_cache_get(self, key: bytes) -> Optional[List[List[VectorSearchResult]]]:
+        """读取未过期的缓存结果并统计命中次数"""
+        with self._search_cache_lock:
+            entry = self._search_cache.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._search_cache.move_to_end(key)
+                self._search_cache_hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._search_cache[key]
+            self._search_cache_misses += 1
+            return None
+    
+    def _search_cache_put(self, key: bytes, results: List[List[VectorSearchResult]]):
+        """写入缓存，超出容量时淘汰最久未使用的结果"""
+        ttl = self.config.vector_search_cache_ttl_seconds
+        with self._search_cache_lock:
+            self._search_cache[key] = (time.monotonic() + ttl if ttl > 0 else None, results)
+            self._search_cache.move_to_end(key)
+            while len(self._search_cache) > self.config.vector_search_cache_size:
+                self._search_cache.popitem(last=False)
+    
+    def _search_cache_stats(self) -> VectorSearchCacheStats:
+        """汇总搜索结果缓存的统计信息"""
+        with self._search_cache_lock:
+            total = self._search_cache_hits + self._search_cache_misses
+            return VectorSearchCacheStats(
+                size=len(self._search_cache),
+                capacity=self.config.vector_search_cache_size,
+                ttl_seconds=self.config.vector_search_cache_ttl_seconds,
+                hits=self._search_cache_hits,
+                misses=self._search_cache_misses,
+                hit_rate=self._search_cache_hits / total if total else 0.0
+            )
+    
+    def _search(self, collection: str, vectors: np.ndarray, top_k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None, filter: Optional[Dict[str, Any]] = None, rerank: Optional[bool] = None) -> List[List[VectorSearchResult]]:
+        """在读锁下执行搜索，每个查询向量返回一个结果列表；集合未被修改时相同的查询直接返回缓存结果"""
+        with self._locked_collection(collection):
+            if self.config.vector_search_cache_size <= 0:
+                return self._search_locked(collection, vectors, top_k, nprobe, ef_search, filter, rerank)
+            
+            # 持有读锁期间集合版本不会变化
+            key = self._search_cache_key(collection, vectors, top_k, nprobe, ef_search, filter, rerank)
+            results = self._search_cache_get(key)
+            if results is None:
+                results = self._search_locked(collection, vectors, top_k, nprobe, ef_search, filter, rerank)
+                self._search_cache_put(key, results)
+            return results
+    
+    def _search_locked(self, collection: str, vectors: np.ndarray, top_k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None, filter: Optional[Dict[str, Any]] = None, rerank: Optional[bool] = None) -> List[List[VectorSearchResult]]:
+        """执行搜索，调用方需持有集合的读锁；rerank为None时按集合配置决定是否重排"""
+        found = self._search_arrays(collection, vectors, top_k, nprobe, ef_search, filter, rerank)
+        if found is None:
+            return [[] for _ in range(len(vectors))]
+        distances, indices = found
+        
+        # 只为命中的记录读取元数据
+        hits = self.metadata_stores[collection].fetch(sorted({int(idx) for idx in indices.ravel() if idx != -1}))
+        
+        # 准备结果
+        all_results = []
+        for row_distances, row_indices in zip(distances, indices):
+            results = []
+            for distance, idx in zip(row_distances, row_indices):
+                if idx != -1 and idx in hits:
+                    record_id, metadata = hits[idx]
+                    results.append(VectorSearchResult(
+                        id=record_id,
+                        score=float(distance),
+                        metadata=metadata
+                    ))
+            all_results.append(results)
+        return all_results
+    
+    def _search_arrays(self, collection: str, vectors: np.ndarray, top_k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None, filter: Optional[Dict[str, Any]] = None, rerank: Optional[bool] = None):
+        """执行索引搜索，返回(得分, 内部ID)矩阵，集合为空或过滤后无记录时返回None"""
+        spec = self.collection_specs[collection]
+        rerank = spec.rerank if rerank is None else rerank and spec.rerank
+        index = self.indexes[collection]
+        vectors = self._prepare_vectors(collection, vectors)
+        if index.ntotal == 0:
+            return None
+        
+        # 元数据过滤在索引搜索内部通过ID选择器完成
+        filter_selector = None
+        if filter:
+            filter_selector, bitmap, matched = self._filter_selector(collection, filter)
+            if matched == 0:
+                return None
+        
+        # 执行搜索
+        params, selector = self._search_params(collection, nprobe, ef_search, filter_selector)
+        if rerank:
+            # 从量化索引中多取候选，再用全精度副本精确重排
+            distances, indices = index.search(self._index_vectors(collection, vectors), top_k * spec.rerank_factor, params=params)
+            return self._rerank(collection, vectors, distances, indices, top_k)
+        return index.search(self._index_vectors(collection, vectors), top_k, params=params)
+    
+    def _search_paged(self, query: VectorPagedQuery, vectors: np.ndarray) -> VectorSearchPage:
+        """执行范围搜索或深度top_k搜索，返回第一页结果，其余结果保存在游标中"""
+        collection = query.collection
+        with self._locked_collection(collection):
+            if query.radius is None:
+                found = self._search_arrays(collection, vectors, query.top_k, query.nprobe, query.ef_search, query.filter)
+                if found is None:
+                    scores, internal_ids = np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+                else:
+                    scores, internal_ids = found[0][0], found[1][0]
+                    keep = internal_ids != -1
+                    scores, internal_ids = scores[keep], internal_ids[keep]
+            else:
+                scores, internal_ids = self._range_search(collection, vectors, query.radius, query.nprobe, query.ef_search, query.filter)
+            
+            # 第一页在同一把读锁下读取元数据
+            results = self._page_results(collection, internal_ids[:query.page_size], scores[:query.page_size])
+        
+        next_cursor = None
+        if len(internal_ids) > query.page_size:
+            next_cursor = self._save_cursor(collection, scores, internal_ids, query.page_size)
+        return VectorSearchPage(results=results, total=len(internal_ids), next_cursor=next_cursor)
+    
+    def _range_search(self, collection: str, vectors: np.ndarray, radius: float, nprobe: Optional[int] = None, ef_search: Optional[int] = None, filter: Optional[Dict[str, Any]] = None):
+        """返回距离在半径内的全部结果，按得分排序，调用方需持有集合的读锁"""
+        spec = self.collection_specs[collection]
+        index = self.indexes[collection]
+        vectors = self._prepare_vectors(collection, vectors)
+        empty = np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        if index.ntotal == 0:
+            return empty
+        
+        filter_selector = None
+        if filter:
+            filter_selector, bitmap, matched = self._filter_selector(collection, filter)
+            if matched == 0:
+                return empty
+        
+        params, selector = self._search_params(collection, nprobe, ef_search, filter_selector)
+        binary = spec.index_type == "binary"
+        lims, scores, internal_ids = index.range_search(self._index_vectors(collection, vectors), int(radius) if binary else radius, params=params)
+        scores, internal_ids = scores[lims[0]:lims[1]], internal_ids[lims[0]:lims[1]]
+        
+        # 量化索引的候选用全精度副本重新计算得分，并按精确得分重新判断是否在半径内；
+        # 二进制索引的半径是汉明距离，不参与重排
+        larger_is_better = spec.metric != "l2" and not binary
+        if spec.rerank and not binary and len(internal_ids):
+            scores = self._exact_scores(collection, vectors[:1], self._read_raw(collection, internal_ids)[None])[0].astype(np.float32)
+            keep = scores > radius if larger_is_better else scores < radius
+            scores, internal_ids = scores[keep], internal_ids[keep]
+        
+        order = np.argsort(-scores if larger_is_better else scores, kind="stable")
+        return scores[order], internal_ids[order]
+    
+    def _page_results(self, collection: str, internal_ids: np.ndarray, scores: np.ndarray) -> List[VectorSearchResult]:
+        """为一页结果读取元数据，已删除的记录被跳过"""
+        hits = self.metadata_stores[collection].fetch(sorted({int(idx) for idx in internal_ids}))
+        results = []
+        for score, idx in zip(scores, internal_ids):
+            if idx in hits:
+                record_id, metadata = hits[idx]
+                results.append(VectorSearchResult(id=record_id, score=float(score), metadata=metadata))
+        return results
+    
+    def _save_cursor(self, collection: str, scores: np.ndarray, internal_ids: np.ndarray, page_size: int) -> str:
+        """保存剩余结果并返回指向第二页的游标，超出数量上限时淘汰最早的游标"""
+        cursor_id = uuid.uuid4().hex
+        ttl = self.config.vector_cursor_ttl_seconds
+        with self._cursors_lock:
+            self._cursors[cursor_id] = (time.monotonic() + ttl, collection, scores, internal_ids, page_size)
+            while len(self._cursors) > max(self.config.vector_max_cursors, 1):
+                self._cursors.popitem(last=False)
+        return f"{cursor_id}.{page_size}"
+    
+    def _cursor_page(self, cursor: str, page_size: Optional[int] = None) -> VectorSearchPage:
+        """按游标读取下一页结果"""
+        try:
+            cursor_id, offset = cursor.split(".", 1)
+            offset = int(offset)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"无效的游标: {cursor}")
+        
+        with self._cursors_lock:
+            entry = self._cursors.get(cursor_id)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._cursors[cursor_id]
+                entry = None
+        if entry is None or offset < 0:
+            raise HTTPException(status_code=404, detail=f"游标不存在或已过期: {cursor}")
+        
+        expires, collection, scores, internal_ids, default_page_size = entry
+        page_size = page_size or default_page_size
+        stop = offset + page_size
+        with self._locked_collection(collection):
+            results = self._page_results(collection, internal_ids[offset:stop], scores[offset:stop])
+        
+        next_cursor = None
+        if stop < len(internal_ids):
+            next_cursor = f"{cursor_id}.{stop}"
+        else:
+            # 最后一页读取后释放游标
+            with self._cursors_lock:
+                self._cursors.pop(cursor_id, None)
+        return VectorSearchPage(results=results, total=len(internal_ids), next_cursor=next_cursor)
+    
+    def _recall(self, collection: str, request: VectorRecallRequest) -> VectorRecallReport:
+        """以全精度副本上的精确搜索为基准，评估索引搜索的召回率"""
+        with self._locked_collection(collection):
+            spec = self.collection_specs[collection]
+            if not spec.rerank:
+                raise HTTPException(status_code=400, detail=f"集合未保存全精度向量副本，无法评估召回率: {collection}")
+            internal_ids = self.metadata_stores[collection].internal_ids()
+            if len(internal_ids) == 0:
+                raise HTTPException(status_code=400, detail=f"集合为空: {collection}")
+            
+            # 查询向量未提供时从集合中随机抽样
+            if request.vectors is not None:
+                queries = self._prepare_vectors(collection, self._to_matrix(request.vectors, spec.dimension))
+            else:
+                sample_size = min(request.sample_size, len(internal_ids))
+                sample = np.random.default_rng().choice(internal_ids, sample_size, replace=False)
+                queries = self._read_raw(collection, np.sort(sample))
+            top_k = min(request.top_k, len(internal_ids))
+            
+            # 分块扫描全精度副本求出精确的最近邻
+            metric = faiss.METRIC_L2 if spec.metric == "l2" else faiss.METRIC_INNER_PRODUCT
+            truth_scores = np.empty((len(queries), 0), dtype=np.float32)
+            truth_ids = np.empty((len(queries), 0), dtype=np.int64)
+            chunk_size = 65536
+            for start in range(0, len(internal_ids), chunk_size):
+                chunk_ids = internal_ids[start:start + chunk_size]
+                chunk = self._read_raw_range(collection, chunk_ids)
+                chunk_scores, positions = faiss.knn(queries, chunk, min(top_k, len(chunk_ids)), metric=metric)
+                truth_scores = np.hstack([truth_scores, chunk_scores])
+                truth_ids = np.hstack([truth_ids, chunk_ids[positions]])
+                order = np.argsort(-truth_scores if metric == faiss.METRIC_INNER_PRODUCT else truth_scores, axis=1, kind="stable")[:, :top_k]
+                truth_scores = np.take_along_axis(truth_scores, order, axis=1)
+                truth_ids = np.take_along_axis(truth_ids, order, axis=1)
+            
+            # 分别统计不重排和重排后的recall@top_k
+            index = self.indexes[collection]
+            index_queries = self._index_vectors(collection, queries)
+            params, selector = self._search_params(collection, request.nprobe, request.ef_search)
+            _, indices = index.search(index_queries, top_k, params=params)
+            recall = np.mean([len(set(found) & set(truth)) / top_k for found, truth in zip(indices, truth_ids)])
+            distances, indices = index.search(index_queries, top_k * spec.rerank_factor, params=params)
+            _, indices = self._rerank(collection, queries, distances, indices, top_k)
+            recall_reranked = np.mean([len(set(found) & set(truth)) / top_k for found, truth in zip(indices, truth_ids)])
+            
+            return VectorRecallReport(
+                collection=collection,
+                index=spec,
+                queries=len(queries),
+                top_k=top_k,
+                recall=float(recall),
+                recall_reranked=float(recall_reranked)
+            )
+    
+    def _start_rebuild(self, collection: str, request: VectorRebuildRequest) -> VectorRebuildStatus:
+        """在快照锁下记录重建的起点，之后的写入进入重建队列，在后台线程中构建新索引"""
+        with self._locked_collection(collection, snapshot=True):
+            spec = self.collection_specs[collection]
+            new_spec = (request.index or spec).model_copy()
+            if new_spec.dimension is None:
+                new_spec.dimension = spec.dimension
+            if (new_spec.dimension, new_spec.metric, new_spec.rerank) != (spec.dimension, spec.metric, spec.rerank):
+                raise HTTPException(status_code=400, detail="重建索引不能修改向量维度、距离度量和重排设置")
+            self._validate_spec(new_spec, new_spec.dimension)
+            
+            with self._lock:
+                if collection in self._rebuild_tails:
+                    raise HTTPException(status_code=400, detail=f"集合正在重建索引: {collection}")
+                self._rebuild_tails[collection] = deque()
+            try:
+                # 向量来源：全精度副本，或当前索引的副本。锁内只把索引写入页缓存，在后台线程中读回；
+                # 内存映射的索引与快照文件一致，为快照文件建立硬链接，避免检查点删除旧快照后无法读取
+                internal_ids = self.metadata_stores[collection].internal_ids()
+                source = None
+                if spec.index_type == "binary" and not spec.rerank:
+                    # 二进制索引不支持clone和按ID批量取回，直接复制编码和ID数组
+                    index = self.indexes[collection]
+                    codes = faiss.vector_to_array(faiss.downcast_IndexBinary(index.index).xb).reshape(index.ntotal, -1)
+                    id_map = faiss.vector_to_array(index.id_map)
+                    order = np.argsort(id_map)
+                    source = (id_map[order], codes[order], index.d)
+                elif not spec.rerank:
+                    source = self._rebuild_source_path(collection)
+                    if os.path.exists(source):
+                        os.remove(source)
+                    if collection in self.mmapped:
+                        os.link(self._index_path(collection), source)
+                    else:
+                        _write_index(self.indexes[collection], source)
+            except Exception:
+                self._rebuild_tails.pop(collection, None)
+                raise
+            
+            status = VectorRebuildStatus(
+                collection=collection,
+                index=new_spec,
+                total=len(internal_ids),
+                started_at=datetime.now().isoformat()
+            )
+            self.rebuilds[collection] = status
+        self._rebuild_executor.submit(self._run_rebuild, collection, new_spec, internal_ids, source)
+        return status
+    
+    def _rebuild_vectors(self, collection: str, source, internal_ids: np.ndarray, contiguous: bool = True) -> np.ndarray:
+        """按内部ID取回重建所需的向量"""
+        if source is None:
+            return self._read_raw_range(collection, internal_ids) if contiguous else self._read_raw(collection, internal_ids)
+        if isinstance(source, tuple):
+            # 按ID查找二进制编码的位置，展开为0/1分量，重新打包后与原编码相同
+            sorted_ids, codes, dimension = source
+            bits = np.unpackbits(codes[np.searchsorted(sorted_ids, internal_ids)], axis=1)
+            return np.ascontiguousarray(bits[:, :dimension], dtype=np.float32)
+        return source.reconstruct_batch(internal_ids)
+    
+    def _rebuild_add(self, index, spec: VectorIndexSpec, vectors: np.ndarray, internal_ids: np.ndarray):
+        """向新索引添加向量，尚未训练时先用本批向量训练"""
+        if not index.is_trained:
+            if len(vectors) < self._min_train_size(spec):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"训练样本不足，至少需要: {self._min_train_size(spec)}, 实际: {len(vectors)}"
+                )
+            index.train(_index_input(spec, vectors))
+        index.add_with_ids(_index_input(spec, vectors), np.asarray(internal_ids, dtype=np.int64))
+    
+    def _apply_rebuild_tail(self, collection: str, index, spec: VectorIndexSpec, tombstones: set):
+        """把重建队列中的写入应用到新索引"""
+        tail = self._rebuild_tails[collection]
+        while tail:
+            op = tail.popleft()
+            if op[0] == "insert":
+                self._rebuild_add(index, spec, op[1], op[2])
+            else:
+                tombstones.add(op[1])
+    
+    def _run_rebuild(self, collection: str, spec: VectorIndexSpec, internal_ids: np.ndarray, source):
+        """构建新索引并追赶重建期间的写入，最后在写锁下原子替换，搜索不中断"""
+        status = self.rebuilds[collection]
+        try:
+            if isinstance(source, str):
+                path, source = source, _read_index(source)
+                os.remove(path)
+            if isinstance(source, faiss.Index) and self.collection_specs[collection].index_type in ("ivf", "ivfpq", "pq"):
+                # IVF索引需要ID到倒排位置的映射才能按ID取回向量
+                source.set_direct_map_type(faiss.DirectMap.Hashtable)
+            
+            index = self._create_index(spec, spec.dimension)
+            
+            # 训练：从快照中抽取样本
+            if not index.is_trained and len(internal_ids) > 0:
+                sample_ids = internal_ids
+                if spec.train_size and len(internal_ids) > spec.train_size:
+                    sample_ids = np.sort(np.random.default_rng().choice(internal_ids, spec.train_size, replace=False))
+                if len(sample_ids) < self._min_train_size(spec):
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"训练样本不足，至少需要: {self._min_train_size(spec)}, 实际: {len(sample_ids)}"
+                    )
+                index.train(_index_input(spec, self._rebuild_vectors(collection, source, sample_ids, contiguous=sample_ids is internal_ids)))
+            
+            # 分批加入快照中的向量，保留原内部ID，已删除的向量不再加入
+            chunk_size = 65536
+            for start in range(0, len(internal_ids), chunk_size):
+                if self._stop_event.is_set():
+                    raise RuntimeError("服务关闭，重建已中止")
+                chunk_ids = internal_ids[start:start + chunk_size]
+                self._rebuild_add(index, spec, self._rebuild_vectors(collection, source, chunk_ids), chunk_ids)
+                status.processed += len(chunk_ids)
+            source = None
+            
+            # 先在锁外追赶大部分写入，再在写锁下应用剩余部分并替换索引
+            tombstones = set()
+            self._apply_rebuild_tail(collection, index, spec, tombstones)
+            with self._collection_lock(collection).write_lock():
+                self._apply_rebuild_tail(collection, index, spec, tombstones)
+                self.indexes[collection] = index
+                self.collection_specs[collection] = spec
+                self.tombstones[collection] = tombstones
+                self._tombstone_selectors.pop(collection, None)
+                self.mmapped.discard(collection)
+                self.generations[collection] = self.generations.get(collection, 0) + 1
+                self._rebuild_tails.pop(collection, None)
+            
+            # 新索引写入快照，期间搜索不受影响
+            self._checkpoint(collection)
+            status.status = "completed"
+        except Exception as e:
+            status.status = "failed"
+            status.error = e.detail if isinstance(e, HTTPException) else str(e)
+        finally:
+            self._rebuild_tails.pop(collection, None)
+            status.finished_at = datetime.now().isoformat()
+    
+    def _create_named_collection(self, collection: str, spec: VectorIndexSpec) -> VectorCollectionInfo:
+        """显式创建集合并立即写快照"""
+        with self._locked_collection(collection, write=True, create=True):
+            if collection in self.indexes:
+                raise HTTPException(status_code=400, detail=f"集合已存在: {collection}")
+            self._create_collection(collection, spec)
+            # 集合配置不记录在预写日志中，创建后立即写快照
+            self._checkpoint_locked(collection)
+            return self._collection_info(collection)
+    
+    def _train_collection(self, collection: str, vectors: np.ndarray) -> VectorCollectionInfo:
+        """训练尚未训练的集合索引"""
+        with self._locked_collection(collection, write=True):
+            if self.indexes[collection].is_trained:
+                raise HTTPException(status_code=400, detail=f"集合索引已训练: {collection}")
+            self._train_index(collection, vectors)
+            return self._collection_info(collection)
+    
     def _register_routes(self):
         """注册路由"""
         @self.router.post("/insert", response_model=VectorRecord)
         async def insert_vector(record: VectorRecord):
             """插入向量"""
-            # 检查向量维度
-            if len(record.vector) != self.config.vector_dimension:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"向量维度不匹配，期望: {self.config.vector_dimension}, 实际: {len(record.vector)}"
-                )
-            
-            # 获取或创建索引
-            index = self._get_or_create_index(record.collection)
-            
             # 生成记录ID
             record_id = record.id or str(uuid.uuid4())
             
@@ -118,124 +2102,262 @@ class VectorModule:
             metadata = record.metadata or {}
             metadata["created_at"] = now
             
-            # 添加向量到索引
-            vector_np = np.array([record.vector], dtype=np.float32)
-            index.add(vector_np)
-            
-            # 更新元数据和ID映射
-            idx = index.ntotal - 1
-            if record.collection not in self.metadata:
-                self.metadata[record.collection] = {}
-            if record.collection not in self.id_maps:
-                self.id_maps[record.collection] = {}
-            
-            self.metadata[record.collection][record_id] = metadata
-            self.id_maps[record.collection][idx] = record_id
+            # 写入预写日志并添加向量到索引
+            dimension = await self._run(self._collection_dimension, record.collection)
+            vector_np = self._payload_vector(record.vector, record.vector_b64, dimension)
+            await self._run_write(self._add_vectors, record.collection, vector_np, [record_id], [metadata])
             
-            # 保存索引
-            self._save_index(record.collection)
-            
-            # 返回结果
+            # 返回结果，向量按请求时的编码原样返回
             return VectorRecord(
                 id=record_id,
                 collection=record.collection,
-                vector=record.vector,
+                vector=record.vector if record.vector_b64 is None else None,
+                vector_b64=record.vector_b64,
                 metadata=metadata,
                 created_at=now
             )
         
+        @self.router.post("/insert_batch", response_model=VectorBatchInsertResult)
+        async def insert_vectors_batch(batch: VectorBatchInsert):
+            """批量插入向量"""
+            if not batch.records:
+                raise HTTPException(status_code=400, detail="批量插入的记录不能为空")
+            
+            # 组装连续的float32矩阵
+            dimension = await self._run(self._collection_dimension, batch.collection)
+            vectors_np = await self._run(self._batch_matrix, batch, dimension)
+            
+            # 生成记录ID和元数据
+            now = datetime.now().isoformat()
+            record_ids = [item.id or str(uuid.uuid4()) for item in batch.records]
+            metadatas = []
+            for item in batch.records:
+                metadata = item.metadata or {}
+                metadata["created_at"] = now
+                metadatas.append(metadata)
+            
+            # 整批写入一条预写日志并加入索引
+            await self._run_write(self._add_vectors, batch.collection, vectors_np, record_ids, metadatas)
+            
+            return VectorBatchInsertResult(
+                collection=batch.collection,
+                ids=record_ids,
+                count=len(record_ids),
+                created_at=now
+            )
+        
         @self.router.post("/search", response_model=List[VectorSearchResult])
         async def search_vectors(query: VectorQuery):
             """搜索向量"""
             # 检查集合是否存在
-            if query.collection not in self.indexes:
+            if query.collection not in self.collection_names:
                 raise HTTPException(status_code=404, detail=f"集合未找到: {query.collection}")
+            if query.top_k <= 0:
+                raise HTTPException(status_code=400, detail="top_k必须大于0")
             
-            # 检查向量维度
-            if len(query.vector) != self.config.vector_dimension:
+            # 检查向量维度并执行搜索
+            dimension = await self._run(self._collection_dimension, query.collection)
+            vector_np = self._payload_vector(query.vector, query.vector_b64, dimension)
+            results = await self._run(self._search, query.collection, vector_np, query.top_k, query.nprobe, query.ef_search, query.filter)
+            return results[0]
+        
+        @self.router.post("/search_batch", response_model=List[List[VectorSearchResult]])
+        async def search_vectors_batch(query: VectorBatchQuery):
+            """批量搜索向量，所有查询在一次索引搜索中完成"""
+            # 检查集合是否存在
+            if query.collection not in self.collection_names:
+                raise HTTPException(status_code=404, detail=f"集合未找到: {query.collection}")
+            if query.top_k <= 0 or (query.top_ks is not None and any(k <= 0 for k in query.top_ks)):
+                raise HTTPException(status_code=400, detail="top_k和top_ks必须大于0")
+            dimension = await self._run(self._collection_dimension, query.collection)
+            vectors_np = await self._run(self._payload_matrix, query.vectors, query.vectors_b64, dimension)
+            if len(vectors_np) == 0:
+                return []
+            if query.top_ks is not None and len(query.top_ks) != len(vectors_np):
                 raise HTTPException(
-                    status_code=400, 
-                    detail=f"向量维度不匹配，期望: {self.config.vector_dimension}, 实际: {len(query.vector)}"
+                    status_code=400,
+                    detail=f"top_ks数量与查询向量数量不一致: {len(query.top_ks)}, {len(vectors_np)}"
                 )
             
-            # 获取索引
-            index = self.indexes[query.collection]
+            # 以最大的top_k执行一次搜索，再按每个查询的top_k截断
+            top_ks = query.top_ks or [query.top_k] * len(vectors_np)
+            results = await self._run(self._search, query.collection, vectors_np, max(top_ks), query.nprobe, query.ef_search, query.filter)
+            return [row[:k] for row, k in zip(results, top_ks)]
+        
+        @self.router.post("/search_paged", response_model=VectorSearchPage)
+        async def search_vectors_paged(query: VectorPagedQuery):
+            """范围搜索或深度搜索，结果分页返回"""
+            # 检查集合是否存在
+            if query.collection not in self.collection_names:
+                raise HTTPException(status_code=404, detail=f"集合未找到: {query.collection}")
+            if query.page_size <= 0 or query.top_k <= 0:
+                raise HTTPException(status_code=400, detail="page_size和top_k必须大于0")
+            
+            dimension = await self._run(self._collection_dimension, query.collection)
+            vector_np = self._payload_vector(query.vector, query.vector_b64, dimension)
+            return await self._run(self._search_paged, query, vector_np)
+        
+        @self.router.get("/cursors/{cursor}", response_model=VectorSearchPage)
+        async def get_search_page(
+            cursor: str,
+            page_size: Optional[int] = Query(None, description="本页结果数量，默认沿用首次搜索的page_size")
+        ):
+            """按游标获取分页搜索的下一页结果"""
+            if page_size is not None and page_size <= 0:
+                raise HTTPException(status_code=400, detail="page_size必须大于0")
+            return await self._run(self._cursor_page, cursor, page_size)
+        
+        @self.router.post("/search_binary", response_model=VectorBinarySearchResult)
+        async def search_vectors_binary(
+            request: Request,
+            collection: str = Query(..., description="集合名称"),
+            top_k: int = Query(5, description="每个查询返回的结果数量"),
+            nprobe: Optional[int] = Query(None, gt=0, description="覆盖IVF索引的搜索聚类数量"),
+            ef_search: Optional[int] = Query(None, gt=0, description="覆盖HNSW索引的搜索候选队列长度"),
+            include_metadata: bool = Query(False, description="是否返回元数据"),
+            filter: Optional[str] = Query(None, description="JSON格式的元数据过滤条件")
+        ):
+            """使用二进制请求体搜索向量，支持原始小端float32（application/octet-stream）和.npy（application/x-npy）"""
+            # 检查集合是否存在
+            if collection not in self.collection_names:
+                raise HTTPException(status_code=404, detail=f"集合未找到: {collection}")
+            if top_k <= 0:
+                raise HTTPException(status_code=400, detail="top_k必须大于0")
             
-            # 执行搜索
-            vector_np = np.array([query.vector], dtype=np.float32)
-            distances, indices = index.search(vector_np, query.top_k)
+            # 零拷贝解析请求体
+            dimension = await self._run(self._collection_dimension, collection)
+            body = await request.body()
+            content_type = request.headers.get("content-type", "application/octet-stream")
+            if content_type.startswith("application/x-npy") or body[:6] == b"\x93NUMPY":
+                vectors_np = _decode_npy(body)
+                if vectors_np.ndim == 1:
+                    vectors_np = vectors_np.reshape(1, -1)
+                vectors_np = self._to_matrix(vectors_np, dimension)
+            elif content_type.startswith("application/octet-stream"):
+                vectors_np = self._flat_to_matrix(_decode_float32(body), dimension)
+            else:
+                raise HTTPException(status_code=415, detail=f"不支持的请求体类型: {content_type}")
             
-            # 准备结果
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx != -1 and idx in self.id_maps[query.collection]:
-                    record_id = self.id_maps[query.collection][idx]
-                    metadata = self.metadata[query.collection].get(record_id, {})
-                    results.append(VectorSearchResult(
-                        id=record_id,
-                        score=float(distances[0][i]),
-                        metadata=metadata
-                    ))
+            # 解析过滤条件
+            filter_dict = None
+            if filter:
+                try:
+                    filter_dict = json.loads(filter)
+                except json.JSONDecodeError:
+                    raise HTTPException(status_code=400, detail="无效的过滤条件格式")
+                if not isinstance(filter_dict, dict):
+                    raise HTTPException(status_code=400, detail="无效的过滤条件格式")
             
-            return results
+            results = await self._run(self._search, collection, vectors_np, top_k, nprobe, ef_search, filter_dict)
+            return self._binary_results(results, top_k, include_metadata)
         
         @self.router.delete("/{collection}/{vector_id}")
         async def delete_vector(collection: str, vector_id: str):
             """删除向量"""
             # 检查集合是否存在
-            if collection not in self.indexes:
+            if collection not in self.collection_names:
                 raise HTTPException(status_code=404, detail=f"集合未找到: {collection}")
             
-            # 检查记录是否存在
-            if vector_id not in self.metadata[collection]:
-                raise HTTPException(status_code=404, detail=f"向量记录未找到: {vector_id}")
-            
             # 删除记录
-            # 注意：FAISS不支持直接删除，我们需要重建索引
-            # 这是一个简化的实现，生产环境中应该使用更高效的方法
-            
-            # 获取所有向量和元数据
-            all_vectors = []
-            all_ids = []
-            
-            # 找到要删除的向量索引
-            idx_to_delete = None
-            for idx, id in self.id_maps[collection].items():
-                if id == vector_id:
-                    idx_to_delete = idx
-                    break
-            
-            if idx_to_delete is None:
-                raise HTTPException(status_code=404, detail=f"向量记录未找到: {vector_id}")
-            
-            # 删除元数据
-            del self.metadata[collection][vector_id]
-            
-            # 重建索引
-            new_index = faiss.IndexFlatL2(self.config.vector_dimension)
-            new_id_map = {}
-            
-            # 复制所有向量（除了要删除的）
-            for idx, id in self.id_maps[collection].items():
-                if idx != idx_to_delete:
-                    # 获取向量
-                    vector = np.array([self.indexes[collection].reconstruct(idx)], dtype=np.float32)
-                    new_index.add(vector)
-                    new_id_map[new_index.ntotal - 1] = id
-            
-            # 更新索引和ID映射
-            self.indexes[collection] = new_index
-            self.id_maps[collection] = new_id_map
-            
-            # 保存索引
-            self._save_index(collection)
+            await self._run_write(self._delete_vector, collection, vector_id)
             
             return {"message": f"向量记录已删除: {vector_id}"}
         
+        @self.router.post("/imports", response_model=VectorImportJob)
+        async def create_import(request: VectorImportCreate):
+            """从已上传的.npy（可附带元数据JSONL）或Parquet文件批量导入向量，任务在后台执行"""
+            return await self._run(self._create_import, request)
+        
+        @self.router.get("/imports", response_model=List[VectorImportJob])
+        async def list_imports():
+            """列出导入任务"""
+            return sorted(self.import_jobs.values(), key=lambda job: job.created_at)
+        
+        @self.router.get("/imports/{job_id}", response_model=VectorImportJob)
+        async def get_import(job_id: str):
+            """获取导入任务进度"""
+            if job_id not in self.import_jobs:
+                raise HTTPException(status_code=404, detail=f"导入任务未找到: {job_id}")
+            return self.import_jobs[job_id]
+        
+        @self.router.post("/imports/{job_id}/resume", response_model=VectorImportJob)
+        async def resume_import(job_id: str):
+            """从已提交的进度继续执行失败或取消的导入任务"""
+            if job_id not in self.import_jobs:
+                raise HTTPException(status_code=404, detail=f"导入任务未找到: {job_id}")
+            job = self.import_jobs[job_id]
+            with self._import_lock:
+                if job.status not in ("failed", "cancelled"):
+                    raise HTTPException(status_code=400, detail=f"只能继续失败或取消的导入任务，当前状态: {job.status}")
+                job.status = "pending"
+                self._save_import_job(job)
+            self._import_executor.submit(self._run_import, job_id)
+            return job
+        
+        @self.router.post("/imports/{job_id}/cancel", response_model=VectorImportJob)
+        async def cancel_import(job_id: str):
+            """取消导入任务，当前批次提交后停止"""
+            if job_id not in self.import_jobs:
+                raise HTTPException(status_code=404, detail=f"导入任务未找到: {job_id}")
+            job = self.import_jobs[job_id]
+            with self._import_lock:
+                if job.status not in ("pending", "running"):
+                    raise HTTPException(status_code=400, detail=f"只能取消未完成的导入任务，当前状态: {job.status}")
+                job.status = "cancelled"
+                self._save_import_job(job)
+            return job
+        
+        @self.router.get("/cache/stats", response_model=VectorSearchCacheStats)
+        async def get_search_cache_stats():
+            """获取搜索结果缓存的命中统计"""
+            return self._search_cache_stats()
+        
         @self.router.get("/collections")
         async def list_collections():
             """列出所有集合"""
-            return {"collections": list(self.indexes.keys())}
+            return {"collections": sorted(self.collection_names)}
+        
+        @self.router.post("/collections", response_model=VectorCollectionInfo)
+        async def create_collection(request: VectorCollectionCreate):
+            """按索引配置创建集合"""
+            return await self._run_write(self._create_named_collection, request.name, request.index)
+        
+        @self.router.get("/collections/{collection}", response_model=VectorCollectionInfo)
+        async def get_collection_info(collection: str):
+            """获取集合信息"""
+            if collection not in self.collection_names:
+                raise HTTPException(status_code=404, detail=f"集合未找到: {collection}")
+            return await self._run(self._get_collection_info, collection)
+        
+        @self.router.post("/collections/{collection}/train", response_model=VectorCollectionInfo)
+        async def train_collection(collection: str, request: VectorTrainRequest):
+            """使用样本向量训练集合索引"""
+            if collection not in self.collection_names:
+                raise HTTPException(status_code=404, detail=f"集合未找到: {collection}")
+            dimension = await self._run(self._collection_dimension, collection)
+            vectors_np = await self._run(self._to_matrix, request.vectors, dimension)
+            return await self._run_write(self._train_collection, collection, vectors_np)
+        
+        @self.router.post("/collections/{collection}/rebuild", response_model=VectorRebuildStatus)
+        async def rebuild_collection(collection: str, request: VectorRebuildRequest = Body(VectorRebuildRequest())):
+            """在后台重建集合索引，可同时修改索引类型和参数，重建期间搜索和写入照常进行"""
+            if collection not in self.collection_names:
+                raise HTTPException(status_code=404, detail=f"集合未找到: {collection}")
+            return await self._run_write(self._start_rebuild, collection, request)
+        
+        @self.router.get("/collections/{collection}/rebuild", response_model=VectorRebuildStatus)
+        async def get_rebuild_status(collection: str):
+            """获取集合最近一次索引重建的进度"""
+            if collection not in self.rebuilds:
+                raise HTTPException(status_code=404, detail=f"集合没有重建记录: {collection}")
+            return self.rebuilds[collection]
+        
+        @self.router.post("/collections/{collection}/recall", response_model=VectorRecallReport)
+        async def evaluate_recall(collection: str, request: VectorRecallRequest):
+            """以精确搜索为基准评估集合索引的召回率，用于调整量化和搜索参数"""
+            if collection not in self.collection_names:
+                raise HTTPException(status_code=404, detail=f"集合未找到: {collection}")
+            return await self._run(self._recall, collection, request)
 
 def create_vector_module(config: MCPServerConfig) -> VectorModule:
     """创建向量数据库访问模块"""
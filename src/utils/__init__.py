@@ -0,0 +1,6 @@
+"""
+MCP服务器工具模块
+"""
+from .filters import parse_filter
+
+__all__ = ["parse_filter"]
@@ -0,0 +1,26 @@
+"""
+MCP服务器过滤条件解析
+"""
+from typing import List, Dict, Any, Tuple
+from fastapi import HTTPException
+
+def parse_filter(filter: Dict[str, Any]) -> List[Tuple[str, str, Any]]:
+    """将过滤条件解析为(字段, 操作符, 值)列表，文件预览和向量元数据过滤共用"""
+    conditions = []
+    for key, condition in filter.items():
+        if not isinstance(condition, dict):
+            # 简写形式等同于eq
+            condition = {"eq": condition}
+        if not condition:
+            raise HTTPException(status_code=400, detail=f"过滤条件为空: {key}")
+        for op, value in condition.items():
+            if op not in ("eq", "in", "gt", "gte", "lt", "lte"):
+                raise HTTPException(status_code=400, detail=f"不支持的过滤操作符: {op}")
+            if op == "in" and not isinstance(value, list):
+                raise HTTPException(status_code=400, detail=f"in操作符的值必须是列表: {key}")
+            if op in ("gt", "gte", "lt", "lte") and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise HTTPException(status_code=400, detail=f"范围操作符的值必须是数字: {key}")
+            if op in ("eq", "in") and any(isinstance(item, (dict, list)) or item is None for item in (value if op == "in" else [value])):
+                raise HTTPException(status_code=400, detail=f"过滤值必须是字符串或数字: {key}")
+            conditions.append((key, op, value))
+    return conditions
@@ -3,6 +3,7 @@ MCP服务器测试脚本
 """
 import os
 import sys
+import subprocess
 import json
 import requests
 import numpy as np
@@ -355,6 +356,1428 @@ def test_vector_module():
         print(f"❌ 向量数据库访问模块测试异常: {str(e)}")
         return False
 
+def test_vector_batch_module():
+    """测试向量批量插入"""
+    print("\n测试向量批量插入...")
+    
+    try:
+        # 生成一批测试向量
+        batch_size = 100
+        vectors = np.random.rand(batch_size, TEST_VECTOR_DIMENSION)
+        test_batch = {
+            "collection": "test_vectors_batch",
+            "records": [
+                {"vector": vector.tolist(), "metadata": {"index": i}}
+                for i, vector in enumerate(vectors)
+            ]
+        }
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json=test_batch
+        )
+        
+        if response.status_code != 200:
+            print(f"❌ 批量插入向量失败: {response.text}")
+            return False
+        
+        batch_info = response.json()
+        if batch_info["count"] != batch_size or len(batch_info["ids"]) != batch_size:
+            print(f"❌ 批量插入数量错误: {batch_info['count']}")
+            return False
+        
+        print(f"✅ 批量插入{batch_size}个向量成功")
+        
+        # 用批中的向量搜索，应命中自身
+        test_query = {
+            "collection": "test_vectors_batch",
+            "vector": vectors[10].tolist(),
+            "top_k": 1
+        }
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json=test_query
+        )
+        
+        if response.status_code != 200:
+            print(f"❌ 向量搜索失败: {response.text}")
+            return False
+        
+        search_results = response.json()
+        if not search_results or search_results[0]["id"] != batch_info["ids"][10]:
+            print(f"❌ 批量插入的向量未被正确检索")
+            return False
+        
+        print(f"✅ 向量批量插入测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 向量批量插入测试异常: {str(e)}")
+        return False
+
+def test_vector_wal_recovery():
+    """测试向量预写日志的崩溃恢复（在进程内启动向量模块，不经过HTTP服务器）"""
+    print("\n测试向量预写日志恢复...")
+    
+    import tempfile
+    from src.config import MCPServerConfig
+    from src.modules.vector_module import VectorModule, VectorIndexSpec
+    
+    try:
+        # 关闭自动检查点，模拟检查点之后的写入只存在于预写日志中
+        db_path = tempfile.mkdtemp()
+        config = MCPServerConfig(vector_db_path=db_path, vector_dimension=8, vector_checkpoint_interval_seconds=3600)
+        module = VectorModule(config)
+        vectors = np.random.rand(20, 8).astype("float32")
+        ids = [f"wal-{i}" for i in range(20)]
+        module._create_named_collection("wal_test", VectorIndexSpec(dimension=8))
+        module._add_vectors("wal_test", vectors[:10], ids[:10], [{"i": i} for i in range(10)])
+        module._checkpoint("wal_test")
+        module._add_vectors("wal_test", vectors[10:], ids[10:], [{"i": i} for i in range(10, 20)])
+        module._delete_vector("wal_test", "wal-3")
+        
+        # 不执行检查点直接丢弃模块，再从同一目录重新加载
+        recovered = VectorModule(config)
+        info = recovered._get_collection_info("wal_test")
+        if info.count != 19:
+            print(f"❌ 恢复后的记录数量错误: {info.count}")
+            return False
+        
+        results = recovered._search("wal_test", vectors[15:16], 3)[0]
+        result_ids = [r.id for r in results]
+        if result_ids[0] != "wal-15" or len(set(result_ids)) != len(result_ids):
+            print(f"❌ 恢复后的搜索结果错误: {result_ids}")
+            return False
+        if "wal-3" in [r.id for r in recovered._search("wal_test", vectors[3:4], 3)[0]]:
+            print(f"❌ 已删除的向量在恢复后重新出现")
+            return False
+        recovered.close()
+        
+        print(f"✅ 向量预写日志恢复测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 向量预写日志恢复测试异常: {str(e)}")
+        return False
+
+def test_vector_collection_module():
+    """测试向量集合的创建、训练和索引类型"""
+    print("\n测试向量集合...")
+    
+    try:
+        collection = f"test_ivf_{int(time.time() * 1000)}"
+        vectors = np.random.rand(500, 16)
+        
+        # 测试创建IVF集合
+        print("测试创建集合...")
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/collections",
+            json={"name": collection, "index": {"index_type": "ivf", "dimension": 16, "metric": "cosine", "nlist": 8, "nprobe": 8}}
+        )
+        if response.status_code != 200 or response.json()["is_trained"]:
+            print(f"❌ 创建集合失败: {response.text}")
+            return False
+        
+        # 无效的索引参数返回422，不会创建集合
+        for field in ("nlist", "hnsw_m", "pq_m"):
+            response = requests.post(
+                f"{MCP_SERVER_URL}/vector/collections",
+                json={"name": f"{collection}_{field}", "index": {"index_type": "ivfpq", "dimension": 16, field: 0}}
+            )
+            if response.status_code != 422:
+                print(f"❌ 无效的{field}未被拒绝: {response.status_code}")
+                return False
+        
+        # 测试训练并插入
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/collections/{collection}/train",
+            json={"vectors": vectors.tolist()}
+        )
+        if response.status_code != 200 or not response.json()["is_trained"]:
+            print(f"❌ 训练集合失败: {response.text}")
+            return False
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json={"collection": collection, "records": [{"id": f"v{i}", "vector": v.tolist()} for i, v in enumerate(vectors)]}
+        )
+        if response.status_code != 200:
+            print(f"❌ 插入向量失败: {response.text}")
+            return False
+        
+        # 维度按集合检查
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector": [0.1] * 8, "top_k": 1}
+        )
+        if response.status_code != 400:
+            print(f"❌ 维度不匹配的查询未被拒绝: {response.status_code}")
+            return False
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector": vectors[42].tolist(), "top_k": 1, "nprobe": -1}
+        )
+        if response.status_code != 422:
+            print(f"❌ 无效的nprobe未被拒绝: {response.status_code}")
+            return False
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector": vectors[42].tolist(), "top_k": 1, "nprobe": 8}
+        )
+        if response.status_code != 200 or response.json()[0]["id"] != "v42":
+            print(f"❌ IVF集合搜索失败: {response.text}")
+            return False
+        
+        response = requests.get(f"{MCP_SERVER_URL}/vector/collections/{collection}")
+        if response.status_code != 200 or response.json()["count"] != 500:
+            print(f"❌ 获取集合信息失败: {response.text}")
+            return False
+        
+        response = requests.get(f"{MCP_SERVER_URL}/vector/collections")
+        if collection not in response.json()["collections"]:
+            print(f"❌ 集合未在列表中找到")
+            return False
+        
+        print(f"✅ 向量集合测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 向量集合测试异常: {str(e)}")
+        return False
+
+def test_vector_concurrency_module():
+    """测试耗时的写入期间搜索请求不被阻塞"""
+    print("\n测试向量读写并发...")
+    
+    try:
+        import base64
+        import threading
+        suffix = int(time.time() * 1000)
+        write_collection = f"test_slow_write_{suffix}"
+        read_collection = f"test_read_{suffix}"
+        
+        # HNSW索引构建较慢，用一个大批量写入制造长时间的索引修改
+        requests.post(
+            f"{MCP_SERVER_URL}/vector/collections",
+            json={"name": write_collection, "index": {"index_type": "hnsw", "dimension": 64, "hnsw_m": 48, "ef_construction": 400}}
+        )
+        vectors = np.random.rand(20, TEST_VECTOR_DIMENSION)
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json={"collection": read_collection, "records": [{"id": f"c{i}", "vector": v.tolist()} for i, v in enumerate(vectors)]}
+        )
+        if response.status_code != 200:
+            print(f"❌ 插入向量失败: {response.text}")
+            return False
+        
+        write_vectors = np.random.rand(5000, 64).astype("<f4")
+        write_result = {}
+        def slow_write():
+            start = time.time()
+            write_result["response"] = requests.post(
+                f"{MCP_SERVER_URL}/vector/insert_batch",
+                json={
+                    "collection": write_collection,
+                    "records": [{} for _ in range(len(write_vectors))],
+                    "vectors_b64": base64.b64encode(write_vectors.tobytes()).decode("ascii")
+                }
+            )
+            write_result["seconds"] = time.time() - start
+        writer = threading.Thread(target=slow_write)
+        writer.start()
+        time.sleep(0.5)
+        
+        # 写入进行期间反复搜索另一个集合，记录最长耗时
+        latencies = []
+        while writer.is_alive():
+            start = time.time()
+            response = requests.post(
+                f"{MCP_SERVER_URL}/vector/search",
+                json={"collection": read_collection, "vector": vectors[len(latencies) % 20].tolist(), "top_k": 1}
+            )
+            latencies.append(time.time() - start)
+            if response.status_code != 200:
+                print(f"❌ 写入期间搜索失败: {response.text}")
+                return False
+        writer.join()
+        
+        if write_result["response"].status_code != 200:
+            print(f"❌ 批量写入失败: {write_result['response'].text}")
+            return False
+        print(f"写入耗时{write_result['seconds']:.2f}秒，期间完成{len(latencies)}次搜索，最长{max(latencies, default=0):.3f}秒")
+        if not latencies or max(latencies) > write_result["seconds"] / 2:
+            print(f"❌ 写入期间搜索被阻塞")
+            return False
+        
+        print(f"✅ 向量读写并发测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 向量读写并发测试异常: {str(e)}")
+        return False
+
+def test_vector_batch_search_module():
+    """测试批量搜索向量"""
+    print("\n测试批量搜索向量...")
+    
+    try:
+        collection = f"test_batch_search_{int(time.time() * 1000)}"
+        vectors = np.random.rand(50, TEST_VECTOR_DIMENSION)
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json={"collection": collection, "records": [{"id": f"b{i}", "vector": v.tolist()} for i, v in enumerate(vectors)]}
+        )
+        if response.status_code != 200:
+            print(f"❌ 插入向量失败: {response.text}")
+            return False
+        
+        # 每个查询单独指定返回数量
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search_batch",
+            json={"collection": collection, "vectors": vectors[[3, 7]].tolist(), "top_ks": [1, 4]}
+        )
+        if response.status_code != 200:
+            print(f"❌ 批量搜索失败: {response.text}")
+            return False
+        
+        results = response.json()
+        if [len(r) for r in results] != [1, 4] or results[0][0]["id"] != "b3" or results[1][0]["id"] != "b7":
+            print(f"❌ 批量搜索结果错误: {results}")
+            return False
+        
+        # 非正数的top_k返回400
+        for body in ({"top_k": 0}, {"top_ks": [1, -1]}):
+            response = requests.post(
+                f"{MCP_SERVER_URL}/vector/search_batch",
+                json={"collection": collection, "vectors": vectors[:2].tolist(), **body}
+            )
+            if response.status_code != 400:
+                print(f"❌ 无效的top_k未被拒绝: {body}, {response.status_code}")
+                return False
+        
+        print(f"✅ 批量搜索向量测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 批量搜索向量测试异常: {str(e)}")
+        return False
+
+def test_vector_binary_module():
+    """测试二进制向量编码和二进制搜索"""
+    print("\n测试二进制向量...")
+    
+    try:
+        import base64
+        collection = f"test_binary_{int(time.time() * 1000)}"
+        vectors = np.random.rand(10, TEST_VECTOR_DIMENSION).astype("<f4")
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json={
+                "collection": collection,
+                "records": [{"id": f"bin{i}"} for i in range(10)],
+                "vectors_b64": base64.b64encode(vectors.tobytes()).decode("ascii")
+            }
+        )
+        if response.status_code != 200:
+            print(f"❌ 以base64插入向量失败: {response.text}")
+            return False
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search_binary",
+            params={"collection": collection, "top_k": 2},
+            data=vectors[[4, 6]].tobytes(),
+            headers={"Content-Type": "application/octet-stream"}
+        )
+        if response.status_code != 200:
+            print(f"❌ 二进制搜索失败: {response.text}")
+            return False
+        
+        result = response.json()
+        scores = np.frombuffer(base64.b64decode(result["scores_b64"]), dtype="<f4").reshape(result["shape"])
+        if result["shape"] != [2, 2] or result["ids"][0][0] != "bin4" or result["ids"][1][0] != "bin6" or scores[0][0] > 1e-3:
+            print(f"❌ 二进制搜索结果错误: {result}")
+            return False
+        
+        # top_k必须大于0
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search_binary",
+            params={"collection": collection, "top_k": 0},
+            data=vectors[:1].tobytes(),
+            headers={"Content-Type": "application/octet-stream"}
+        )
+        if response.status_code != 400:
+            print(f"❌ 无效的top_k未被拒绝: {response.status_code}")
+            return False
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector_b64": base64.b64encode(vectors[0].tobytes()).decode("ascii"), "top_k": 0}
+        )
+        if response.status_code != 400:
+            print(f"❌ 无效的top_k未被拒绝: {response.status_code}")
+            return False
+        
+        print(f"✅ 二进制向量测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 二进制向量测试异常: {str(e)}")
+        return False
+
+def test_vector_filter_module():
+    """测试元数据过滤搜索"""
+    print("\n测试元数据过滤搜索...")
+    
+    try:
+        collection = f"test_filter_{int(time.time() * 1000)}"
+        vectors = np.random.rand(40, TEST_VECTOR_DIMENSION)
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json={
+                "collection": collection,
+                "records": [
+                    {"id": f"f{i}", "vector": v.tolist(), "metadata": {"tenant": "a" if i % 2 else "b", "year": 2000 + i}}
+                    for i, v in enumerate(vectors)
+                ]
+            }
+        )
+        if response.status_code != 200:
+            print(f"❌ 插入向量失败: {response.text}")
+            return False
+        
+        # 过滤在索引搜索内部生效，返回的结果全部满足条件
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector": vectors[0].tolist(), "top_k": 5, "filter": {"tenant": "a", "year": {"gte": 2020}}}
+        )
+        if response.status_code != 200:
+            print(f"❌ 过滤搜索失败: {response.text}")
+            return False
+        
+        results = response.json()
+        if len(results) != 5 or any(r["metadata"]["tenant"] != "a" or r["metadata"]["year"] < 2020 for r in results):
+            print(f"❌ 过滤搜索结果不满足条件: {results}")
+            return False
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector": vectors[0].tolist(), "top_k": 5, "filter": {"year": {"gte": "2020"}}}
+        )
+        if response.status_code != 400:
+            print(f"❌ 无效的过滤条件未被拒绝: {response.status_code}")
+            return False
+        
+        print(f"✅ 元数据过滤搜索测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 元数据过滤搜索测试异常: {str(e)}")
+        return False
+
+def test_vector_lazy_load_module():
+    """测试向量集合的延迟加载、内存映射和按内存预算卸载（在进程内启动向量模块，不经过HTTP服务器）"""
+    print("\n测试向量集合延迟加载...")
+    
+    import tempfile
+    import threading
+    from fastapi import HTTPException
+    from src.config import MCPServerConfig
+    from src.modules.vector_module import VectorModule, VectorIndexSpec
+    
+    try:
+        # 写入三个集合并关闭，关闭时所有日志合并进快照
+        db_path = tempfile.mkdtemp()
+        config = MCPServerConfig(vector_db_path=db_path, vector_dimension=64)
+        module = VectorModule(config)
+        vectors = {}
+        for name in ("lazy_a", "lazy_b", "lazy_c"):
+            vectors[name] = np.random.rand(2000, 64).astype("float32")
+            module._create_named_collection(name, VectorIndexSpec(index_type="hnsw", dimension=64))
+            module._add_vectors(name, vectors[name], [f"{name}-{i}" for i in range(2000)], [{}] * 2000)
+        module.close()
+        
+        # 每个集合约1MB，内存预算只能容纳两个
+        config = MCPServerConfig(vector_db_path=db_path, vector_dimension=64, vector_memory_budget_mb=2)
+        module = VectorModule(config)
+        if module.indexes or module.collection_names != {"lazy_a", "lazy_b", "lazy_c"}:
+            print(f"❌ 启动时不应加载集合: {list(module.indexes)}")
+            return False
+        
+        # 首次搜索时加载，没有待重放日志的快照以内存映射方式打开
+        for name in ("lazy_a", "lazy_b", "lazy_c"):
+            results = module._search(name, vectors[name][7:8], 1)[0]
+            if results[0].id != f"{name}-7":
+                print(f"❌ 延迟加载的集合搜索结果错误: {results[0].id}")
+                return False
+        if "lazy_a" in module.indexes or set(module.indexes) != {"lazy_b", "lazy_c"}:
+            print(f"❌ 超出内存预算时未卸载最久未使用的集合: {list(module.indexes)}")
+            return False
+        if not module.mmapped:
+            print(f"❌ 集合未以内存映射方式打开")
+            return False
+        
+        # 写入内存映射的集合前读入内存，卸载的集合再次访问时重新加载
+        module._add_vectors("lazy_b", vectors["lazy_a"][:1], ["extra"], [{}])
+        if "lazy_b" in module.mmapped or module._search("lazy_b", vectors["lazy_a"][:1], 1)[0][0].id != "extra":
+            print(f"❌ 写入内存映射的集合失败")
+            return False
+        if module._get_collection_info("lazy_a").count != 2000:
+            print(f"❌ 卸载后重新加载的集合数据错误")
+            return False
+        module.close()
+        
+        # 只有空日志或不完整日志的集合按不存在处理，不会反复加载
+        open(os.path.join(db_path, "empty.wal"), "w").close()
+        with open(os.path.join(db_path, "torn.wal"), "w") as f:
+            f.write('{"op": "ins')
+        module = VectorModule(MCPServerConfig(vector_db_path=db_path, vector_dimension=64))
+        for name in ("empty", "torn"):
+            status = {}
+            def get_info():
+                try:
+                    module._get_collection_info(name)
+                except HTTPException as e:
+                    status["code"] = e.status_code
+            worker = threading.Thread(target=get_info, daemon=True)
+            worker.start()
+            worker.join(timeout=5)
+            if worker.is_alive() or status.get("code") != 404:
+                print(f"❌ 只有预写日志的集合未返回404: {name}, {status}")
+                return False
+        module.close()
+        
+        print(f"✅ 向量集合延迟加载测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 向量集合延迟加载测试异常: {str(e)}")
+        return False
+
+def test_vector_metric_module():
+    """测试集合的向量维度和距离度量"""
+    print("\n测试集合维度和距离度量...")
+    
+    import tempfile
+    import threading
+    from src.config import MCPServerConfig
+    from src.modules.vector_module import VectorModule
+    
+    try:
+        collection = f"test_cosine_{int(time.time() * 1000)}"
+        vectors = np.random.rand(50, 32) - 0.5
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/collections",
+            json={"name": collection, "index": {"dimension": 32, "metric": "cosine"}}
+        )
+        if response.status_code != 200 or response.json()["index"]["dimension"] != 32:
+            print(f"❌ 创建余弦集合失败: {response.text}")
+            return False
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json={"collection": collection, "records": [{"id": f"m{i}", "vector": v.tolist()} for i, v in enumerate(vectors)]}
+        )
+        if response.status_code != 200:
+            print(f"❌ 插入向量失败: {response.text}")
+            return False
+        
+        # 余弦相似度与向量长度无关，相同方向的查询得分为1
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector": (vectors[11] * 10).tolist(), "top_k": 2}
+        )
+        results = response.json()
+        if response.status_code != 200 or results[0]["id"] != "m11" or abs(results[0]["score"] - 1) > 1e-4 or results[1]["score"] > results[0]["score"]:
+            print(f"❌ 余弦搜索结果错误: {response.text}")
+            return False
+        
+        # 维度按集合检查，其他集合仍使用默认维度
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert",
+            json={"collection": collection, "vector": np.random.rand(TEST_VECTOR_DIMENSION).tolist()}
+        )
+        if response.status_code != 400:
+            print(f"❌ 维度不匹配的向量未被拒绝: {response.status_code}")
+            return False
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/collections",
+            json={"name": f"{collection}_bad", "index": {"metric": "hamming"}}
+        )
+        if response.status_code != 400:
+            print(f"❌ 不支持的距离度量未被拒绝: {response.status_code}")
+            return False
+        
+        # 只有预写日志残留的集合立即按默认维度处理（在进程内检查）
+        db_path = tempfile.mkdtemp()
+        open(os.path.join(db_path, "leftover.wal"), "w").close()
+        module = VectorModule(MCPServerConfig(vector_db_path=db_path, vector_dimension=24))
+        dimension = {}
+        worker = threading.Thread(target=lambda: dimension.setdefault("value", module._collection_dimension("leftover")), daemon=True)
+        worker.start()
+        worker.join(timeout=5)
+        if dimension.get("value") != 24:
+            print(f"❌ 残留日志的集合未使用默认维度: {dimension}")
+            return False
+        module.close()
+        
+        print(f"✅ 集合维度和距离度量测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 集合维度和距离度量测试异常: {str(e)}")
+        return False
+
+def test_vector_rerank_module():
+    """测试量化索引的重排和召回率评估"""
+    print("\n测试量化索引重排...")
+    
+    try:
+        collection = f"test_sq8_{int(time.time() * 1000)}"
+        vectors = np.random.rand(300, 32)
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/collections",
+            json={"name": collection, "index": {"index_type": "sq8", "dimension": 32, "rerank": True}}
+        )
+        if response.status_code != 200:
+            print(f"❌ 创建量化集合失败: {response.text}")
+            return False
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json={"collection": collection, "records": [{"id": f"q{i}", "vector": v.tolist()} for i, v in enumerate(vectors)]}
+        )
+        if response.status_code != 200:
+            print(f"❌ 插入向量失败: {response.text}")
+            return False
+        
+        # 重排后的得分为精确距离
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector": vectors[9].tolist(), "top_k": 1}
+        )
+        results = response.json()
+        if response.status_code != 200 or results[0]["id"] != "q9" or results[0]["score"] > 1e-4:
+            print(f"❌ 重排搜索结果错误: {response.text}")
+            return False
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/collections/{collection}/recall",
+            json={"sample_size": 20, "top_k": 5}
+        )
+        if response.status_code != 200 or response.json()["recall_reranked"] < 0.9:
+            print(f"❌ 召回率评估失败: {response.text}")
+            return False
+        
+        for body in ({"top_k": 0}, {"sample_size": 0}):
+            response = requests.post(f"{MCP_SERVER_URL}/vector/collections/{collection}/recall", json=body)
+            if response.status_code != 422:
+                print(f"❌ 无效的召回率评估参数未被拒绝: {body}, {response.status_code}")
+                return False
+        
+        print(f"✅ 量化索引重排测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 量化索引重排测试异常: {str(e)}")
+        return False
+
+def test_vector_cache_module():
+    """测试搜索结果缓存"""
+    print("\n测试搜索结果缓存...")
+    
+    try:
+        collection = f"test_cache_{int(time.time() * 1000)}"
+        vector = np.random.rand(TEST_VECTOR_DIMENSION).tolist()
+        requests.post(f"{MCP_SERVER_URL}/vector/insert", json={"collection": collection, "vector": vector})
+        
+        query = {"collection": collection, "vector": vector, "top_k": 1}
+        before = requests.get(f"{MCP_SERVER_URL}/vector/cache/stats").json()
+        first = requests.post(f"{MCP_SERVER_URL}/vector/search", json=query).json()
+        second = requests.post(f"{MCP_SERVER_URL}/vector/search", json=query).json()
+        after = requests.get(f"{MCP_SERVER_URL}/vector/cache/stats").json()
+        
+        if first != second:
+            print(f"❌ 缓存命中的结果与首次搜索不一致")
+            return False
+        if after["capacity"] > 0 and after["hits"] <= before["hits"]:
+            print(f"❌ 重复搜索未命中缓存: {after}")
+            return False
+        
+        print(f"✅ 搜索结果缓存测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 搜索结果缓存测试异常: {str(e)}")
+        return False
+
+def test_vector_import_module():
+    """测试从上传的文件批量导入向量"""
+    print("\n测试批量导入向量...")
+    
+    try:
+        import io
+        collection = f"test_import_{int(time.time() * 1000)}"
+        vectors = np.random.rand(1000, 16).astype("float32")
+        buffer = io.BytesIO()
+        np.save(buffer, vectors)
+        metadata = "".join(json.dumps({"id": f"imp{i}", "n": i}) + "\n" for i in range(1000))
+        
+        response = requests.post(f"{MCP_SERVER_URL}/files/upload", files={"file": ("vectors.npy", buffer.getvalue())})
+        if response.status_code != 200:
+            print(f"❌ 上传向量文件失败: {response.text}")
+            return False
+        vectors_file_id = response.json()["id"]
+        response = requests.post(f"{MCP_SERVER_URL}/files/upload", files={"file": ("metadata.jsonl", metadata.encode("utf-8"))})
+        if response.status_code != 200:
+            print(f"❌ 上传元数据文件失败: {response.text}")
+            return False
+        metadata_file_id = response.json()["id"]
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/imports",
+            json={"collection": collection, "file_id": vectors_file_id, "metadata_file_id": metadata_file_id, "chunk_size": 300}
+        )
+        if response.status_code != 200:
+            print(f"❌ 创建导入任务失败: {response.text}")
+            return False
+        
+        # 等待后台任务完成
+        job = response.json()
+        for _ in range(60):
+            job = requests.get(f"{MCP_SERVER_URL}/vector/imports/{job['id']}").json()
+            if job["status"] not in ("pending", "running"):
+                break
+            time.sleep(0.5)
+        if job["status"] != "completed" or job["processed"] != 1000:
+            print(f"❌ 导入任务未完成: {job}")
+            return False
+        
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector": vectors[123].tolist(), "top_k": 1}
+        )
+        results = response.json()
+        if response.status_code != 200 or results[0]["id"] != "imp123" or results[0]["metadata"]["n"] != 123:
+            print(f"❌ 导入的向量未被正确检索: {response.text}")
+            return False
+        
+        print(f"✅ 批量导入向量测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 批量导入向量测试异常: {str(e)}")
+        return False
+
+def test_vector_rebuild_module():
+    """测试在线重建向量集合索引"""
+    print("\n测试在线重建索引...")
+    
+    try:
+        collection = f"test_rebuild_{int(time.time() * 1000)}"
+        vectors = np.random.rand(400, 16)
+        requests.post(
+            f"{MCP_SERVER_URL}/vector/collections",
+            json={"name": collection, "index": {"index_type": "hnsw", "dimension": 16}}
+        )
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json={"collection": collection, "records": [{"id": f"r{i}", "vector": v.tolist()} for i, v in enumerate(vectors)]}
+        )
+        if response.status_code != 200:
+            print(f"❌ 插入向量失败: {response.text}")
+            return False
+        requests.delete(f"{MCP_SERVER_URL}/vector/{collection}/r5")
+        
+        # 重建为IVF索引
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/collections/{collection}/rebuild",
+            json={"index": {"index_type": "ivf", "nlist": 4, "nprobe": 4}}
+        )
+        if response.status_code != 200:
+            print(f"❌ 启动重建失败: {response.text}")
+            return False
+        
+        status = response.json()
+        for _ in range(60):
+            status = requests.get(f"{MCP_SERVER_URL}/vector/collections/{collection}/rebuild").json()
+            if status["status"] != "running":
+                break
+            time.sleep(0.5)
+        if status["status"] != "completed":
+            print(f"❌ 重建失败: {status}")
+            return False
+        
+        info = requests.get(f"{MCP_SERVER_URL}/vector/collections/{collection}").json()
+        results = requests.post(
+            f"{MCP_SERVER_URL}/vector/search",
+            json={"collection": collection, "vector": vectors[5].tolist(), "top_k": 3}
+        ).json()
+        if info["index"]["index_type"] != "ivf" or info["count"] != 399 or "r5" in [r["id"] for r in results]:
+            print(f"❌ 重建后的集合状态错误: {info}")
+            return False
+        
+        print(f"✅ 在线重建索引测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 在线重建索引测试异常: {str(e)}")
+        return False
+
+def test_vector_paged_search_module():
+    """测试范围搜索和游标分页"""
+    print("\n测试分页搜索...")
+    
+    try:
+        collection = f"test_paged_{int(time.time() * 1000)}"
+        vectors = np.random.rand(100, TEST_VECTOR_DIMENSION)
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/insert_batch",
+            json={"collection": collection, "records": [{"id": f"p{i}", "vector": v.tolist()} for i, v in enumerate(vectors)]}
+        )
+        if response.status_code != 200:
+            print(f"❌ 插入向量失败: {response.text}")
+            return False
+        
+        # 深度top_k搜索，按游标翻页取回全部结果
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search_paged",
+            json={"collection": collection, "vector": vectors[0].tolist(), "top_k": 100, "page_size": 30}
+        )
+        if response.status_code != 200:
+            print(f"❌ 分页搜索失败: {response.text}")
+            return False
+        
+        page = response.json()
+        if page["total"] != 100 or len(page["results"]) != 30 or page["results"][0]["id"] != "p0":
+            print(f"❌ 第一页结果错误: total={page['total']}")
+            return False
+        
+        ids = [r["id"] for r in page["results"]]
+        scores = [r["score"] for r in page["results"]]
+        while page["next_cursor"]:
+            response = requests.get(f"{MCP_SERVER_URL}/vector/cursors/{page['next_cursor']}")
+            if response.status_code != 200:
+                print(f"❌ 获取下一页失败: {response.text}")
+                return False
+            page = response.json()
+            ids.extend(r["id"] for r in page["results"])
+            scores.extend(r["score"] for r in page["results"])
+        if len(set(ids)) != 100 or scores != sorted(scores):
+            print(f"❌ 分页结果不完整或未按得分排序")
+            return False
+        
+        # 范围搜索：半径为0附近时只返回查询向量自身
+        response = requests.post(
+            f"{MCP_SERVER_URL}/vector/search_paged",
+            json={"collection": collection, "vector": vectors[0].tolist(), "radius": 1e-3, "page_size": 10}
+        )
+        page = response.json()
+        if response.status_code != 200 or [r["id"] for r in page["results"]] != ["p0"] or page["next_cursor"] is not None:
+            print(f"❌ 范围搜索结果错误: {response.text}")
+            return False
+        
+        response = requests.get(f"{MCP_SERVER_URL}/vector/cursors/nonexistent.0")
+        if response.status_code != 404:
+            print(f"❌ 无效游标未返回404: {response.status_code}")
+            return False
+        
+        print(f"✅ 分页搜索测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 分页搜索测试异常: {str(e)}")
+        return False
+
+def _start_test_server(port: int, **env) -> subprocess.Popen:
+    """以指定的环境变量在子进程中启动一个临时服务器，用于需要不同配置的测试"""
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "--port", str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, "MCP_API_KEY_REQUIRED": "false", **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    for _ in range(60):
+        if process.poll() is not None:
+            break
+        try:
+            requests.get(f"http://localhost:{port}/docs", timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"临时服务器启动失败: {port}")
+
+def _stop_test_server(process: subprocess.Popen):
+    """停止临时服务器"""
+    process.terminate()
+    process.wait(timeout=30)
+
+def test_file_upload_limit():
+    """测试超过大小限制的上传被提前中止并清理临时文件"""
+    print("\n测试流式上传大小限制...")
+    
+    import tempfile
+    server = None
+    try:
+        storage_path = tempfile.mkdtemp()
+        server = _start_test_server(
+            8011,
+            MCP_FILE_STORAGE_PATH=storage_path,
+            MCP_VECTOR_DB_PATH=tempfile.mkdtemp(),
+            MCP_MAX_FILE_SIZE_MB="1",
+            MCP_FILE_CHUNK_SIZE_KB="64"
+        )
+        url = "http://localhost:8011"
+        temp_path = os.path.join(storage_path, ".tmp")
+        
+        # 带Content-Length的超大请求在读取请求体前被拒绝
+        response = requests.post(f"{url}/files/upload", files={"file": ("large.txt", b"x" * (3 * 1024 * 1024))})
+        if response.status_code != 400:
+            print(f"❌ 超过大小限制的上传未被拒绝: {response.status_code}")
+            return False
+        
+        # 分块传输没有Content-Length，写入超过限制时中止
+        boundary = "----mcp-upload-limit"
+        def chunked_body():
+            yield (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"chunked.txt\"\r\n"
+                   f"Content-Type: text/plain\r\n\r\n").encode("utf-8")
+            for _ in range(48):
+                yield b"y" * (64 * 1024)
+            yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+        try:
+            response = requests.post(
+                f"{url}/files/upload",
+                data=chunked_body(),
+                headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+            )
+            if response.status_code != 400:
+                print(f"❌ 分块传输的超大上传未被拒绝: {response.status_code}")
+                return False
+        except requests.ConnectionError:
+            # 服务器提前响应并关闭连接时，客户端可能来不及读取响应
+            pass
+        
+        # 中止的上传不留下临时文件
+        for _ in range(20):
+            if not os.listdir(temp_path):
+                break
+            time.sleep(0.1)
+        if os.listdir(temp_path):
+            print(f"❌ 中止的上传留下了临时文件: {os.listdir(temp_path)}")
+            return False
+        
+        # 限制以内的文件正常保存
+        content = os.urandom(512 * 1024)
+        response = requests.post(f"{url}/files/upload", files={"file": ("small.txt", content)})
+        if response.status_code != 200 or response.json()["size"] != len(content):
+            print(f"❌ 限制以内的文件上传失败: {response.text}")
+            return False
+        response = requests.get(f"{url}/files/download/{response.json()['id']}", headers={"Accept-Encoding": "identity"})
+        if response.content != content or os.listdir(temp_path):
+            print(f"❌ 上传的文件内容不一致或临时文件未清理")
+            return False
+        
+        print(f"✅ 流式上传大小限制测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 流式上传大小限制测试异常: {str(e)}")
+        return False
+    finally:
+        if server is not None:
+            _stop_test_server(server)
+
+def test_file_catalog_reconcile():
+    """测试服务启动时文件目录与存储目录同步"""
+    print("\n测试文件目录同步...")
+    
+    import tempfile
+    server = None
+    try:
+        storage_path = tempfile.mkdtemp()
+        env = {"MCP_FILE_STORAGE_PATH": storage_path, "MCP_VECTOR_DB_PATH": tempfile.mkdtemp()}
+        url = "http://localhost:8012"
+        server = _start_test_server(8012, **env)
+        removed = requests.post(f"{url}/files/upload", files={"file": ("removed.txt", b"removed content")}).json()
+        kept = requests.post(f"{url}/files/upload", files={"file": ("kept.txt", b"kept content")}).json()
+        _stop_test_server(server)
+        server = None
+        
+        # 服务停止期间修改存储目录：删除一个数据块，手动放入一个文件，留下孤立的数据块和上传临时文件
+        os.remove(removed["path"])
+        with open(os.path.join(storage_path, "manual01_notes.txt"), "wb") as f:
+            f.write(b"manual content")
+        orphan_path = os.path.join(storage_path, ".blobs", "ff", "ff", "ff" * 32)
+        os.makedirs(os.path.dirname(orphan_path), exist_ok=True)
+        with open(orphan_path, "wb") as f:
+            f.write(b"orphan")
+        with open(os.path.join(storage_path, ".tmp", "interrupted.part"), "wb") as f:
+            f.write(b"partial")
+        
+        server = _start_test_server(8012, **env)
+        listed = {info["id"]: info for info in requests.get(f"{url}/files/list").json()}
+        if removed["id"] in listed or kept["id"] not in listed:
+            print(f"❌ 同步后的文件列表错误: {list(listed)}")
+            return False
+        if requests.get(f"{url}/files/download/{removed['id']}").status_code != 404:
+            print(f"❌ 数据块已删除的文件仍可下载")
+            return False
+        
+        # 手动放入的文件按"{文件ID}_{原文件名}"补建记录
+        manual = listed.get("manual01")
+        if manual is None or manual["filename"] != "notes.txt" or manual["size"] != len(b"manual content"):
+            print(f"❌ 手动放入的文件未补建记录: {manual}")
+            return False
+        response = requests.get(f"{url}/files/download/manual01", headers={"Accept-Encoding": "identity"})
+        if response.status_code != 200 or response.content != b"manual content":
+            print(f"❌ 补建记录的文件无法下载: {response.status_code}")
+            return False
+        
+        if os.path.exists(orphan_path) or os.listdir(os.path.join(storage_path, ".tmp")):
+            print(f"❌ 孤立的数据块或上传临时文件未清理")
+            return False
+        
+        print(f"✅ 文件目录同步测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 文件目录同步测试异常: {str(e)}")
+        return False
+    finally:
+        if server is not None:
+            _stop_test_server(server)
+
+def test_file_list_paging():
+    """测试文件列表的过滤、排序和游标分页"""
+    print("\n测试文件列表分页...")
+    
+    try:
+        suffix = int(time.time() * 1000)
+        file_ids = []
+        for i in range(5):
+            response = requests.post(
+                f"{MCP_SERVER_URL}/files/upload",
+                files={"file": (f"paging_{suffix}_{i}.csv", f"a,b\n{i},{'x' * i}\n".encode("utf-8"))}
+            )
+            if response.status_code != 200:
+                print(f"❌ 文件上传失败: {response.text}")
+                return False
+            file_ids.append(response.json()["id"])
+        
+        # 按大小倒序、每页2个翻页
+        params = {"ext": "csv", "sort": "size", "order": "desc", "limit": 2}
+        listed = []
+        while True:
+            response = requests.get(f"{MCP_SERVER_URL}/files/list", params=params)
+            if response.status_code != 200:
+                print(f"❌ 获取文件列表失败: {response.text}")
+                return False
+            page = response.json()
+            if len(page) > 2 or any(not f["filename"].endswith(".csv") for f in page):
+                print(f"❌ 文件列表分页或过滤错误")
+                return False
+            listed.extend(page)
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+        
+        sizes = [f["size"] for f in listed]
+        if not set(file_ids) <= {f["id"] for f in listed} or sizes != sorted(sizes, reverse=True):
+            print(f"❌ 翻页结果不完整或未按大小排序")
+            return False
+        
+        # 游标记录排序方式，换用其他排序时返回400
+        response = requests.get(
+            f"{MCP_SERVER_URL}/files/list",
+            params={"ext": "csv", "sort": "size", "order": "desc", "limit": 2}
+        )
+        cursor = response.headers["X-Next-Cursor"]
+        response = requests.get(f"{MCP_SERVER_URL}/files/list", params={"ext": "csv", "sort": "size", "order": "asc", "cursor": cursor})
+        if response.status_code != 400:
+            print(f"❌ 排序方式不一致的游标未被拒绝: {response.status_code}")
+            return False
+        
+        # NDJSON流式返回，指定limit时最后一行给出下一页的游标
+        params = {"format": "ndjson", "ext": "csv", "sort": "size", "order": "desc", "limit": 2}
+        ndjson_listed = []
+        while True:
+            response = requests.get(f"{MCP_SERVER_URL}/files/list", params=params)
+            if response.headers.get("Content-Type", "").split(";")[0] != "application/x-ndjson":
+                print(f"❌ NDJSON文件列表错误: {response.text}")
+                return False
+            lines = [json.loads(line) for line in response.text.splitlines() if line]
+            if lines and "next_cursor" in lines[-1]:
+                params["cursor"] = lines.pop()["next_cursor"]
+                ndjson_listed.extend(lines)
+            else:
+                ndjson_listed.extend(lines)
+                break
+        if [f["id"] for f in ndjson_listed] != [f["id"] for f in listed]:
+            print(f"❌ NDJSON翻页结果与JSON翻页不一致")
+            return False
+        
+        # 时间范围按ISO格式解析
+        created_at = min(f["created_at"] for f in listed if f["id"] in file_ids)
+        response = requests.get(f"{MCP_SERVER_URL}/files/list", params={"ext": "csv", "created_after": created_at})
+        if response.status_code != 200 or not set(file_ids) <= {f["id"] for f in response.json()}:
+            print(f"❌ 按创建时间过滤失败: {response.text}")
+            return False
+        response = requests.get(f"{MCP_SERVER_URL}/files/list", params={"created_after": "yesterday"})
+        if response.status_code != 400:
+            print(f"❌ 无效的时间格式未被拒绝: {response.status_code}")
+            return False
+        
+        for file_id in file_ids:
+            requests.delete(f"{MCP_SERVER_URL}/files/{file_id}")
+        
+        print(f"✅ 文件列表分页测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 文件列表分页测试异常: {str(e)}")
+        return False
+
+def test_file_download_range():
+    """测试分段下载和条件请求"""
+    print("\n测试分段下载...")
+    
+    try:
+        content = bytes(range(256)) * 40
+        response = requests.post(f"{MCP_SERVER_URL}/files/upload", files={"file": ("range.txt", content)})
+        if response.status_code != 200:
+            print(f"❌ 文件上传失败: {response.text}")
+            return False
+        file_id = response.json()["id"]
+        url = f"{MCP_SERVER_URL}/files/download/{file_id}"
+        
+        # Range请求返回206和请求的字节范围
+        response = requests.get(url, headers={"Range": "bytes=100-199", "Accept-Encoding": "identity"})
+        if response.status_code != 206 or response.content != content[100:200]:
+            print(f"❌ 分段下载失败: {response.status_code}")
+            return False
+        
+        response = requests.get(url, headers={"Range": "bytes=-50", "Accept-Encoding": "identity"})
+        if response.status_code != 206 or response.content != content[-50:]:
+            print(f"❌ 后缀范围下载失败: {response.status_code}")
+            return False
+        
+        # ETag匹配时返回304
+        response = requests.get(url, headers={"Accept-Encoding": "identity"})
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code != 200 or response.content != content or not etag or not last_modified:
+            print(f"❌ 完整下载失败: {response.status_code}")
+            return False
+        response = requests.get(url, headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+        if response.status_code != 304 or response.content:
+            print(f"❌ 条件请求未返回304: {response.status_code}")
+            return False
+        
+        response = requests.get(url, headers={"If-Modified-Since": last_modified})
+        if response.status_code != 304:
+            print(f"❌ If-Modified-Since未返回304: {response.status_code}")
+            return False
+        
+        requests.delete(f"{MCP_SERVER_URL}/files/{file_id}")
+        print(f"✅ 分段下载测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 分段下载测试异常: {str(e)}")
+        return False
+
+def test_file_dedup_module():
+    """测试按内容哈希去重和按哈希创建文件"""
+    print("\n测试内容去重...")
+    
+    try:
+        import hashlib
+        content = f"去重测试内容 {time.time()}".encode("utf-8")
+        sha256 = hashlib.sha256(content).hexdigest()
+        
+        # 内容尚未上传时按哈希创建返回404
+        response = requests.post(f"{MCP_SERVER_URL}/files/link", json={"sha256": sha256, "filename": "linked.txt"})
+        if response.status_code != 404:
+            print(f"❌ 不存在的内容未返回404: {response.status_code}")
+            return False
+        
+        first = requests.post(f"{MCP_SERVER_URL}/files/upload", files={"file": ("dedup_a.txt", content)}).json()
+        second = requests.post(f"{MCP_SERVER_URL}/files/upload", files={"file": ("dedup_b.txt", content)}).json()
+        if first["sha256"] != sha256 or first["path"] != second["path"]:
+            print(f"❌ 相同内容未共用数据块")
+            return False
+        
+        response = requests.post(f"{MCP_SERVER_URL}/files/link", json={"sha256": sha256, "filename": "linked.txt"})
+        if response.status_code != 200 or response.json()["path"] != first["path"]:
+            print(f"❌ 按哈希创建文件失败: {response.text}")
+            return False
+        linked = response.json()
+        
+        # 删除部分引用后其余文件仍可下载
+        requests.delete(f"{MCP_SERVER_URL}/files/{first['id']}")
+        requests.delete(f"{MCP_SERVER_URL}/files/{second['id']}")
+        response = requests.get(f"{MCP_SERVER_URL}/files/download/{linked['id']}", headers={"Accept-Encoding": "identity"})
+        if response.status_code != 200 or response.content != content:
+            print(f"❌ 删除其他引用后文件无法下载")
+            return False
+        requests.delete(f"{MCP_SERVER_URL}/files/{linked['id']}")
+        
+        print(f"✅ 内容去重测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 内容去重测试异常: {str(e)}")
+        return False
+
+def test_file_upload_session():
+    """测试分片上传会话"""
+    print("\n测试分片上传...")
+    
+    try:
+        part_size = 1024 * 1024
+        content = os.urandom(part_size * 2 + 12345)
+        response = requests.post(
+            f"{MCP_SERVER_URL}/files/uploads",
+            json={"filename": "multipart.bin.txt", "size": len(content), "part_size": part_size}
+        )
+        if response.status_code != 200:
+            print(f"❌ 创建上传会话失败: {response.text}")
+            return False
+        session = response.json()
+        if session["part_count"] != 3:
+            print(f"❌ 分片数量错误: {session['part_count']}")
+            return False
+        
+        # 乱序上传分片，未到齐时不能完成
+        for part_number in (2, 0):
+            response = requests.put(
+                f"{MCP_SERVER_URL}/files/uploads/{session['id']}/parts/{part_number}",
+                data=content[part_number * part_size:(part_number + 1) * part_size]
+            )
+            if response.status_code != 200:
+                print(f"❌ 上传分片失败: {response.text}")
+                return False
+        response = requests.post(f"{MCP_SERVER_URL}/files/uploads/{session['id']}/complete")
+        if response.status_code != 400:
+            print(f"❌ 分片未到齐时完成未被拒绝: {response.status_code}")
+            return False
+        
+        # 大小不符的分片被拒绝
+        response = requests.put(f"{MCP_SERVER_URL}/files/uploads/{session['id']}/parts/1", data=b"short")
+        if response.status_code != 400:
+            print(f"❌ 大小不符的分片未被拒绝: {response.status_code}")
+            return False
+        
+        response = requests.get(f"{MCP_SERVER_URL}/files/uploads/{session['id']}")
+        if response.json()["received_parts"] != [0, 2]:
+            print(f"❌ 已接收的分片错误: {response.text}")
+            return False
+        
+        requests.put(f"{MCP_SERVER_URL}/files/uploads/{session['id']}/parts/1", data=content[part_size:2 * part_size])
+        response = requests.post(f"{MCP_SERVER_URL}/files/uploads/{session['id']}/complete")
+        if response.status_code != 200:
+            print(f"❌ 完成上传失败: {response.text}")
+            return False
+        file_info = response.json()
+        
+        response = requests.get(f"{MCP_SERVER_URL}/files/download/{file_info['id']}", headers={"Accept-Encoding": "identity"})
+        if response.content != content:
+            print(f"❌ 分片上传的文件内容不一致")
+            return False
+        
+        # 取消会话后不能再查询
+        session = requests.post(
+            f"{MCP_SERVER_URL}/files/uploads",
+            json={"filename": "cancelled.txt", "size": 10}
+        ).json()
+        requests.delete(f"{MCP_SERVER_URL}/files/uploads/{session['id']}")
+        if requests.get(f"{MCP_SERVER_URL}/files/uploads/{session['id']}").status_code != 404:
+            print(f"❌ 取消的会话仍然存在")
+            return False
+        
+        requests.delete(f"{MCP_SERVER_URL}/files/{file_info['id']}")
+        print(f"✅ 分片上传测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 分片上传测试异常: {str(e)}")
+        return False
+
+def test_file_archive_module():
+    """测试打包下载多个文件"""
+    print("\n测试打包下载...")
+    
+    try:
+        import io
+        import tarfile
+        import zipfile
+        contents = {"a.txt": b"archive a" * 1000, "b.csv": b"x,y\n1,2\n"}
+        file_ids = {}
+        for filename, content in contents.items():
+            response = requests.post(f"{MCP_SERVER_URL}/files/upload", files={"file": (filename, content)})
+            if response.status_code != 200:
+                print(f"❌ 文件上传失败: {response.text}")
+                return False
+            file_ids[filename] = response.json()["id"]
+        
+        # zip格式，可以单独指定归档内的文件名
+        response = requests.post(
+            f"{MCP_SERVER_URL}/files/archive",
+            json={"files": [{"id": file_ids["a.txt"]}, {"id": file_ids["b.csv"], "name": "data/b.csv", "compress": True}]}
+        )
+        if response.status_code != 200:
+            print(f"❌ zip打包失败: {response.text}")
+            return False
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            if archive.read("a.txt") != contents["a.txt"] or archive.read("data/b.csv") != contents["b.csv"]:
+                print(f"❌ zip归档内容错误: {archive.namelist()}")
+                return False
+        
+        # gzip压缩的tar格式
+        response = requests.post(
+            f"{MCP_SERVER_URL}/files/archive",
+            json={"files": [{"id": file_id} for file_id in file_ids.values()], "format": "tar", "compress": True}
+        )
+        if response.status_code != 200:
+            print(f"❌ tar打包失败: {response.text}")
+            return False
+        with tarfile.open(fileobj=io.BytesIO(response.content), mode="r:gz") as archive:
+            if {name: archive.extractfile(name).read() for name in archive.getnames()} != contents:
+                print(f"❌ tar归档内容错误: {archive.getnames()}")
+                return False
+        
+        # 任一文件不存在时返回404
+        response = requests.post(f"{MCP_SERVER_URL}/files/archive", json={"files": [{"id": "nonexistent"}]})
+        if response.status_code != 404:
+            print(f"❌ 不存在的文件未返回404: {response.status_code}")
+            return False
+        
+        for file_id in file_ids.values():
+            requests.delete(f"{MCP_SERVER_URL}/files/{file_id}")
+        print(f"✅ 打包下载测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 打包下载测试异常: {str(e)}")
+        return False
+
+def test_file_compression_module():
+    """测试文本类文件以zstd和gzip压缩存储后透明读取"""
+    print("\n测试压缩存储...")
+    
+    import tempfile
+    server = None
+    try:
+        storage_path = tempfile.mkdtemp()
+        env = {"MCP_FILE_STORAGE_PATH": storage_path, "MCP_VECTOR_DB_PATH": tempfile.mkdtemp()}
+        url = "http://localhost:8013"
+        content = "".join(f"{i},name_{i % 7},{i * 3}\n" for i in range(20000)).encode("utf-8")
+        csv_content = b"id,name,value\n" + content
+        stored = {}
+        
+        for encoding, magic in (("zstd", b"\x28\xb5\x2f\xfd"), ("gzip", b"\x1f\x8b")):
+            server = _start_test_server(8013, MCP_FILE_COMPRESSION=encoding, **env)
+            # 内容各不相同，避免与已存储的数据块去重
+            data = csv_content + f"{100000 + len(stored)},{encoding},0\n".encode("utf-8")
+            response = requests.post(f"{url}/files/upload", files={"file": (f"{encoding}.csv", data)})
+            if response.status_code != 200:
+                print(f"❌ {encoding}压缩上传失败: {response.text}")
+                return False
+            info = response.json()
+            with open(info["path"], "rb") as f:
+                blob = f.read()
+            if info["encoding"] != encoding or info["size"] != len(data) or not blob.startswith(magic) or len(blob) >= len(data):
+                print(f"❌ 文件未以{encoding}压缩存储: {info}")
+                return False
+            stored[encoding] = (info["id"], data)
+            
+            # 不在压缩扩展名列表中的文件原样存储
+            response = requests.post(f"{url}/files/upload", files={"file": (f"{encoding}.pdf", data + b"pdf")})
+            if response.json()["encoding"] is not None:
+                print(f"❌ 非文本类文件被压缩存储: {response.text}")
+                return False
+            _stop_test_server(server)
+            server = None
+        
+        # 关闭压缩后重启，之前以两种编码存储的文件都可以完整下载、分段下载和预览
+        server = _start_test_server(8013, MCP_FILE_COMPRESSION="none", **env)
+        for encoding, (file_id, data) in stored.items():
+            response = requests.get(f"{url}/files/download/{file_id}", headers={"Accept-Encoding": "identity"})
+            if response.status_code != 200 or response.content != data:
+                print(f"❌ {encoding}压缩存储的文件下载内容不一致")
+                return False
+            response = requests.get(f"{url}/files/download/{file_id}", headers={"Range": "bytes=1000-1999", "Accept-Encoding": "identity"})
+            if response.status_code != 206 or response.content != data[1000:2000]:
+                print(f"❌ {encoding}压缩存储的文件分段下载失败: {response.status_code}")
+                return False
+            response = requests.post(f"{url}/files/{file_id}/preview", json={"offset": 19990, "limit": 20})
+            rows = response.json().get("rows", [])
+            if response.status_code != 200 or rows[0]["id"] != 19990 or rows[-1]["name"] != encoding:
+                print(f"❌ {encoding}压缩存储的文件预览失败: {response.text}")
+                return False
+        
+        print(f"✅ 压缩存储测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 压缩存储测试异常: {str(e)}")
+        return False
+    finally:
+        if server is not None:
+            _stop_test_server(server)
+
+def test_file_preview_module():
+    """测试结构化文件预览"""
+    print("\n测试结构化文件预览...")
+    
+    try:
+        rows = "".join(f"{i},{'北京' if i % 3 == 0 else '上海'},{20 + i % 50}\n" for i in range(1000))
+        response = requests.post(f"{MCP_SERVER_URL}/files/upload", files={"file": ("preview.csv", ("id,city,age\n" + rows).encode("utf-8"))})
+        if response.status_code != 200:
+            print(f"❌ 文件上传失败: {response.text}")
+            return False
+        file_id = response.json()["id"]
+        
+        # 指定列和偏移
+        response = requests.post(f"{MCP_SERVER_URL}/files/{file_id}/preview", json={"offset": 500, "limit": 3, "columns": ["id", "city"]})
+        if response.status_code != 200:
+            print(f"❌ 预览失败: {response.text}")
+            return False
+        preview = response.json()
+        if [r["id"] for r in preview["rows"]] != [500, 501, 502] or set(preview["rows"][0]) != {"id", "city"} or preview["total_rows"] != 1000:
+            print(f"❌ 预览结果错误: {preview}")
+            return False
+        
+        # 过滤条件，用next_offset继续读取
+        response = requests.post(
+            f"{MCP_SERVER_URL}/files/{file_id}/preview",
+            json={"limit": 5, "filter": {"city": "北京", "age": {"gte": 60}}}
+        )
+        preview = response.json()
+        if response.status_code != 200 or len(preview["rows"]) != 5 or any(r["city"] != "北京" or r["age"] < 60 for r in preview["rows"]):
+            print(f"❌ 过滤预览结果错误: {response.text}")
+            return False
+        if preview["next_offset"] != preview["rows"][-1]["id"] + 1:
+            print(f"❌ next_offset错误: {preview['next_offset']}")
+            return False
+        
+        response = requests.post(f"{MCP_SERVER_URL}/files/{file_id}/preview", json={"filter": {"city": {"eq": None}}})
+        if response.status_code != 400:
+            print(f"❌ 无效的过滤值未被拒绝: {response.status_code}")
+            return False
+        
+        requests.delete(f"{MCP_SERVER_URL}/files/{file_id}")
+        print(f"✅ 结构化文件预览测试通过")
+        return True
+    
+    except Exception as e:
+        print(f"❌ 结构化文件预览测试异常: {str(e)}")
+        return False
+
 def main():
     """主函数"""
     print("===== MCP服务器功能测试 =====")
@@ -387,7 +1810,30 @@ def main():
         ("文件访问模块", test_file_module),
         ("数据库连接模块", test_database_module),
         ("API集成模块", test_api_module),
-        ("向量数据库访问模块", test_vector_module)
+        ("向量数据库访问模块", test_vector_module),
+        ("向量批量插入", test_vector_batch_module),
+        ("向量预写日志恢复", test_vector_wal_recovery),
+        ("向量集合", test_vector_collection_module),
+        ("向量读写并发", test_vector_concurrency_module),
+        ("批量搜索向量", test_vector_batch_search_module),
+        ("二进制向量", test_vector_binary_module),
+        ("元数据过滤搜索", test_vector_filter_module),
+        ("向量集合延迟加载", test_vector_lazy_load_module),
+        ("集合维度和距离度量", test_vector_metric_module),
+        ("量化索引重排", test_vector_rerank_module),
+        ("搜索结果缓存", test_vector_cache_module),
+        ("批量导入向量", test_vector_import_module),
+        ("在线重建索引", test_vector_rebuild_module),
+        ("分页搜索", test_vector_paged_search_module),
+        ("流式上传大小限制", test_file_upload_limit),
+        ("文件目录同步", test_file_catalog_reconcile),
+        ("文件列表分页", test_file_list_paging),
+        ("分段下载", test_file_download_range),
+        ("内容去重", test_file_dedup_module),
+        ("分片上传", test_file_upload_session),
+        ("打包下载", test_file_archive_module),
+        ("压缩存储", test_file_compression_module),
+        ("结构化文件预览", test_file_preview_module)
     ]
     
     results = {}